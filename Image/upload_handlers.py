@@ -0,0 +1,70 @@
+import io
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+
+class InMemoryImageUploadHandler(FileUploadHandler):
+    """
+    Upload handler that keeps image uploads in memory, whatever their size.
+
+    Django's default handlers spill uploads above FILE_UPLOAD_MAX_MEMORY_SIZE to a
+    temporary file; emotion detection only needs the bytes, so they are kept in
+    memory up to EMOTION_MAX_UPLOAD_SIZE and anything larger is dropped.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = getattr(settings, 'EMOTION_MAX_UPLOAD_SIZE', 20 * 1024 * 1024)
+        self.file = None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = io.BytesIO()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            # Leave the file out of request.FILES but keep parsing the fields after it, e.g. the CSRF token
+            self.file = None
+            raise SkipFile()
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        return InMemoryUploadedFile(
+            file=self.file,
+            field_name=self.field_name,
+            name=self.file_name,
+            content_type=self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+
+
+def in_memory_image_uploads(view):
+    """
+    Decorate a view so that its uploads are read by InMemoryImageUploadHandler, keeping CSRF protection.
+
+    Upload handlers have to be replaced before the CSRF check reads the request body,
+    so the view is exempted from the CSRF middleware and checked with csrf_protect
+    once the handler is in place.
+
+    Args:
+        view (Callable): The view function.
+
+    Returns:
+        Callable: The decorated view.
+    """
+    protected_view = csrf_protect(view)
+
+    @wraps(view)
+    def wrapped_view(request, *args, **kwargs):
+        request.upload_handlers = [InMemoryImageUploadHandler(request)]
+        return protected_view(request, *args, **kwargs)
+
+    return csrf_exempt(wrapped_view)
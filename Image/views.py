@@ -1,7 +1,9 @@
 from django.shortcuts import render, redirect
-from Image.models import Image
+from Image.upload_handlers import in_memory_image_uploads
+from django.conf import settings
 from django.http import HttpRequest, HttpResponse
 from django.template import TemplateDoesNotExist
+from emotion import views as emotion_views
 
 # Create your views here.
 
@@ -29,44 +31,57 @@ def get_image_upload_page(request: HttpRequest) -> HttpResponse:
         return HttpResponse(f"An unexpected error occurred: {e}", status=500)
 
 
+@in_memory_image_uploads
 def take_image(request: HttpRequest) -> HttpResponse:
     """
-    Renders the camera capture page.
+    Renders the image upload page, or detects the emotion in an uploaded image.
+
+    Uploads are handled by emotion's detect_playlist in the same request, so the
+    playlist is returned without redirecting through filterImage and emotion.
 
     Args:
         request: The HTTP request object.
 
     Returns:
-        HttpResponse: The rendered camera capture page.
+        HttpResponse: The rendered upload page, or the playlist or error page.
     """
     try:
         if request.method == "GET":
             # Render the initial page where users can capture or upload an image
             return render(request, 'Image/Upload.html')
         else:
-            # Process the uploaded image file
-            image = request.FILES['emo-image']
-            emo_image = Image(user=request.user, Image_url=image)
-            emo_image.save()
-            return redirect('filterImage')
-
-    except KeyError:
-        # Handle case where the image key is not found in the uploaded files
-        return HttpResponse("No image was uploaded. Please try again.", status=400)
+            # Detect the emotion straight from the uploaded bytes and show the playlist
+            return emotion_views.handle_image_upload(request)
 
     except Exception as e:
         # General catch-all for any other unexpected exceptions
         return HttpResponse(f"An unexpected error occurred: {e}", status=500)
 
 
+@in_memory_image_uploads
 def use_camera(request: HttpRequest) -> HttpResponse:
+    """
+    Renders the camera capture page, or detects the emotion in a captured image.
+
+    The page posts the snapshot as binary JPEG to emotion-detect; posts to this
+    view, as a multipart `emo-image` file or a raw image body, are handled the same way.
+
+    Args:
+        request: The HTTP request object.
+
+    Returns:
+        HttpResponse: The rendered capture page, or the playlist or error page.
+    """
     try:
         if request.method == "GET":
-            # Render the camera capture page
-            return render(request, 'Image/CaptureImage.html')
+            # Render the camera capture page with the size and quality the snapshot is encoded at
+            return render(request, 'Image/CaptureImage.html', {
+                'jpeg_quality': getattr(settings, 'EMOTION_CAPTURE_JPEG_QUALITY', 0.85),
+                'max_dimension': getattr(settings, 'EMOTION_CAPTURE_MAX_DIMENSION', 640),
+            })
         else:
-            # Redirect to the next step after capturing the image
-            return redirect('filterImage')
+            # Detect the emotion straight from the captured bytes and show the playlist
+            return emotion_views.handle_image_upload(request)
 
     except Exception as e:
         # General catch-all for any unexpected errors
@@ -75,16 +90,18 @@ def use_camera(request: HttpRequest) -> HttpResponse:
 
 def filter_image(request: HttpRequest) -> HttpResponse:
     """
-    Redirects to the 'emotion' view.
+    Redirects to the image upload page.
+
+    Kept for old links and bookmarks; new clients post to emotion-detect instead.
 
     Args:
         request: The HTTP request object.
     Returns:
-        HttpResponse: Redirects to the 'emotion' view.
+        HttpResponse: Redirects to the image upload page.
     """
     try:
-        # Attempt to redirect to the 'emotion' view
-        return redirect('emotion')
+        # Attempt to redirect to the image upload page
+        return redirect('image')
     except Exception as e:
         # General catch-all for any unexpected errors that might occur during redirection
         return HttpResponse(f"An unexpected error occurred during redirection: {e}", status=500)
@@ -0,0 +1,142 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import metrics
+
+
+class Overloaded(Exception):
+    """
+    Raised when an inference is shed because too many are running and waiting.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController(object):
+    """
+    Limits how many inferences run at once in this process, with a bounded wait queue.
+
+    Requests beyond max_concurrent wait in line; once max_queue are waiting, or a
+    request has waited longer than timeout, further requests are shed with
+    Overloaded instead of piling more CNN work onto the CPUs. The queue depth and
+    the number of running inferences are published as gauges in emotion.metrics.
+    """
+
+    def __init__(self, max_concurrent: int = 2, max_queue: int = 8, timeout: float = 5.0,
+                 retry_after: int = 5):
+        """
+        Initialize the controller.
+
+        Args:
+            max_concurrent (int): Inferences that run at once.
+            max_queue (int): Requests that can wait for a free slot.
+            timeout (float): Seconds a request waits before it is shed.
+            retry_after (int): Seconds clients are asked to wait before retrying a shed request.
+        """
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_queue = max(0, int(max_queue))
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def _publish(self) -> None:
+        # Called with the condition held
+        metrics.set_gauge('emotion.admission.active', self._active)
+        metrics.set_gauge('emotion.admission.queue_depth', self._waiting)
+
+    def _shed(self, reason: str):
+        metrics.increment('emotion.admission.shed')
+        metrics.increment(f'emotion.admission.shed.{reason}')
+        return Overloaded("The server is busy, please try again in a few seconds.", self.retry_after)
+
+    def check(self) -> None:
+        """
+        Shed a request up front if the queue is already full, before any work is done for it.
+
+        Raises:
+            Overloaded: If every slot is taken and the queue is full.
+        """
+        with self._condition:
+            if self._active >= self.max_concurrent and self._waiting >= self.max_queue:
+                raise self._shed('full')
+
+    @contextmanager
+    def admit(self):
+        """
+        Hold an inference slot for the duration of the block, waiting in line for one if needed.
+
+        Raises:
+            Overloaded: If the queue is full, or no slot freed up within the timeout.
+        """
+        with self._condition:
+            if self._active >= self.max_concurrent:
+                if self._waiting >= self.max_queue:
+                    raise self._shed('full')
+
+                self._waiting += 1
+                self._publish()
+                started = time.monotonic()
+                deadline = started + self.timeout
+                try:
+                    while self._active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise self._shed('timeout')
+                        self._condition.wait(remaining)
+                finally:
+                    self._waiting -= 1
+                    self._publish()
+                # Tenths of a second, so the histogram keeps a bounded number of buckets
+                metrics.observe('emotion.admission.wait_seconds', round(time.monotonic() - started, 1))
+
+            self._active += 1
+            self._publish()
+        metrics.increment('emotion.admission.admitted')
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active -= 1
+                self._publish()
+                self._condition.notify()
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller() -> AdmissionController:
+    """
+    Get the admission controller configured by the EMOTION_ADMISSION_* settings.
+
+    EMOTION_ADMISSION_MAX_CONCURRENT set to 0 or None disables admission control.
+    Predictions wait for admission before they are batched, so a limit below
+    EMOTION_BATCH_MAX_SIZE also caps the size of every batch.
+
+    Returns:
+        AdmissionController: The controller of this process, or None if disabled.
+    """
+    global _controller
+    max_concurrent = getattr(settings, 'EMOTION_ADMISSION_MAX_CONCURRENT', None)
+    if not max_concurrent:
+        return None
+
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(max_concurrent=max_concurrent,
+                                              max_queue=getattr(settings, 'EMOTION_ADMISSION_QUEUE_SIZE', 8),
+                                              timeout=getattr(settings, 'EMOTION_ADMISSION_TIMEOUT', 5.0),
+                                              retry_after=getattr(settings, 'EMOTION_ADMISSION_RETRY_AFTER', 5))
+        return _controller
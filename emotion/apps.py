@@ -1,5 +1,40 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def is_serving_process() -> bool:
+    """
+    Check whether this process is going to serve requests.
+
+    Management commands other than runserver, and the file watching parent of
+    the runserver autoreloader, never run emotion detection and should not pay
+    for loading TensorFlow.
+
+    Returns:
+        bool: True for web workers and the runserver child process.
+    """
+    if len(sys.argv) < 2 or os.path.basename(sys.argv[0]) != 'manage.py':
+        return True
+    if sys.argv[1] != 'runserver':
+        return False
+    return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
 
 
 class EmotionConfig(AppConfig):
     name = 'emotion'
+
+    def ready(self):
+        """
+        Start warming up the emotion model when a serving process loads the app, if enabled.
+
+        In preload mode the warm-up is left to the workers, after music.wsgi has loaded
+        the model and the server has forked, since a warm-up thread would not survive the fork.
+        """
+        if getattr(settings, 'EMOTION_PRELOAD', False):
+            return
+        if getattr(settings, 'EMOTION_WARMUP', False) and is_serving_process():
+            from .warmup import start_warm_up
+            start_warm_up()
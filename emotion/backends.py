@@ -0,0 +1,193 @@
+import json
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceBackend(object):
+    """
+    Interface of the runtimes that execute the emotion model.
+
+    A backend takes a batch of preprocessed ROI images and returns one row of
+    float scores per image, in the label order used by FacialExpressionModel.
+    """
+
+    name = None
+
+    def predict(self, roi_imgs: np.ndarray) -> np.ndarray:
+        """
+        Run the model on a batch of preprocessed ROI images.
+
+        Args:
+            roi_imgs (np.ndarray): A float32 (N, IMG_SIZE, IMG_SIZE, 3) array.
+
+        Returns:
+            np.ndarray: The (N, classes) prediction array.
+        """
+        raise NotImplementedError
+
+
+class KerasBackend(InferenceBackend):
+    """
+    Runs the original Keras model built from model_config.json and model_wts.h5.
+    """
+
+    name = 'keras'
+
+    def __init__(self, model_json_file: str, model_weights_file: str):
+        """
+        Initialize the backend by loading the Keras model.
+
+        Args:
+            model_json_file (str): Path to the JSON file containing the model architecture.
+            model_weights_file (str): Path to the file containing the model weights.
+        """
+        self.model = self.load_model(model_json_file, model_weights_file)
+
+    @staticmethod
+    def load_model(model_json_file: str, model_weights_file: str):
+        """
+        Load the pre-trained facial expression recognition model from JSON and weights files.
+
+        Args:
+            model_json_file (str): Path to the JSON file containing the model architecture.
+            model_weights_file (str): Path to the file containing the model weights.
+
+        Returns:
+            keras.Model: The loaded model.
+        """
+        # TensorFlow is imported here so that importing this module stays cheap
+        from tensorflow.keras.models import model_from_json
+
+        try:
+            with open(model_json_file, "r") as json_file:
+                loaded_model_in_json = json_file.read()
+                model = model_from_json(loaded_model_in_json)
+                model.load_weights(model_weights_file)
+            return model
+        except json.JSONDecodeError:
+            raise ValueError("The JSON file is not correctly formatted.")
+        except Exception as e:
+            raise ValueError(f"An error occurred while loading weights: {str(e)}")
+
+    def predict(self, roi_imgs: np.ndarray) -> np.ndarray:
+        return self.model.predict(roi_imgs, batch_size=len(roi_imgs), verbose=0)
+
+
+class TFLiteBackend(InferenceBackend):
+    """
+    Runs a converted TensorFlow Lite model, optionally int8 quantized.
+
+    Uses the standalone tflite_runtime package when it is installed and falls back
+    to the interpreter bundled with TensorFlow.
+    """
+
+    name = 'tflite'
+
+    def __init__(self, model_file: str, num_threads: int = None):
+        """
+        Initialize the backend by loading the TFLite model into an interpreter.
+
+        Args:
+            model_file (str): Path to the .tflite file.
+            num_threads (int, optional): Interpreter thread count, None for the runtime default.
+        """
+        try:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                from tensorflow.lite import Interpreter
+
+            self.interpreter = Interpreter(model_path=model_file, num_threads=num_threads)
+            self.interpreter.allocate_tensors()
+        except Exception as e:
+            raise ValueError(f"An error occurred while loading the TFLite model: {e}")
+
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self.batch_size = self.input_details['shape'][0]
+
+        # The interpreter holds per-call state, so calls must not overlap
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def quantize(values: np.ndarray, details: dict) -> np.ndarray:
+        """
+        Convert float values to the tensor's integer type if the tensor is quantized.
+
+        Args:
+            values (np.ndarray): The float values.
+            details (dict): The interpreter's tensor details.
+
+        Returns:
+            np.ndarray: Values of the tensor's dtype.
+        """
+        scale, zero_point = details['quantization']
+        if details['dtype'] == np.float32 or not scale:
+            return values.astype(details['dtype'], copy=False)
+        info = np.iinfo(details['dtype'])
+        return np.clip(np.round(values / scale + zero_point), info.min, info.max).astype(details['dtype'])
+
+    @staticmethod
+    def dequantize(values: np.ndarray, details: dict) -> np.ndarray:
+        """
+        Convert a quantized tensor's integer values back to float scores.
+
+        Args:
+            values (np.ndarray): The tensor values.
+            details (dict): The interpreter's tensor details.
+
+        Returns:
+            np.ndarray: Float32 values.
+        """
+        scale, zero_point = details['quantization']
+        if details['dtype'] == np.float32 or not scale:
+            return values.astype(np.float32, copy=False)
+        return ((values.astype(np.float32) - zero_point) * scale).astype(np.float32)
+
+    def predict(self, roi_imgs: np.ndarray) -> np.ndarray:
+        with self._lock:
+            if len(roi_imgs) != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input_details['index'], list(roi_imgs.shape))
+                self.interpreter.allocate_tensors()
+                self.input_details = self.interpreter.get_input_details()[0]
+                self.output_details = self.interpreter.get_output_details()[0]
+                self.batch_size = len(roi_imgs)
+
+            self.interpreter.set_tensor(self.input_details['index'], self.quantize(roi_imgs, self.input_details))
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self.output_details['index'])
+            return self.dequantize(output, self.output_details)
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+}
+
+
+def create_backend(name: str, model_json_file: str, model_weights_file: str, tflite_file: str = None,
+                   num_threads: int = None) -> InferenceBackend:
+    """
+    Create an inference backend by name.
+
+    Args:
+        name (str): 'keras' or 'tflite'.
+        model_json_file (str): Path to the JSON file containing the model architecture.
+        model_weights_file (str): Path to the file containing the model weights.
+        tflite_file (str, optional): Path to the .tflite file, required for the 'tflite' backend.
+        num_threads (int, optional): Interpreter thread count for the 'tflite' backend.
+
+    Returns:
+        InferenceBackend: The loaded backend.
+    """
+    if name == KerasBackend.name:
+        return KerasBackend(model_json_file, model_weights_file)
+    if name == TFLiteBackend.name:
+        if not tflite_file:
+            raise ValueError("The tflite backend needs a converted model file, see convert_tflite.")
+        return TFLiteBackend(tflite_file, num_threads=num_threads)
+    raise ValueError(f"Unknown inference backend '{name}'. Choose one of: {', '.join(BACKENDS)}.")
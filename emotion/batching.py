@@ -0,0 +1,119 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BatchScheduler(object):
+    """
+    Collect ROIs from concurrent requests and run them through the model in small batches.
+
+    The first queued ROI opens a batch window. The batch is run as soon as it is full
+    or the window has passed, and every caller gets back the row of the prediction
+    that belongs to its own ROI.
+    """
+
+    def __init__(self, predict_batch, max_batch_size: int = 8, max_wait_ms: float = 10):
+        """
+        Initialize the scheduler. The worker thread is started on the first submit.
+
+        Args:
+            predict_batch (Callable): Takes a (N, H, W, C) array and returns a (N, classes) array.
+            max_batch_size (int): The largest number of ROIs run in one predict call.
+            max_wait_ms (float): How long the first ROI of a batch waits for others to join.
+        """
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self) -> None:
+        """
+        Start the worker thread if it is not running yet.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="emotion-batcher", daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the worker thread once the ROIs already queued have been processed.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def submit(self, roi_img: np.ndarray, timeout: float = None) -> np.ndarray:
+        """
+        Queue one preprocessed ROI and wait for its prediction.
+
+        Args:
+            roi_img (np.ndarray): The preprocessed ROI image.
+            timeout (float, optional): Seconds to wait for the result.
+
+        Returns:
+            np.ndarray: The prediction scores for this ROI.
+        """
+        self.start()
+        future = Future()
+        self._queue.put((roi_img, future))
+        return future.result(timeout)
+
+    def _collect(self, first) -> list:
+        """
+        Gather queued ROIs behind the first one until the batch is full or the window passes.
+
+        Args:
+            first (tuple): The (roi, future) pair that opened the batch.
+
+        Returns:
+            list: The (roi, future) pairs of the batch.
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Stop request: finish this batch and put the marker back for the loop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        """
+        Worker loop: build batches, run one predict call per batch and resolve the futures.
+        """
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+
+            batch = self._collect(first)
+            metrics.observe('emotion.batch_size', len(batch))
+            try:
+                stacked = np.stack([roi for roi, _ in batch])
+                predictions = self.predict_batch(stacked)
+                for (_, future), prediction in zip(batch, predictions):
+                    future.set_result(prediction)
+            except Exception as e:
+                logger.exception("Batched emotion prediction failed")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
@@ -0,0 +1,158 @@
+import io
+
+import cv2
+import numpy as np
+
+# cv2.imdecode flags that let the decoder scale the image down while decoding,
+# which for JPEG skips most of the work through DCT scaling
+REDUCED_COLOR_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def read_image_size(image_data: bytes) -> tuple:
+    """
+    Read the width and height of an image from its header, without decoding it.
+
+    Args:
+        image_data (bytes): The encoded image.
+
+    Returns:
+        tuple: The (width, height) of the image, or None if the header cannot be read.
+    """
+    from PIL import Image as PILImage
+
+    try:
+        with PILImage.open(io.BytesIO(image_data)) as header:
+            return header.size
+    except Exception:
+        return None
+
+
+def choose_reduction(long_side: int, target_size: int) -> int:
+    """
+    Pick the largest decoder reduction that keeps the long side at or above the target.
+
+    Args:
+        long_side (int): The long side of the full resolution image.
+        target_size (int): The wanted long side of the decoded image.
+
+    Returns:
+        int: 1, 2, 4 or 8.
+    """
+    for factor in (8, 4, 2):
+        if long_side // factor >= target_size:
+            return factor
+    return 1
+
+
+def decode(image_data: bytes, reduction: int = 1) -> np.ndarray:
+    """
+    Decode an image in color from memory, scaled down by the given reduction.
+
+    Args:
+        image_data (bytes): The encoded image.
+        reduction (int): 1, 2, 4 or 8.
+
+    Returns:
+        numpy.ndarray: The BGR image.
+    """
+    try:
+        image = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), REDUCED_COLOR_FLAGS[reduction])
+        if image is None:
+            raise ValueError("Failed to load image. The file may be corrupted or format is not supported.")
+    except Exception as e:
+        raise IOError(f"An error occurred while loading the image: {str(e)}")
+    return image
+
+
+class ProxyImage(object):
+    """
+    A reduced resolution decode of an image, used for the cheap stages and face detection.
+
+    Face boxes found on the proxy are mapped back to full resolution, and the face is
+    cropped from the smallest decode that still has enough pixels for the model.
+
+    Attributes:
+        image_data (bytes): The encoded image.
+        image (np.ndarray): The proxy BGR image.
+        scale (float): Full resolution pixels per proxy pixel.
+        full_size (tuple): The (width, height) of the full resolution image.
+    """
+
+    def __init__(self, image_data: bytes, target_size: int = 0):
+        """
+        Decode the proxy image.
+
+        Args:
+            image_data (bytes): The encoded image.
+            target_size (int): The wanted long side of the proxy; 0 decodes at full resolution.
+        """
+        self.image_data = image_data
+        self.reduction = 1
+        self._decodes = {}
+
+        size = read_image_size(image_data) if target_size else None
+        if size:
+            self.reduction = choose_reduction(max(size), target_size)
+        self.image = decode(image_data, self.reduction)
+
+        height, width = self.image.shape[:2]
+        self.full_size = size or (width, height)
+        self.scale = float(self.reduction)
+
+        # Formats without decoder scaling, or images far above the target, are resized down the rest of the way
+        long_side = max(width, height)
+        if target_size and long_side > target_size * 1.5:
+            ratio = target_size / long_side
+            self.image = cv2.resize(self.image, (round(width * ratio), round(height * ratio)),
+                                    interpolation=cv2.INTER_AREA)
+            self.scale = self.reduction / ratio
+
+    def to_full(self, box) -> tuple:
+        """
+        Map a box on the proxy to full resolution coordinates.
+
+        Args:
+            box (tuple): The (x, y, w, h) box on the proxy.
+
+        Returns:
+            tuple: The (x, y, w, h) box at full resolution.
+        """
+        return tuple(int(round(value * self.scale)) for value in box)
+
+    def face_source(self, box, min_side: int) -> tuple:
+        """
+        Get an image and box to crop a face from with at least min_side pixels across.
+
+        The proxy itself is used when its face is already big enough, otherwise the
+        image is decoded again with the smallest reduction that is big enough.
+
+        Args:
+            box (tuple): The (x, y, w, h) face box on the proxy.
+            min_side (int): The side length the face will be resized to.
+
+        Returns:
+            tuple: The BGR image and the face box on that image.
+        """
+        if self.scale == 1.0 or min(box[2], box[3]) >= min_side:
+            return self.image, tuple(int(value) for value in box)
+
+        full_box = self.to_full(box)
+        reduction = 1
+        for factor in (8, 4, 2):
+            if min(full_box[2], full_box[3]) // factor >= min_side:
+                reduction = factor
+                break
+
+        if reduction >= self.scale:
+            # No decode is sharper than the proxy for this face
+            return self.image, tuple(int(value) for value in box)
+
+        # Faces of a group photo usually need the same decode, so keep it around
+        if reduction not in self._decodes:
+            self._decodes[reduction] = decode(self.image_data, reduction)
+        return self._decodes[reduction], tuple(value // reduction for value in full_box)
@@ -1,58 +1,49 @@
-from tensorflow.keras.models import model_from_json
 import numpy as np
 import cv2
 import logging
 import os
-import json
+import threading
+
+from .backends import InferenceBackend, KerasBackend
 
 logger = logging.getLogger(__name__)
 
+FACE_CASCADE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "haarcascade_frontalface_default.xml")
+
+# Per-thread scratch buffers reused by prepare_roi
+_roi_buffers = threading.local()
+
 
 class FacialExpressionModel(object):
     """
     Class to load a pre-trained facial expression recognition model and predict emotions from images.
     """
 
-    emotion_output = None
     IMG_SIZE = 256
 
-    def __init__(self, model_json_file: str, model_weights_file: str, img_file: str):
+    def __init__(self, model_json_file: str = None, model_weights_file: str = None, face_cascade=None,
+                 backend: InferenceBackend = None):
         """
         Initialize the FacialExpressionModel object.
 
-        Args:
-            model_json_file (str): Path to the JSON file containing the model architecture.
-            model_weights_file (str): Path to the file containing the model weights.
-            img_file (str): Path to the image file to predict emotions from.
-        """
-        self.model = self.load_model(model_json_file, model_weights_file)
-        self.image = self.load_image(img_file)
-        self.face_cascade = self.load_face_cascade()
+        The object only holds the inference backend and the face cascade, so a single
+        instance can be shared between concurrent requests. Per-image state is
+        passed to and returned from the methods below.
 
-    @staticmethod
-    def load_model(model_json_file: str, model_weights_file: str):
-        """
-        Load the pre-trained facial expression recognition model from JSON and weights files.
+        Without a backend or model files only the face detection and preprocessing
+        methods are usable, which is what web workers need when inference runs elsewhere.
 
         Args:
-            model_json_file (str): Path to the JSON file containing the model architecture.
-            model_weights_file (str): Path to the file containing the model weights.
-
-        Returns:
-            keras.Model: The loaded model.
+            model_json_file (str, optional): Path to the JSON file containing the model architecture.
+            model_weights_file (str, optional): Path to the file containing the model weights.
+            face_cascade (cv2.CascadeClassifier, optional): An already loaded face cascade.
+            backend (InferenceBackend, optional): The runtime to predict with. Defaults to the
+                Keras model loaded from the model files.
         """
-
-        try:
-            with open(model_json_file, "r") as json_file:
-                loaded_model_in_json = json_file.read()
-                model = model_from_json(loaded_model_in_json)
-                model.load_weights(model_weights_file)
-            return model
-        except json.JSONDecodeError:
-            raise ValueError("The JSON file is not correctly formatted.")
-        except Exception as e:
-            raise ValueError(f"An error occurred while loading weights: {str(e)}")
-        
+        if backend is None and model_json_file is not None:
+            backend = KerasBackend(model_json_file, model_weights_file)
+        self.backend = backend
+        self.face_cascade = face_cascade if face_cascade is not None else self.load_face_cascade()
 
     @staticmethod
     def load_image(img_file: str):
@@ -74,49 +65,50 @@ class FacialExpressionModel(object):
         return image
 
     @staticmethod
-    def load_face_cascade():
+    def load_face_cascade(cascade_file: str = FACE_CASCADE_PATH):
         """
         Load the Haar cascade classifier for face detection.
 
+        Args:
+            cascade_file (str): Path to the Haar cascade XML file.
+
         Returns:
             cv2.CascadeClassifier: The loaded face cascade classifier.
         """
         try:
             # Load the Haar cascade classifier
-            face_cascade = cv2.CascadeClassifier("emotion/haarcascade_frontalface_default.xml")
+            face_cascade = cv2.CascadeClassifier(cascade_file)
+            if face_cascade.empty():
+                raise ValueError(f"Could not read the cascade file {cascade_file}.")
             return face_cascade
 
         except Exception as e:
             # Generic exception for any other issues
             raise ValueError(f"An error occurred while loading the Haar cascade: {e}")
 
-    def preprocess_img(self):
+    def preprocess_img(self, image):
         """
-        Preprocess the image by resizing and converting to RGB format, and detecting faces.
+        Detect the face in the image and turn it into a normalized RGB model input.
+
+        Args:
+            image (numpy.ndarray): The BGR image as returned by load_image.
 
         Returns:
             tuple: A tuple containing a boolean indicating success or failure of preprocessing
-                   and the preprocessed ROI image.
+                   and the preprocessed ROI image. The ROI is a reused per-thread buffer,
+                   see prepare_roi.
         """
         try:
-            # Convert image to RGB
-            self.image = self.convert_to_rgb(self.image)
-
-            # Detect faces in the image
-            faces = self.detect_faces()
-
-            print(faces)
+            # Detect faces on a grayscale copy, which is what the Haar cascade works on
+            faces = self.detect_faces(self.to_grayscale(image))
 
-            if not faces.any():  # Check if any faces were detected
+            if not len(faces):  # Check if any faces were detected
                 return "noFace", None
             elif len(faces) > 1:  # Check if more than one face is detected
                 return "mulFace", None
             else:
-                # Extract Region of Interest (ROI), resize, and normalize it
-                roi_img = self.extract_roi(faces)
-                roi_img = self.resize_image(roi_img)
-                roi_img = self.normalize_image(roi_img)
-                return True, roi_img
+                # Crop, resize, convert and normalize the Region of Interest (ROI) in one pass
+                return True, self.prepare_roi(image, faces[0])
 
         except AttributeError as e:
             # Handle errors related to method calls or property accesses
@@ -151,21 +143,39 @@ class FacialExpressionModel(object):
             # General exception catch, if any other unexpected error occurs
             raise ValueError(f"An unexpected error occurred during RGB conversion: {e}")
 
-    def detect_faces(self):
+    @staticmethod
+    def to_grayscale(image):
+        """
+        Convert a BGR image to grayscale.
+
+        Args:
+            image: The input BGR image.
+
+        Returns:
+            numpy.ndarray: The single channel image.
+        """
+        try:
+            return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        except cv2.error as e:
+            raise ValueError(f"OpenCV error during grayscale conversion: {e}")
+
+    def detect_faces(self, image):
         """
         Detect faces in the image.
 
+        Args:
+            image (numpy.ndarray): The grayscale image to search for faces. A BGR image is
+                converted to grayscale first.
+
         Returns:
             list: List of tuples containing coordinates (x, y, w, h) of detected faces.
         """
         try:
-            # Convert the image from BGR to RGB
-            img = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
+            if image.ndim == 3:
+                image = self.to_grayscale(image)
 
             # Detect faces in the image
-            faces = self.face_cascade.detectMultiScale(img, 1.3, 5)
-
-            print(faces)
+            faces = self.face_cascade.detectMultiScale(image, 1.3, 5)
             return faces
 
         except cv2.error as e:
@@ -180,11 +190,53 @@ class FacialExpressionModel(object):
             # Catch all other exceptions
             raise ValueError(f"An unexpected error occurred during face detection: {e}")
 
-    def extract_roi(self, faces):
+    @classmethod
+    def prepare_roi(cls, image, face_box, out: np.ndarray = None) -> np.ndarray:
+        """
+        Crop a face from a BGR image and turn it into a normalized RGB model input.
+
+        The crop is resized straight into a reused uint8 buffer, only the small
+        resized crop is color converted, and the result is normalized in place
+        into a float32 buffer, so no full size or float64 copies are made.
+
+        Args:
+            image (numpy.ndarray): The BGR image.
+            face_box (tuple): The (x, y, w, h) box of the face.
+            out (np.ndarray, optional): A float32 (IMG_SIZE, IMG_SIZE, 3) array to write into.
+                Defaults to a per-thread buffer that the next call on the same thread
+                overwrites, so copy the result if it has to outlive the request.
+
+        Returns:
+            np.ndarray: The float32 (IMG_SIZE, IMG_SIZE, 3) ROI with values in [0, 1].
+        """
+        size = cls.IMG_SIZE
+        if getattr(_roi_buffers, 'resized', None) is None:
+            _roi_buffers.resized = np.empty((size, size, 3), dtype=np.uint8)
+            _roi_buffers.rgb = np.empty((size, size, 3), dtype=np.uint8)
+            _roi_buffers.roi = np.empty((size, size, 3), dtype=np.float32)
+        if out is None:
+            out = _roi_buffers.roi
+
+        try:
+            x, y, w, h = (int(value) for value in face_box)
+            cv2.resize(image[y: y + h, x: x + w], (size, size), dst=_roi_buffers.resized)
+            cv2.cvtColor(_roi_buffers.resized, cv2.COLOR_BGR2RGB, dst=_roi_buffers.rgb)
+            np.multiply(_roi_buffers.rgb, np.float32(1.0 / 255.0), out=out)
+            return out
+
+        except cv2.error as e:
+            raise ValueError(f"OpenCV error while preparing the ROI: {e}")
+
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Check the face box and the image array: {e}")
+
+    @staticmethod
+    def extract_roi(image, faces):
         """
         Extract region of interest (ROI) from the image based on detected faces.
 
         Args:
+            image (numpy.ndarray): The image the faces were detected in.
             faces (list): List of tuples containing coordinates (x, y, w, h) of detected faces.
 
         Returns:
@@ -195,8 +247,7 @@ class FacialExpressionModel(object):
             x, y, w, h = faces[0]
 
             # Extract the ROI from the image using these coordinates
-            roi = self.image[y: y + h, x: x + w]
-            print(roi)
+            roi = image[y: y + h, x: x + w]
             return roi
 
         except IndexError as e:
@@ -267,7 +318,7 @@ class FacialExpressionModel(object):
             # Catch any other unexpected exceptions
             raise ValueError(f"An unexpected error occurred during image normalization: {e}")
 
-    def predict_emotion(self, roi_img: np.ndarray) -> bool:
+    def predict_emotion(self, roi_img: np.ndarray):
         """
         Predict the emotion from the preprocessed ROI image.
 
@@ -275,17 +326,16 @@ class FacialExpressionModel(object):
             roi_img (np.ndarray): The preprocessed ROI image.
 
         Returns:
-            bool: True if prediction is successful, False otherwise.
+            Optional[str]: The predicted emotion label, or None if no prediction was made.
         """
         try:
             # Attempt to get a prediction for the ROI image
             prediction = self.get_prediction(roi_img)
             if prediction is None:
-                return False
+                return None
 
             # Convert the prediction to an emotion label
-            self.emotion_output = self.get_emotion_label(prediction)
-            return True
+            return self.get_emotion_label(prediction)
 
         except TypeError as e:
             # Handle cases where roi_img might not be a numpy array or other type issues
@@ -312,10 +362,25 @@ class FacialExpressionModel(object):
         try:
             # Ensure the image is reshaped to the expected input dimensions for the model
             prepared_img = roi_img.reshape(1, self.IMG_SIZE, self.IMG_SIZE, 3)
-            return self.model.predict(prepared_img)
+            return self.predict_batch(prepared_img)
         except Exception as e:
             raise ValueError(f"An error occurred during prediction: {e}")
 
+    def predict_batch(self, roi_imgs: np.ndarray) -> np.ndarray:
+        """
+        Run one model call on a batch of preprocessed ROI images.
+
+        Args:
+            roi_imgs (np.ndarray): The ROI images stacked into a (N, IMG_SIZE, IMG_SIZE, 3) array.
+
+        Returns:
+            np.ndarray: The (N, classes) prediction array.
+        """
+        try:
+            return self.backend.predict(roi_imgs)
+        except Exception as e:
+            raise ValueError(f"An error occurred during batch prediction: {e}")
+
     @staticmethod
     def get_emotion_label(prediction: np.ndarray) -> str:
         """
@@ -346,24 +411,3 @@ class FacialExpressionModel(object):
         except Exception as e:
             # General catch-all for any other unexpected exceptions
             raise ValueError(f"An unexpected error occurred while getting the emotion label: {e}")
-
-    def get_emotions(self):
-        """
-        Get the predicted emotion.
-
-        Returns:
-            str: The predicted emotion.
-        """
-
-        try:
-            # Check if emotion_output has been set and is of correct format
-            
-            return self.emotion_output
-
-        except AttributeError as e:
-            # Catch attribute errors specifically related to emotion_output
-            raise AttributeError(f"Attribute error: {e}")
-
-        except Exception as e:
-            # General catch-all for any other unexpected exceptions
-            raise ValueError(f"An unexpected error occurred while getting the emotions: {e}")
@@ -0,0 +1,132 @@
+import threading
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_schedulers = {}
+
+
+def get_scheduler(model):
+    """
+    Get the batch scheduler of a loaded model, creating it on first use.
+
+    Args:
+        model (FacialExpressionModel): The shared model the batches are run on.
+
+    Returns:
+        BatchScheduler: The scheduler for this model.
+    """
+    # Imported here so that importing this module, e.g. from the URLconf, does not import NumPy
+    from .batching import BatchScheduler
+
+    with _lock:
+        entry = _schedulers.get(id(model))
+        if entry is None or entry[0] is not model:
+            scheduler = BatchScheduler(model.predict_batch,
+                                       max_batch_size=getattr(settings, 'EMOTION_BATCH_MAX_SIZE', 8),
+                                       max_wait_ms=getattr(settings, 'EMOTION_BATCH_MAX_WAIT_MS', 10))
+            entry = (model, scheduler)
+            _schedulers[id(model)] = entry
+        return entry[1]
+
+
+def stop_scheduler(model) -> None:
+    """
+    Stop and forget the batch scheduler of a model, e.g. before the model is dropped.
+
+    Args:
+        model (FacialExpressionModel): The model whose scheduler should be stopped.
+    """
+    with _lock:
+        entry = _schedulers.pop(id(model), None)
+    if entry is not None:
+        entry[1].stop()
+
+
+def use_inference_pool() -> bool:
+    """
+    Check whether inference is handed off to the local inference processes.
+
+    Returns:
+        bool: True if EMOTION_INFERENCE_POOL is enabled.
+    """
+    return getattr(settings, 'EMOTION_INFERENCE_POOL', False)
+
+
+def get_inference_pool(version: str = None):
+    """
+    Get the running inference pool configured by the EMOTION_INFERENCE_POOL_* settings.
+
+    Args:
+        version (str, optional): The model version the pool runs; None for the active one.
+
+    Returns:
+        InferencePool: The pool of this web process.
+    """
+    # Imported here because emotion.views imports this module, and the pool module imports NumPy
+    from . import inference_pool
+    from .views import get_active_version, get_backend_settings, get_version_paths
+
+    version = version or get_active_version()
+    model_json_path, model_weights_path = get_version_paths(version)
+    return inference_pool.get_pool(model_json_path, model_weights_path, get_backend_settings(version),
+                                   size=getattr(settings, 'EMOTION_INFERENCE_POOL_SIZE', 2),
+                                   intra_op_threads=getattr(settings, 'EMOTION_INFERENCE_POOL_INTRA_OP_THREADS', 1),
+                                   inter_op_threads=getattr(settings, 'EMOTION_INFERENCE_POOL_INTER_OP_THREADS', 1),
+                                   timeout=getattr(settings, 'EMOTION_INFERENCE_POOL_TIMEOUT', 30.0))
+
+
+def predict_probabilities(model, roi_img):
+    """
+    Get the prediction scores for one preprocessed ROI.
+
+    With EMOTION_INFERENCE_POOL enabled the ROI is sent to the inference processes.
+    Otherwise, with EMOTION_BATCHING enabled the ROI is batched together with those
+    of concurrent requests, or else the model is called directly.
+
+    Args:
+        model (FacialExpressionModel): The shared model.
+        roi_img (np.ndarray): The preprocessed ROI image.
+
+    Returns:
+        np.ndarray: The prediction scores, one per emotion label.
+    """
+    if use_inference_pool():
+        return get_inference_pool().predict(roi_img)
+    if getattr(settings, 'EMOTION_BATCHING', False):
+        return get_scheduler(model).submit(roi_img)
+    return model.get_prediction(roi_img)[0]
+
+
+def predict_batch_probabilities(model, roi_imgs):
+    """
+    Get the prediction scores for a batch of preprocessed ROIs of the same image.
+
+    The batch goes to the model in one call. With EMOTION_INFERENCE_POOL enabled the
+    ROIs are sent to the inference processes one by one instead.
+
+    Args:
+        model (FacialExpressionModel): The shared model.
+        roi_imgs (np.ndarray): The ROIs stacked into a (N, IMG_SIZE, IMG_SIZE, 3) array.
+
+    Returns:
+        np.ndarray: The (N, classes) prediction scores.
+    """
+    if use_inference_pool():
+        pool = get_inference_pool()
+        return [pool.predict(roi_img) for roi_img in roi_imgs]
+    return model.predict_batch(roi_imgs)
+
+
+def predict_emotion(model, roi_img) -> str:
+    """
+    Predict the emotion label for one preprocessed ROI.
+
+    Args:
+        model (FacialExpressionModel): The shared model.
+        roi_img (np.ndarray): The preprocessed ROI image.
+
+    Returns:
+        str: The predicted emotion label.
+    """
+    return model.get_emotion_label(predict_probabilities(model, roi_img))
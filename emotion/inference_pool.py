@@ -0,0 +1,399 @@
+import atexit
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Must match FacialExpressionModel.IMG_SIZE and its labels; not imported from there
+# so that web workers using the pool never import OpenCV or TensorFlow through it
+IMG_SIZE = 256
+NUM_CLASSES = 3
+INPUT_SHAPE = (IMG_SIZE, IMG_SIZE, 3)
+INPUT_BYTES = int(np.prod(INPUT_SHAPE)) * np.dtype(np.float32).itemsize
+OUTPUT_BYTES = NUM_CLASSES * np.dtype(np.float32).itemsize
+
+# Seconds between checks of the dispatcher for inference processes that exited
+DEAD_PROCESS_CHECK_INTERVAL = 1.0
+
+
+def _slot_arrays(block: shared_memory.SharedMemory) -> tuple:
+    """
+    View a shared memory slot as its input ROI and output score arrays.
+
+    Args:
+        block (SharedMemory): The slot's shared memory block.
+
+    Returns:
+        tuple: The (IMG_SIZE, IMG_SIZE, 3) input array and the (NUM_CLASSES,) output array.
+    """
+    roi = np.ndarray(INPUT_SHAPE, dtype=np.float32, buffer=block.buf, offset=0)
+    scores = np.ndarray((NUM_CLASSES,), dtype=np.float32, buffer=block.buf, offset=INPUT_BYTES)
+    return roi, scores
+
+
+def _worker_main(model_json_file: str, model_weights_file: str, backend_options: dict, slot_names: list,
+                 intra_op_threads: int, inter_op_threads: int, tasks, results) -> None:
+    """
+    Entry point of an inference process.
+
+    Loads the model once, then reads ROIs from the shared memory slots named in the
+    task queue and writes the prediction scores back into the same slot.
+
+    Args:
+        model_json_file (str): Path to the JSON file containing the model architecture.
+        model_weights_file (str): Path to the file containing the model weights.
+        backend_options (dict): Backend name and options, see backends.create_backend.
+        slot_names (list): Names of the shared memory slots created by the parent.
+        intra_op_threads (int): TensorFlow intra-op thread count, 0 for the TensorFlow default. Also the
+            TFLite interpreter thread count unless the backend options set num_threads.
+        inter_op_threads (int): TensorFlow inter-op thread count, 0 for the TensorFlow default.
+        tasks (multiprocessing.Queue): Incoming (request_id, slot) pairs, None to stop.
+        results (multiprocessing.Queue): Outgoing (request_id, error) pairs.
+    """
+    backend_options = dict(backend_options)
+    backend_name = backend_options.pop('backend_name', 'keras')
+    if backend_name == 'keras':
+        import tensorflow as tf
+
+        # Thread pools must be sized before TensorFlow runs anything
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    elif backend_options.get('num_threads') is None and intra_op_threads:
+        # The TFLite interpreter has a single thread pool, sized like TensorFlow's intra-op one
+        backend_options['num_threads'] = intra_op_threads
+
+    from .backends import create_backend
+    from .emotion_model import FacialExpressionModel
+
+    backend = create_backend(backend_name, model_json_file, model_weights_file, **backend_options)
+    model = FacialExpressionModel(backend=backend)
+    blocks = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    slots = [_slot_arrays(block) for block in blocks]
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            request_id, slot = task
+            try:
+                roi, scores = slots[slot]
+                scores[:] = model.get_prediction(roi)[0]
+                results.put((request_id, None))
+            except Exception as e:
+                results.put((request_id, str(e)))
+    finally:
+        del slots
+        for block in blocks:
+            block.close()
+
+
+class InferencePool(object):
+    """
+    A small pool of local processes that run the emotion model for the web workers.
+
+    ROIs and prediction scores are exchanged through preallocated shared memory
+    slots, so only a request id and a slot number go through the queues.
+
+    If an inference process exits, every waiting request fails and the pool is
+    started again by the next request.
+    """
+
+    def __init__(self, model_json_file: str, model_weights_file: str, backend_options: dict = None, size: int = 2,
+                 intra_op_threads: int = 1, inter_op_threads: int = 1, timeout: float = 30.0):
+        """
+        Initialize the pool. Processes are started by start().
+
+        Args:
+            model_json_file (str): Path to the JSON file containing the model architecture.
+            model_weights_file (str): Path to the file containing the model weights.
+            backend_options (dict, optional): Backend name and options, see backends.create_backend.
+            size (int): Number of inference processes.
+            intra_op_threads (int): TensorFlow intra-op thread count per process.
+            inter_op_threads (int): TensorFlow inter-op thread count per process.
+            timeout (float): Default seconds to wait for a free slot and for a result.
+        """
+        self.model_json_file = model_json_file
+        self.model_weights_file = model_weights_file
+        self.backend_options = backend_options or {}
+        self.size = max(1, int(size))
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending = {}
+        self._abandoned = {}
+        self._blocks = []
+        self._slots = []
+        self._free_slots = queue.Queue()
+        self._processes = []
+        self._dispatcher = None
+        self._tasks = None
+        self._results = None
+        self._broken = False
+
+    def start(self) -> None:
+        """
+        Allocate the shared memory slots and start the inference processes.
+
+        Does nothing if the pool is running, and starts it again if one of its processes exited.
+        """
+        with self._lock:
+            self._start()
+
+    def _start(self) -> tuple:
+        """
+        Start the pool unless it is running. Called with the lock held.
+
+        Returns:
+            tuple: The free slot queue, the slot arrays and the task queue of the running processes.
+        """
+        if self._processes and not self._broken:
+            return self._free_slots, self._slots, self._tasks
+        self._stop()
+
+        # Spawn rather than fork: the web worker may already run threads
+        context = multiprocessing.get_context('spawn')
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._free_slots = queue.Queue()
+        self._broken = False
+
+        # Two slots per process keep every process busy while results are collected
+        for slot in range(self.size * 2):
+            block = shared_memory.SharedMemory(create=True, size=INPUT_BYTES + OUTPUT_BYTES)
+            self._blocks.append(block)
+            self._slots.append(_slot_arrays(block))
+            self._free_slots.put(slot)
+
+        slot_names = [block.name for block in self._blocks]
+        for index in range(self.size):
+            process = context.Process(
+                target=_worker_main, name=f"emotion-inference-{index}", daemon=True,
+                args=(self.model_json_file, self.model_weights_file, self.backend_options, slot_names,
+                      self.intra_op_threads, self.inter_op_threads, self._tasks, self._results))
+            process.start()
+            self._processes.append(process)
+
+        # The dispatcher gets the objects of this start, so it never mixes them up with those of a restart
+        self._dispatcher = threading.Thread(target=self._dispatch, name="emotion-inference-results", daemon=True,
+                                            args=(self._results, self._processes, self._slots, self._free_slots))
+        self._dispatcher.start()
+        logger.info("Started %d emotion inference processes", self.size)
+        return self._free_slots, self._slots, self._tasks
+
+    def _dispatch(self, results, processes: list, slots: list, free_slots: queue.Queue) -> None:
+        """
+        Resolve the waiting futures as the inference processes report back, and fail
+        them all if a process exits.
+
+        Args:
+            results (multiprocessing.Queue): The result queue of the processes.
+            processes (list): The inference processes.
+            slots (list): The slot arrays the processes write to.
+            free_slots (queue.Queue): The queue answered slots are returned to.
+        """
+        while True:
+            try:
+                message = results.get(timeout=DEAD_PROCESS_CHECK_INTERVAL)
+            except queue.Empty:
+                message = ()
+            if message is None:
+                return
+            if message:
+                self._resolve(*message, slots, free_slots)
+
+            exited = [process for process in processes if process.exitcode is not None]
+            if exited and not self._broken:
+                self._fail(f"Inference process {exited[0].name} exited with code {exited[0].exitcode}.")
+                return
+
+    def _resolve(self, request_id: int, error: str, slots: list, free_slots: queue.Queue) -> None:
+        """
+        Resolve the future of an answered request and free its slot.
+
+        Args:
+            request_id (int): The request the inference process answered.
+            error (str): The error message of the process, None on success.
+            slots (list): The slot arrays of the processes that answered.
+            free_slots (queue.Queue): The queue the slot is returned to.
+        """
+        with self._pending_lock:
+            future, slot = self._pending.pop(request_id, (None, None))
+            if future is None:
+                # The request timed out, but its slot can be used again now
+                slot = self._abandoned.pop(request_id, None)
+        if future is not None:
+            # Copied before the slot is freed and reused by the next request
+            if error is None:
+                future.set_result(slots[slot][1].copy())
+            else:
+                future.set_exception(ValueError(f"Inference process failed: {error}"))
+        if slot is not None:
+            free_slots.put(slot)
+
+    def _fail(self, message: str) -> None:
+        """
+        Mark the pool as broken and fail every waiting request, e.g. after a process exited.
+
+        Args:
+            message (str): The reason, used as the message of the raised ValueError.
+        """
+        with self._pending_lock:
+            self._broken = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._abandoned.clear()
+        logger.error("%s Failing %d waiting requests.", message, len(pending))
+        for future, _ in pending:
+            future.set_exception(ValueError(message))
+
+    def predict(self, roi_img: np.ndarray, timeout: float = None) -> np.ndarray:
+        """
+        Run one preprocessed ROI through the pool and wait for its prediction.
+
+        Args:
+            roi_img (np.ndarray): The preprocessed (IMG_SIZE, IMG_SIZE, 3) ROI image.
+            timeout (float, optional): Seconds to wait for a free slot and for the result,
+                the timeout of the pool if None.
+
+        Returns:
+            np.ndarray: The prediction scores, one per emotion label.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            # Taken together, since a restart after a crash replaces all of them
+            free_slots, slots, tasks = self._start()
+        try:
+            slot = free_slots.get(timeout=timeout)
+        except queue.Empty:
+            raise ValueError("No free inference slot became available in time.")
+
+        future = Future()
+        request_id = None
+        try:
+            slots[slot][0][...] = roi_img
+            with self._pending_lock:
+                if self._broken or self._tasks is not tasks:
+                    raise ValueError("The inference processes are restarting, try again.")
+                request_id = next(self._ids)
+                self._pending[request_id] = (future, slot)
+            tasks.put((request_id, slot))
+        except BaseException:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            free_slots.put(slot)
+            raise
+
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            with self._pending_lock:
+                if self._pending.pop(request_id, None) is not None:
+                    # The process may still write into the slot, so it is only freed when its answer arrives
+                    self._abandoned[request_id] = slot
+                    raise ValueError("The inference process did not answer in time.")
+            # Answered while the timeout was handled
+            return future.result()
+
+    def _stop(self) -> None:
+        """
+        Stop the inference processes and release the shared memory slots. Called with the lock held.
+        """
+        if not self._processes:
+            return
+        # Keeps the dispatcher from reporting the processes stopped here as crashed
+        with self._pending_lock:
+            self._broken = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+        self._dispatcher.join(timeout=5)
+        if self._pending:
+            self._fail("The inference pool was stopped.")
+
+        self._slots = []
+        for block in self._blocks:
+            try:
+                block.close()
+            except BufferError:
+                # A request that took its slot before the restart still holds a view; it is closed once collected
+                pass
+            block.unlink()
+        self._blocks = []
+        self._processes = []
+
+    def close(self) -> None:
+        """
+        Stop the inference processes and release the shared memory slots.
+        """
+        with self._lock:
+            self._stop()
+
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def get_pool(model_json_file: str, model_weights_file: str, backend_options: dict, size: int,
+             intra_op_threads: int, inter_op_threads: int, timeout: float = 30.0) -> InferencePool:
+    """
+    Get the inference pool of this web process for a model, starting it on first use.
+
+    Each model version gets its own pool, so a swapped-in version never shares
+    processes with the one it replaces.
+
+    Args:
+        model_json_file (str): Path to the JSON file containing the model architecture.
+        model_weights_file (str): Path to the file containing the model weights.
+        backend_options (dict): Backend name and options, see backends.create_backend.
+        size (int): Number of inference processes.
+        intra_op_threads (int): TensorFlow intra-op thread count per process.
+        inter_op_threads (int): TensorFlow inter-op thread count per process.
+        timeout (float): Default seconds to wait for a free slot and for a result.
+
+    Returns:
+        InferencePool: The running pool.
+    """
+    key = (str(model_json_file), str(model_weights_file), tuple(sorted(backend_options.items())))
+    with _pool_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = InferencePool(model_json_file, model_weights_file, backend_options, size, intra_op_threads,
+                                 inter_op_threads, timeout)
+            atexit.register(pool.close)
+            _pools[key] = pool
+    pool.start()
+    return pool
+
+
+def release_pools(model_json_file: str) -> int:
+    """
+    Stop and forget the pools of a model, e.g. once a model version is no longer active.
+
+    Args:
+        model_json_file (str): Path to the JSON file of the model.
+
+    Returns:
+        int: The number of pools stopped.
+    """
+    with _pool_lock:
+        keys = [key for key in _pools if key[0] == str(model_json_file)]
+        pools = [_pools.pop(key) for key in keys]
+    for pool in pools:
+        pool.close()
+    return len(pools)
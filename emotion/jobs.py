@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+DETECTING = 'detecting'
+PREDICTING = 'predicting'
+BUILDING_PLAYLIST = 'building playlist'
+DONE = 'done'
+FAILED = 'failed'
+
+# Pipeline stages, and the playlist step after them, mapped to the state a client sees
+STAGE_STATES = {
+    'decode': DETECTING,
+    'size': DETECTING,
+    'blur': DETECTING,
+    'faces': DETECTING,
+    'predict': PREDICTING,
+    'playlist': BUILDING_PLAYLIST,
+}
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when a job is submitted while the queue of waiting jobs is full.
+    """
+
+
+class Job(object):
+    """
+    One emotion detection running in the background.
+
+    Attributes:
+        id (str): The job ID handed to the client.
+        user_id (int): The user who submitted the job; only they can see it.
+        state (str): One of queued, detecting, predicting, building playlist, done or failed.
+        version (int): Incremented on every change, so watchers can tell whether anything is new.
+        result (dict): Set once done, e.g. the emotion and playlist ID.
+        error (str): Set if the job failed.
+    """
+
+    def __init__(self, user_id: int):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.state = QUEUED
+        self.version = 0
+        self.result = None
+        self.error = None
+        self.updated_at = time.monotonic()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (DONE, FAILED)
+
+    def set_state(self, state: str, result: dict = None, error: str = None) -> None:
+        """
+        Move the job to a new state.
+
+        Args:
+            state (str): The new state.
+            result (dict): The outcome, when done.
+            error (str): The message shown to the user, when failed.
+        """
+        if state == self.state and result is None and error is None:
+            return
+        self.state = state
+        self.result = result
+        self.error = error
+        self.updated_at = time.monotonic()
+        self.version += 1
+
+    def set_stage(self, stage: str) -> None:
+        """
+        Move the job to the state of a pipeline stage; used as the pipeline's on_stage callback.
+
+        Args:
+            stage (str): The stage that is about to run.
+        """
+        self.set_state(STAGE_STATES.get(stage, self.state))
+
+    def to_dict(self) -> dict:
+        """
+        Convert the job to plain values for JSON.
+
+        Returns:
+            dict: The job ID, state, result and error.
+        """
+        return {'id': self.id, 'state': self.state, 'result': self.result, 'error': self.error}
+
+
+class JobManager(object):
+    """
+    Runs emotion jobs on a bounded pool of threads in this process.
+
+    At most max_workers jobs run at once and at most max_pending wait for a thread;
+    submissions beyond that are refused, so a burst queues up instead of tying up
+    web workers. Jobs are kept for ttl seconds after they finish. Jobs live in the
+    process that accepted them, so polling has to reach the same process.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 32, ttl: float = 600):
+        """
+        Initialize the manager. Threads are started on the first submission.
+
+        Args:
+            max_workers (int): Jobs that run at once.
+            max_pending (int): Jobs that can wait for a thread.
+            ttl (float): Seconds a finished job is kept.
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(0, int(max_pending))
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active = 0
+        self._executor = None
+
+    def submit(self, user_id: int, fn, *args) -> Job:
+        """
+        Queue fn(job, *args) to run in the background.
+
+        Args:
+            user_id (int): The user submitting the job.
+            fn (Callable): Does the work, moving the job through its states. Its return value
+                becomes the job result.
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            JobQueueFull: If max_workers jobs are running and max_pending are waiting.
+        """
+        with self._lock:
+            self._prune()
+            if self._active >= self.max_workers + self.max_pending:
+                metrics.increment('emotion.jobs.rejected')
+                raise JobQueueFull("Too many emotion jobs are waiting.")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='emotion-job')
+            job = Job(user_id)
+            self._jobs[job.id] = job
+            self._active += 1
+
+        metrics.increment('emotion.jobs.submitted')
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def _run(self, job: Job, fn, args) -> None:
+        started = time.monotonic()
+        # Worker threads get their own database connections, which have to be recycled like a request's
+        close_old_connections()
+        try:
+            job.set_state(DONE, result=fn(job, *args))
+            metrics.increment('emotion.jobs.done')
+        except Exception:
+            logger.exception("Emotion job %s failed", job.id)
+            job.set_state(FAILED, error="An error occurred while processing your request.")
+            metrics.increment('emotion.jobs.failed')
+        finally:
+            close_old_connections()
+            # Tenths of a second, so the histogram keeps a bounded number of buckets
+            metrics.observe('emotion.jobs.seconds', round(time.monotonic() - started, 1))
+            with self._lock:
+                self._active -= 1
+
+    def get(self, job_id: str, user_id: int) -> Job:
+        """
+        Look up a job of a user.
+
+        Args:
+            job_id (str): The job ID.
+            user_id (int): The user asking; jobs of other users are not found.
+
+        Returns:
+            Job: The job, or None if it is unknown, expired or belongs to someone else.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def _prune(self) -> None:
+        # Called with the lock held
+        expired_before = time.monotonic() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.updated_at < expired_before]:
+            del self._jobs[job_id]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    Get the job manager configured by the EMOTION_JOB_* settings.
+
+    Returns:
+        JobManager: The manager of this process.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager(max_workers=getattr(settings, 'EMOTION_JOB_WORKERS', 2),
+                                  max_pending=getattr(settings, 'EMOTION_JOB_QUEUE_SIZE', 32),
+                                  ttl=getattr(settings, 'EMOTION_JOB_TTL', 600))
+        return _manager
@@ -0,0 +1,24 @@
+import time
+
+# Sample images are read from files with these extensions by the benchmark and conversion commands
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def fastest(fn, repeat: int) -> float:
+    """
+    Time a function several times.
+
+    Args:
+        fn (Callable): The function to time.
+        repeat (int): Number of runs.
+
+    Returns:
+        float: The fastest run in seconds.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
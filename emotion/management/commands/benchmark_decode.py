@@ -0,0 +1,81 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from emotion.decoding import ProxyImage
+from emotion.emotion_model import FacialExpressionModel
+from emotion.management.benchmarks import IMAGE_EXTENSIONS
+from emotion.registry import registry
+
+
+class Command(BaseCommand):
+    help = ("Compare full resolution decoding and face detection with the reduced resolution proxy "
+            "on a directory of sample images.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help="Directory of sample images, ideally of different sizes.")
+        parser.add_argument('--proxy-size', type=int, action='append', default=None,
+                            help="Proxy long side to try. Can be repeated. Defaults to EMOTION_PROXY_SIZE or 640.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per image and mode; the fastest is kept.")
+
+    @staticmethod
+    def detect(detector, img_file: str, proxy_size: int) -> tuple:
+        """
+        Decode an image, detect faces on it and crop the first face for the model.
+
+        Args:
+            detector (FacialExpressionModel): The detection-only model.
+            img_file (str): Path to the image file.
+            proxy_size (int): Proxy long side, 0 for full resolution.
+
+        Returns:
+            tuple: Seconds taken, the number of faces and the full resolution face boxes.
+        """
+        start = time.perf_counter()
+        with open(img_file, 'rb') as image_file:
+            proxy = ProxyImage(image_file.read(), proxy_size)
+        faces = detector.detect_faces(FacialExpressionModel.to_grayscale(proxy.image))
+        if len(faces):
+            source, box = proxy.face_source(faces[0], FacialExpressionModel.IMG_SIZE)
+            FacialExpressionModel.prepare_roi(source, box)
+        return time.perf_counter() - start, len(faces), [proxy.to_full(face) for face in faces]
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError(f"{directory} is not a directory.")
+        proxy_sizes = options['proxy_size'] or [getattr(settings, 'EMOTION_PROXY_SIZE', 0) or 640]
+        repeat = max(1, options['repeat'])
+
+        files = sorted(name for name in os.listdir(directory) if name.lower().endswith(IMAGE_EXTENSIONS))
+        if not files:
+            raise CommandError(f"No images found in {directory}.")
+
+        detector = registry.get_detector()
+        header = f"{'image':<30}{'size':>12}{'mode':>8}{'ms':>10}{'faces':>7}{'speedup':>9}"
+        self.stdout.write(header)
+        totals = {size: 0.0 for size in [0] + proxy_sizes}
+
+        for name in files:
+            path = os.path.join(directory, name)
+            full_image = FacialExpressionModel.load_image(path)
+            dimensions = f"{full_image.shape[1]}x{full_image.shape[0]}"
+            del full_image
+
+            full_seconds = None
+            for proxy_size in [0] + proxy_sizes:
+                runs = [self.detect(detector, path, proxy_size) for _ in range(repeat)]
+                seconds, face_count, _ = min(runs, key=lambda run: run[0])
+                totals[proxy_size] += seconds
+                if proxy_size == 0:
+                    full_seconds = seconds
+                mode = 'full' if proxy_size == 0 else str(proxy_size)
+                self.stdout.write(f"{name[:29]:<30}{dimensions:>12}{mode:>8}{seconds * 1000:>10.1f}"
+                                  f"{face_count:>7}{full_seconds / seconds:>8.1f}x")
+
+        for proxy_size in proxy_sizes:
+            self.stdout.write(f"Total {proxy_size} px proxy: {totals[proxy_size] * 1000:.1f} ms vs "
+                              f"{totals[0] * 1000:.1f} ms at full resolution "
+                              f"({totals[0] / totals[proxy_size]:.1f}x)")
@@ -0,0 +1,32 @@
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from emotion.emotion_model import FacialExpressionModel
+from emotion.management.benchmarks import fastest
+from emotion.views import get_emotion_model
+
+
+class Command(BaseCommand):
+    help = "Compare one batched model call with one call per face as the number of faces in an image grows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-faces', type=int, default=getattr(settings, 'EMOTION_MAX_FACES', 8),
+                            help="Largest face count to measure. Defaults to EMOTION_MAX_FACES.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per face count; the fastest is kept.")
+
+    def handle(self, *args, **options):
+        model = get_emotion_model()
+        size = FacialExpressionModel.IMG_SIZE
+        repeat = max(1, options['repeat'])
+        rois = np.random.default_rng(0).random((max(1, options['max_faces']), size, size, 3), dtype=np.float32)
+
+        # Build the predict function before timing anything
+        model.predict_batch(rois[:1])
+
+        self.stdout.write(f"{'faces':>6}{'loop ms':>12}{'batch ms':>12}{'speedup':>10}")
+        for count in range(1, len(rois) + 1):
+            batch = rois[:count]
+            loop = fastest(lambda: [model.get_prediction(roi) for roi in batch], repeat)
+            batched = fastest(lambda: model.predict_batch(batch), repeat)
+            self.stdout.write(f"{count:>6}{loop * 1000:>12.1f}{batched * 1000:>12.1f}{loop / batched:>9.2f}x")
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from emotion.management.benchmarks import fastest
+from emotion.views import create_playlist
+from playlists.generated import load
+from playlists.models import Playlist, Playlist_songs
+from songs.models import Song
+
+EMOTIONS = ('happy', 'normal', 'sad')
+
+
+def legacy_create_playlist(user: User, emotion: str) -> int:
+    """
+    The original playlist generation: two song queries and one INSERT per song.
+    """
+    admin = User.objects.get(username='admin')
+    playlist = Playlist.objects.filter(user=admin, playlist_name=f"{user.username}_{emotion}").first()
+    if playlist is None:
+        playlist = Playlist.objects.create(user=admin, playlist_name=f"{user.username}_{emotion}",
+                                           number_of_songs=-1)
+    Playlist_songs.objects.filter(playlist=playlist).delete()
+    for songs in (Song.objects.filter(user=user, emotion=emotion),
+                  Song.objects.filter(user__username='admin', emotion=emotion)):
+        for song in songs:
+            Playlist_songs(playlist=playlist, song=song).save()
+    return playlist.id
+
+
+class Command(BaseCommand):
+    help = ("Compare emotion playlist generation with per-song INSERTs and with generated playlists kept in the "
+            "shared cache, which write no playlist rows, as the catalog grows. Songs are created in a transaction "
+            "that is rolled back afterwards, so the legacy path is measured without the commit it paid per INSERT "
+            "outside a transaction.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000],
+                            help="Catalog sizes to measure, in songs.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per size and path; the fastest is kept.")
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        self.stdout.write(f"{'songs':>8}{'playlist':>10}{'legacy ms':>12}{'cached ms':>12}{'speedup':>10}")
+
+        for size in options['sizes']:
+            with transaction.atomic():
+                admin, _ = User.objects.get_or_create(username='admin')
+                user = User.objects.create(username='benchmark-playlist-user')
+                # Half of the catalog belongs to the user, half to the admin, spread over the emotions
+                Song.objects.bulk_create([Song(user=user if index % 2 else admin, song_name=f'song {index}',
+                                               song_url=f'songs/{index}.mp3', emotion=EMOTIONS[index % 3])
+                                          for index in range(size)], batch_size=1000)
+                # bulk_create sends no signals, but the user's mood playlist is only built on first use, from these rows
+                # create_playlist only needs the user of the request
+                request = SimpleNamespace(user=user)
+
+                legacy = fastest(lambda: legacy_create_playlist(user, 'happy'), repeat)
+                generated = fastest(lambda: create_playlist(request, 'happy'), repeat)
+                playlist_size = len(load(user.pk, create_playlist(request, 'happy'))['song_ids'])
+                self.stdout.write(f"{size:>8}{playlist_size:>10}{legacy * 1000:>12.1f}{generated * 1000:>12.1f}"
+                                  f"{legacy / generated:>9.1f}x")
+
+                transaction.set_rollback(True)
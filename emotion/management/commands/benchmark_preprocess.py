@@ -0,0 +1,103 @@
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from emotion.emotion_model import FacialExpressionModel
+from emotion.registry import registry
+
+
+def legacy_stages(detector, image):
+    """
+    The original preprocessing: RGB conversion, a second conversion for Haar and a float64 normalize.
+    """
+    rgb = yield 'convert', lambda: cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    faces = yield 'detect', lambda: detector.face_cascade.detectMultiScale(cv2.cvtColor(rgb, cv2.COLOR_BGR2RGB),
+                                                                           1.3, 5)
+    box = faces[0] if len(faces) else central_box(image)
+    roi = yield 'roi', lambda: cv2.resize(rgb[box[1]: box[1] + box[3], box[0]: box[0] + box[2]], (256, 256))
+    yield 'normalize', lambda: roi / 255.0
+
+
+def fused_stages(detector, image):
+    """
+    The fused preprocessing: one grayscale conversion for Haar and a crop-resize into reused float32 buffers.
+    """
+    gray = yield 'convert', lambda: FacialExpressionModel.to_grayscale(image)
+    faces = yield 'detect', lambda: detector.detect_faces(gray)
+    box = faces[0] if len(faces) else central_box(image)
+    yield 'roi+normalize', lambda: FacialExpressionModel.prepare_roi(image, box)
+
+
+def central_box(image) -> tuple:
+    """
+    A face-sized box in the middle of the image, used when Haar finds no face.
+    """
+    height, width = image.shape[:2]
+    side = min(height, width) // 2
+    return (width - side) // 2, (height - side) // 2, side, side
+
+
+class Command(BaseCommand):
+    help = "Compare time and allocations per stage of the legacy and the fused emotion preprocessing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('images', nargs='*', help="Images to preprocess. Defaults to a synthetic image.")
+        parser.add_argument('--size', type=int, default=1280, help="Long side of the synthetic image.")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per image and path.")
+
+    @staticmethod
+    def run_stages(stages, repeat: int) -> dict:
+        """
+        Run a preprocessing path and measure every stage.
+
+        Args:
+            stages (Callable): Returns a generator yielding (stage name, callable) pairs.
+            repeat (int): Number of runs.
+
+        Returns:
+            dict: Stage name to (mean milliseconds, peak KiB allocated).
+        """
+        totals = {}
+        for run in range(repeat + 1):
+            generator = stages()
+            result = None
+            while True:
+                try:
+                    name, step = generator.send(result)
+                except StopIteration:
+                    break
+                tracemalloc.start()
+                start = time.perf_counter()
+                result = step()
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                if run:
+                    # The first run warms up OpenCV and the per-thread buffers
+                    seconds, kib = totals.get(name, (0.0, 0.0))
+                    totals[name] = (seconds + elapsed, max(kib, peak / 1024))
+        return {name: (seconds * 1000 / repeat, kib) for name, (seconds, kib) in totals.items()}
+
+    def handle(self, *args, **options):
+        if options['images']:
+            images = [(path, FacialExpressionModel.load_image(path)) for path in options['images']]
+        else:
+            size = options['size']
+            synthetic = np.random.default_rng(0).integers(0, 256, (size * 3 // 4, size, 3), dtype=np.uint8)
+            images = [(f'synthetic {size}x{size * 3 // 4}', synthetic)]
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1.")
+
+        detector = registry.get_detector()
+        for label, image in images:
+            self.stdout.write(f"{label}")
+            self.stdout.write(f"  {'path':<8}{'stage':<16}{'ms':>10}{'peak KiB':>12}")
+            for path, stages in (('legacy', legacy_stages), ('fused', fused_stages)):
+                results = self.run_stages(lambda: stages(detector, image), options['repeat'])
+                for name, (ms, kib) in results.items():
+                    self.stdout.write(f"  {path:<8}{name:<16}{ms:>10.2f}{kib:>12.1f}")
+                total_ms = sum(ms for ms, _ in results.values())
+                self.stdout.write(f"  {path:<8}{'total':<16}{total_ms:>10.2f}")
@@ -0,0 +1,82 @@
+import random
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import QuerySet
+
+from emotion.management.benchmarks import fastest
+from playlists.mood_playlists import get_mood_playlist, rebuild, sample_ids, sample_song_ids
+from songs.models import Song
+
+
+def legacy_sample(admin_songs, k: int = 10) -> list:
+    """
+    The original add_random_songs_to_playlist selection, without the INSERTs.
+    """
+    song_count = admin_songs.count() if isinstance(admin_songs, QuerySet) else len(admin_songs)
+    sampling = set(random.sample(list(range(song_count)), k=min(k, song_count)))
+    order = list(range(song_count))
+    random.shuffle(order)
+    return [admin_songs[order[i]] for i in range(song_count) if order[i] in sampling]
+
+
+class Command(BaseCommand):
+    help = ("Compare the original random song selection with sampling the mood playlist by time and peak memory. "
+            "With --db, songs are created in a rolled back transaction, the original selection runs its OFFSET "
+            "queries and the sampler reads the IDs of the mood playlist.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 1000000], help="Catalog sizes, in songs.")
+        parser.add_argument('-k', type=int, default=10, help="Songs to pick.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per size and path; the fastest is kept.")
+        parser.add_argument('--db', action='store_true', help="Measure against real Song rows.")
+
+    @staticmethod
+    def measure(fn, repeat: int) -> tuple:
+        """
+        Time a function several times and trace its allocations once.
+
+        Args:
+            fn (Callable): The function to measure.
+            repeat (int): Number of timed runs.
+
+        Returns:
+            tuple: The fastest run in seconds and the peak KiB allocated.
+        """
+        best = fastest(fn, repeat)
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return best, peak / 1024
+
+    def report(self, size: int, legacy: tuple, sampled: tuple) -> None:
+        self.stdout.write(f"{size:>10}{legacy[0] * 1000:>12.2f}{legacy[1]:>14.1f}"
+                          f"{sampled[0] * 1000:>12.3f}{sampled[1]:>14.1f}{legacy[0] / sampled[0]:>10.0f}x")
+
+    def handle(self, *args, **options):
+        k = options['k']
+        repeat = max(1, options['repeat'])
+        self.stdout.write(f"{'songs':>10}{'legacy ms':>12}{'legacy KiB':>14}{'sample ms':>12}{'sample KiB':>14}"
+                          f"{'speedup':>11}")
+
+        for size in options['sizes']:
+            if not options['db']:
+                song_ids = list(range(1, size + 1))
+                self.report(size, self.measure(lambda: legacy_sample(song_ids, k), repeat),
+                            self.measure(lambda: sample_ids(song_ids, k), repeat))
+                continue
+
+            with transaction.atomic():
+                admin, _ = User.objects.get_or_create(username='admin')
+                Song.objects.bulk_create([Song(user=admin, song_name=f'song {index}', song_url=f'songs/{index}.mp3',
+                                               emotion='happy') for index in range(size)], batch_size=5000)
+                # bulk_create sends no signals, so the admin's mood playlist is rebuilt from these rows
+                rebuild(get_mood_playlist(admin, 'happy'))
+                admin_songs = Song.objects.filter(user=admin, emotion='happy')
+
+                self.report(size, self.measure(lambda: legacy_sample(admin_songs, k), repeat),
+                            self.measure(lambda: sample_song_ids(admin, 'happy', k), repeat))
+                transaction.set_rollback(True)
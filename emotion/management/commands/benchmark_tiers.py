@@ -0,0 +1,85 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from emotion.decoding import ProxyImage
+from emotion.emotion_model import FacialExpressionModel
+from emotion.management.benchmarks import IMAGE_EXTENSIONS
+from emotion.registry import registry
+from emotion.tiers import get_policy
+
+LABELS = ('happy', 'normal', 'sad')
+
+
+class Command(BaseCommand):
+    help = ("Report the accuracy and latency of every EMOTION_MODEL_TIERS model on a labeled sample set: "
+            "a directory with one sub-directory of images per emotion label.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help="Directory with happy/, normal/ and sad/ sub-directories of images.")
+        parser.add_argument('--limit', type=int, default=None, help="Use at most this many images per label.")
+
+    def load_samples(self, directory: str, limit: int) -> list:
+        """
+        Detect the face of every sample image and preprocess it once for all tiers.
+
+        Args:
+            directory (str): The labeled sample directory.
+            limit (int): Images per label, None for all.
+
+        Returns:
+            list: (label, ROI) pairs for the images with exactly one face.
+        """
+        detector = registry.get_detector()
+        samples = []
+        skipped = 0
+        for label in LABELS:
+            label_dir = os.path.join(directory, label)
+            if not os.path.isdir(label_dir):
+                continue
+            names = sorted(name for name in os.listdir(label_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+            for name in names[:limit]:
+                with open(os.path.join(label_dir, name), 'rb') as image_file:
+                    image = ProxyImage(image_file.read()).image
+                faces = detector.detect_faces(FacialExpressionModel.to_grayscale(image))
+                if len(faces) != 1:
+                    skipped += 1
+                    continue
+                # Copied, prepare_roi reuses one buffer per thread
+                samples.append((label, FacialExpressionModel.prepare_roi(image, faces[0]).copy()))
+
+        if skipped:
+            self.stdout.write(f"Skipped {skipped} images without exactly one face.")
+        return samples
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError(f"{directory} is not a directory.")
+        policy = get_policy()
+        if policy is None:
+            raise CommandError("EMOTION_MODEL_TIERS is not set.")
+
+        samples = self.load_samples(directory, options['limit'])
+        if not samples:
+            raise CommandError(f"No labeled images with one face found in {directory}.")
+
+        self.stdout.write(f"{'tier':<20}{'accuracy':>10}{'mean ms':>10}{'p95 ms':>10}")
+        for tier in policy.tiers:
+            model = tier.get_model()
+            # The first prediction builds the model's graph
+            model.get_prediction(samples[0][1])
+
+            correct = 0
+            latencies = []
+            for label, roi in samples:
+                start = time.perf_counter()
+                prediction = model.get_prediction(roi)
+                latencies.append(time.perf_counter() - start)
+                correct += FacialExpressionModel.get_emotion_label(prediction) == label
+
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(f"{tier.name:<20}{correct / len(samples):>10.1%}"
+                              f"{sum(latencies) / len(latencies) * 1000:>10.1f}{p95 * 1000:>10.1f}")
@@ -0,0 +1,122 @@
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from emotion.backends import KerasBackend, TFLiteBackend
+from emotion.management.benchmarks import IMAGE_EXTENSIONS
+from emotion.registry import registry
+from emotion.views import get_model_paths
+
+
+class Command(BaseCommand):
+    help = ("Convert model_config.json + model_wts.h5 to a TensorFlow Lite model and report its size, "
+            "latency and label agreement against the Keras backend.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=str(getattr(settings, 'EMOTION_TFLITE_MODEL', 'model.tflite')),
+                            help="Where to write the .tflite file. Defaults to EMOTION_TFLITE_MODEL.")
+        parser.add_argument('--quantize', choices=('none', 'float16', 'int8'), default='none',
+                            help="Post-training quantization to apply.")
+        parser.add_argument('--samples', default=None,
+                            help="Directory of face images used for int8 calibration and for the comparison.")
+        parser.add_argument('--limit', type=int, default=50, help="Maximum number of sample images to use.")
+        parser.add_argument('--threads', type=int, default=None, help="TFLite interpreter thread count.")
+
+    def load_samples(self, directory: str, limit: int) -> np.ndarray:
+        """
+        Preprocess the face images of a directory into model inputs.
+
+        Images without exactly one detectable face are skipped. Without a directory,
+        or if no image is usable, random inputs are returned instead.
+
+        Args:
+            directory (str): The sample image directory, or None.
+            limit (int): Maximum number of samples.
+
+        Returns:
+            np.ndarray: A float32 (N, IMG_SIZE, IMG_SIZE, 3) array.
+        """
+        from emotion.emotion_model import FacialExpressionModel
+
+        rois = []
+        if directory:
+            detector = registry.get_detector()
+            for name in sorted(os.listdir(directory)):
+                if len(rois) >= limit:
+                    break
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                image = FacialExpressionModel.load_image(os.path.join(directory, name))
+                status, roi = detector.preprocess_img(image)
+                if status is True:
+                    rois.append(roi.astype(np.float32))
+
+        if rois:
+            return np.stack(rois)
+
+        self.stderr.write("No usable sample faces; using random inputs. Label agreement on random inputs "
+                          "says little about accuracy, pass --samples with real face images.")
+        size = FacialExpressionModel.IMG_SIZE
+        return np.random.default_rng(0).random((min(limit, 16), size, size, 3), dtype=np.float32)
+
+    @staticmethod
+    def time_per_image(backend, samples: np.ndarray) -> tuple:
+        """
+        Run every sample through a backend one at a time.
+
+        Args:
+            backend (InferenceBackend): The backend to measure.
+            samples (np.ndarray): The preprocessed samples.
+
+        Returns:
+            tuple: Mean seconds per image and the predicted label index per sample.
+        """
+        # The first call builds the graph or allocates tensors, keep it out of the timing
+        backend.predict(samples[:1])
+
+        labels = []
+        start = time.perf_counter()
+        for sample in samples:
+            labels.append(int(np.argmax(backend.predict(sample[np.newaxis]))))
+        return (time.perf_counter() - start) / len(samples), labels
+
+    def handle(self, *args, **options):
+        import tensorflow as tf
+
+        model_json_path, model_weights_path = get_model_paths()
+        keras_backend = KerasBackend(model_json_path, model_weights_path)
+        samples = self.load_samples(options['samples'], max(1, options['limit']))
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(keras_backend.model)
+        if options['quantize'] == 'float16':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif options['quantize'] == 'int8':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = lambda: ([sample[np.newaxis]] for sample in samples)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+
+        try:
+            tflite_model = converter.convert()
+        except Exception as e:
+            raise CommandError(f"Conversion failed: {e}")
+
+        with open(options['output'], 'wb') as output:
+            output.write(tflite_model)
+
+        tflite_backend = TFLiteBackend(options['output'], num_threads=options['threads'])
+        keras_latency, keras_labels = self.time_per_image(keras_backend, samples)
+        tflite_latency, tflite_labels = self.time_per_image(tflite_backend, samples)
+        agreement = sum(a == b for a, b in zip(keras_labels, tflite_labels)) / len(samples)
+
+        self.stdout.write(f"Wrote {options['output']} ({options['quantize']} quantization)")
+        self.stdout.write(f"{'backend':<10}{'size MiB':>12}{'ms/image':>12}")
+        self.stdout.write(f"{'keras':<10}{os.path.getsize(model_weights_path) / 2 ** 20:>12.1f}"
+                          f"{keras_latency * 1000:>12.1f}")
+        self.stdout.write(f"{'tflite':<10}{len(tflite_model) / 2 ** 20:>12.1f}{tflite_latency * 1000:>12.1f}")
+        self.stdout.write(f"Label agreement: {agreement:.1%} over {len(samples)} samples")
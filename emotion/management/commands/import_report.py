@@ -0,0 +1,101 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so that every module is measured from a cold start
+CHILD_SCRIPT = """
+import importlib, json, os, sys, time
+
+def rss_kb():
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+import django
+from django.conf import settings
+settings.EMOTION_WARMUP = False
+django.setup()
+
+modules_before = len(sys.modules)
+rss_before = rss_kb()
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'rss_kb': rss_kb() - rss_before,
+                  'modules': len(sys.modules) - modules_before}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Report the import time and memory cost of each project app's views and urls modules."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', action='append', default=[],
+                            help="Extra module to measure, e.g. emotion.emotion_model. Can be repeated.")
+        parser.add_argument('--repeat', type=int, default=1,
+                            help="Number of cold imports per module; the fastest one is reported.")
+        parser.add_argument('--max-seconds', type=float, default=None,
+                            help="Fail if any module takes longer than this to import.")
+
+    def get_project_modules(self) -> list:
+        """
+        List the views and urls modules of the apps that live in this project.
+
+        Returns:
+            list: Dotted module names, starting with the root URLconf.
+        """
+        base_dir = str(Path(settings.BASE_DIR).resolve())
+        modules = [settings.ROOT_URLCONF]
+        for app_config in apps.get_app_configs():
+            if not str(Path(app_config.path).resolve()).startswith(base_dir):
+                continue
+            for submodule in ('urls', 'views'):
+                name = f"{app_config.name}.{submodule}"
+                if name not in modules and importlib.util.find_spec(name) is not None:
+                    modules.append(name)
+        return modules
+
+    def measure(self, module: str) -> dict:
+        """
+        Import a module in a fresh interpreter and measure its cost.
+
+        Args:
+            module (str): The dotted module name.
+
+        Returns:
+            dict: Seconds spent, resident memory added in KiB and number of modules pulled in.
+        """
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'music.settings')
+        result = subprocess.run([sys.executable, '-c', CHILD_SCRIPT, module], cwd=str(settings.BASE_DIR),
+                                env=env, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f"Importing {module} failed:\n{result.stderr}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        modules = self.get_project_modules() + options['module']
+        slow = []
+
+        self.stdout.write(f"{'module':<40}{'seconds':>10}{'RSS MiB':>10}{'modules':>10}")
+        for module in modules:
+            runs = [self.measure(module) for _ in range(max(1, options['repeat']))]
+            best = min(runs, key=lambda run: run['seconds'])
+            self.stdout.write(f"{module:<40}{best['seconds']:>10.3f}"
+                              f"{best['rss_kb'] / 1024:>10.1f}{best['modules']:>10}")
+            if options['max_seconds'] is not None and best['seconds'] > options['max_seconds']:
+                slow.append(module)
+
+        if slow:
+            raise CommandError(f"Imports slower than {options['max_seconds']}s: {', '.join(slow)}")
@@ -0,0 +1,83 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Fields of /proc/<pid>/smaps_rollup reported, all in kB there
+FIELDS = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+
+
+def read_smaps_rollup(pid: int) -> dict:
+    """
+    Read the memory totals of a process.
+
+    Args:
+        pid (int): The process ID.
+
+    Returns:
+        dict: kB per field in FIELDS.
+    """
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as rollup:
+        for line in rollup:
+            parts = line.split()
+            if parts and parts[0].rstrip(':') in FIELDS:
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values
+
+
+def find_children(pid: int) -> list:
+    """
+    Find the direct child processes of a process, e.g. the workers of a gunicorn master.
+
+    Args:
+        pid (int): The parent process ID.
+
+    Returns:
+        list: The child process IDs, sorted.
+    """
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as stat:
+                # The command name can contain spaces, the fields after it cannot
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+class Command(BaseCommand):
+    help = ("Report RSS and PSS of a pre-forking server's master and workers from /proc/<pid>/smaps_rollup. "
+            "With EMOTION_PRELOAD the workers' PSS should be well below their RSS, as the model pages are shared.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('pid', type=int, help="PID of the master process, e.g. from gunicorn's --pid file.")
+
+    def handle(self, *args, **options):
+        master = options['pid']
+        if not os.path.exists(f'/proc/{master}/smaps_rollup'):
+            raise CommandError(f"No /proc/{master}/smaps_rollup; is the PID right and is this Linux 4.14 or later?")
+
+        rows = [('master', master)] + [('worker', pid) for pid in find_children(master)]
+        self.stdout.write(f"{'process':<8}{'pid':>8}" + ''.join(f"{field:>15}" for field in FIELDS))
+
+        totals = dict.fromkeys(FIELDS, 0)
+        for role, pid in rows:
+            try:
+                values = read_smaps_rollup(pid)
+            except OSError as e:
+                self.stderr.write(f"Skipping {pid}: {e}")
+                continue
+            for field in FIELDS:
+                totals[field] += values.get(field, 0)
+            self.stdout.write(f"{role:<8}{pid:>8}" + ''.join(f"{values.get(field, 0) / 1024:>12.1f} MB"
+                                                             for field in FIELDS))
+
+        self.stdout.write(f"{'total':<16}" + ''.join(f"{totals[field] / 1024:>12.1f} MB" for field in FIELDS))
+        # RSS counts shared pages once per process, PSS splits them between the processes sharing them
+        self.stdout.write(f"Shared between processes: {(totals['Rss'] - totals['Pss']) / 1024:.1f} MB "
+                          f"of {totals['Rss'] / 1024:.1f} MB RSS; actual footprint {totals['Pss'] / 1024:.1f} MB.")
@@ -0,0 +1,58 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from emotion import versions
+from emotion.emotion_model import FacialExpressionModel
+from emotion.views import load_emotion_model
+
+
+class Command(BaseCommand):
+    help = ("Activate a model version from EMOTION_MODEL_ROOT. Running workers pick it up within "
+            "EMOTION_MODEL_POLL_INTERVAL seconds and switch once it is loaded and warm. "
+            "Without a version, list the available versions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('version', nargs='?', help="The version directory to activate.")
+        parser.add_argument('--no-check', action='store_true',
+                            help="Activate without first loading the model and running a prediction here.")
+
+    def handle(self, *args, **options):
+        root = versions.get_model_root()
+        if root is None:
+            raise CommandError("EMOTION_MODEL_ROOT is not set.")
+
+        active = versions.read_pointer()
+        version = options['version']
+        if version is None:
+            available = versions.list_versions()
+            if not available:
+                self.stdout.write(f"No model versions in {root}.")
+            for name in available:
+                self.stdout.write(f"{'*' if name == active else ' '} {name}")
+            return
+
+        try:
+            versions.get_version_dir(version)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if version == active:
+            self.stdout.write(f"Model version {version} is already active.")
+            return
+
+        if not options['no_check']:
+            # Catch broken files here rather than in every worker
+            start = time.perf_counter()
+            try:
+                model = load_emotion_model(version)
+                size = FacialExpressionModel.IMG_SIZE
+                model.get_prediction(np.zeros((size, size, 3), dtype=np.float32))
+            except Exception as e:
+                raise CommandError(f"Model version {version} failed to load: {e}")
+            self.stdout.write(f"Loaded and ran model version {version} in {time.perf_counter() - start:.1f} s.")
+
+        versions.write_pointer(version)
+        self.stdout.write(self.style.SUCCESS(f"Switched {root / versions.POINTER_FILE} from {active or 'legacy'} "
+                                             f"to {version}."))
+        self.stdout.write("Workers report the version they serve under 'model' at /emotion/ready/.")
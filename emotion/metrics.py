@@ -0,0 +1,68 @@
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_histograms = defaultdict(lambda: defaultdict(int))
+_gauges = {}
+
+
+def increment(name: str, amount: int = 1) -> None:
+    """
+    Add to a named counter.
+
+    Args:
+        name (str): The counter name.
+        amount (int): How much to add.
+    """
+    with _lock:
+        _counters[name] += amount
+
+
+def observe(name: str, value) -> None:
+    """
+    Record one observation in a named histogram with one bucket per distinct value.
+
+    Args:
+        name (str): The histogram name.
+        value: The observed value, e.g. a batch size.
+    """
+    with _lock:
+        _histograms[name][value] += 1
+
+
+def set_gauge(name: str, value) -> None:
+    """
+    Set a named gauge to its current value.
+
+    Args:
+        name (str): The gauge name.
+        value: The current value, e.g. a queue depth.
+    """
+    with _lock:
+        _gauges[name] = value
+
+
+def snapshot() -> dict:
+    """
+    Copy the current counters, gauges and histograms.
+
+    Returns:
+        dict: Counters and gauges by name, and histograms by name, each mapping bucket to count.
+    """
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'gauges': dict(_gauges),
+            'histograms': {name: dict(sorted(buckets.items())) for name, buckets in _histograms.items()},
+        }
+
+
+def reset() -> None:
+    """
+    Clear every counter, gauge and histogram.
+    """
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
@@ -0,0 +1,267 @@
+import logging
+import time
+
+import cv2
+import numpy as np
+
+from . import inference, metrics
+from .decoding import ProxyImage
+from .emotion_model import FacialExpressionModel
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineResult(object):
+    """
+    Outcome of running an image through the emotion pipeline.
+
+    Attributes:
+        status (str): 'ok', or the error code of the stage that rejected the image.
+        stage (str): The last stage that ran.
+        emotion (str): The predicted emotion label, if the image got through every stage.
+        scores (np.ndarray): The prediction scores, one per emotion label.
+        face_box (tuple): The full resolution (x, y, w, h) box of the face the prediction was made on,
+            or of the largest face in group mode.
+        face_boxes (list): In group mode, the full resolution boxes of every face that was scored.
+        model (str): The name of the model tier that made the prediction, if tiers are configured.
+    """
+
+    def __init__(self, status: str, stage: str, emotion: str = None, scores=None, face_box=None,
+                 face_boxes=None, model: str = None):
+        self.status = status
+        self.stage = stage
+        self.emotion = emotion
+        self.scores = scores
+        self.face_box = face_box
+        self.face_boxes = face_boxes
+        self.model = model
+
+    @property
+    def ok(self) -> bool:
+        """
+        Whether the image got through every stage.
+        """
+        return self.status == 'ok'
+
+    def to_dict(self) -> dict:
+        """
+        Convert the result to plain values, e.g. for caching or JSON.
+
+        Returns:
+            dict: The result fields, with the scores as a list of floats.
+        """
+        return {
+            'status': self.status,
+            'stage': self.stage,
+            'emotion': self.emotion,
+            'scores': None if self.scores is None else [float(score) for score in self.scores],
+            'face_box': None if self.face_box is None else list(self.face_box),
+            'face_boxes': None if self.face_boxes is None else [list(box) for box in self.face_boxes],
+            'model': self.model,
+        }
+
+    @classmethod
+    def from_dict(cls, values: dict):
+        """
+        Rebuild a result from the output of to_dict.
+
+        Args:
+            values (dict): The result fields.
+
+        Returns:
+            PipelineResult: The result.
+        """
+        scores = values.get('scores')
+        face_box = values.get('face_box')
+        face_boxes = values.get('face_boxes')
+        return cls(values['status'], values['stage'], emotion=values.get('emotion'),
+                   scores=None if scores is None else np.asarray(scores, dtype=np.float32),
+                   face_box=None if face_box is None else tuple(face_box),
+                   face_boxes=None if face_boxes is None else [tuple(box) for box in face_boxes],
+                   model=values.get('model'))
+
+    def __repr__(self):
+        return f'PipelineResult({self.status!r}, stage={self.stage!r}, emotion={self.emotion!r})'
+
+
+class EmotionPipeline(object):
+    """
+    Detects the emotion in an image through stages ordered from cheapest to most expensive.
+
+    Every stage can reject the image with an error code, so unusable images never
+    reach (or load) the CNN. Each stage counts its runs and rejections in emotion.metrics.
+
+    In group mode an image with several faces is not rejected: up to max_faces of the
+    largest faces are scored in one batch and their scores are averaged into a group emotion.
+    """
+
+    STAGES = ('decode', 'size', 'blur', 'faces', 'predict')
+
+    def __init__(self, get_detector, get_model, min_size: int = 64, blur_threshold: float = 0.0,
+                 proxy_size: int = 0, group_mode: bool = False, max_faces: int = 8, admission=None,
+                 tiers=None):
+        """
+        Initialize the pipeline.
+
+        Args:
+            get_detector (Callable): Returns the FacialExpressionModel used for face detection.
+            get_model (Callable): Returns the FacialExpressionModel used for prediction. Only
+                called once an image has passed every cheaper stage.
+            min_size (int): Minimum width and height of the image in pixels.
+            blur_threshold (float): Minimum variance of the Laplacian; 0 disables the blur check.
+            proxy_size (int): Long side of the reduced resolution decode used up to face detection;
+                0 decodes at full resolution.
+            group_mode (bool): Score every face instead of rejecting images with several faces.
+            max_faces (int): In group mode, the number of largest faces that are scored.
+            admission (AdmissionController): Limits concurrent predictions; None runs them all at once.
+            tiers (TierPolicy): Picks a lighter model under load instead of get_model; None always uses get_model.
+        """
+        self.get_detector = get_detector
+        self.get_model = get_model
+        self.min_size = min_size
+        self.blur_threshold = blur_threshold
+        self.proxy_size = proxy_size
+        self.group_mode = group_mode
+        self.max_faces = max(1, int(max_faces))
+        self.admission = admission
+        self.tiers = tiers
+
+    def run(self, image_data: bytes, on_stage=None) -> PipelineResult:
+        """
+        Run an image through every stage until one rejects it.
+
+        Args:
+            image_data (bytes): The encoded image.
+            on_stage (Callable): Called with the name of each stage before it runs, e.g. to report progress.
+
+        Returns:
+            PipelineResult: The prediction, or the error code of the rejecting stage.
+
+        Raises:
+            Overloaded: If the prediction was shed by admission control.
+        """
+        if self.admission is not None:
+            # Shed before decoding when the inference queue is already full
+            self.admission.check()
+
+        state = {'image_data': image_data}
+        for stage in self.STAGES:
+            if on_stage is not None:
+                on_stage(stage)
+            metrics.increment(f'emotion.stage.{stage}.runs')
+            status = getattr(self, f'{stage}_stage')(state)
+            if status is not None:
+                metrics.increment(f'emotion.stage.{stage}.rejected')
+                logger.info("Image rejected at the %s stage: %s", stage, status)
+                return PipelineResult(status, stage)
+
+        return PipelineResult('ok', self.STAGES[-1], emotion=state['emotion'], scores=state['scores'],
+                              face_box=state['face_box'], face_boxes=state.get('face_boxes'),
+                              model=state.get('model_name'))
+
+    def decode_stage(self, state: dict):
+        """
+        Decode the image, at reduced resolution if a proxy size is set.
+        """
+        try:
+            state['proxy'] = ProxyImage(state['image_data'], self.proxy_size)
+        except (IOError, ValueError):
+            return 'badImage'
+        state['image'] = state['proxy'].image
+        return None
+
+    def size_stage(self, state: dict):
+        """
+        Reject images too small to contain a usable face.
+        """
+        width, height = state['proxy'].full_size
+        if min(height, width) < self.min_size:
+            return 'tooSmall'
+        return None
+
+    @staticmethod
+    def grayscale(state: dict) -> np.ndarray:
+        """
+        Get the grayscale copy of the image, converting it once for the blur and face stages.
+        """
+        if 'gray' not in state:
+            state['gray'] = FacialExpressionModel.to_grayscale(state['image'])
+        return state['gray']
+
+    def blur_stage(self, state: dict):
+        """
+        Reject blurry images by the variance of the Laplacian of the grayscale image.
+        """
+        if not self.blur_threshold:
+            return None
+        # A 16 bit Laplacian holds every value of a uint8 image at a quarter of the float64 size
+        laplacian = cv2.Laplacian(self.grayscale(state), cv2.CV_16S)
+        _, stddev = cv2.meanStdDev(laplacian)
+        # Logged to help tune EMOTION_BLUR_THRESHOLD against real uploads
+        logger.debug("Blur score (variance of the Laplacian): %.1f", stddev[0][0] ** 2)
+        if stddev[0][0] ** 2 < self.blur_threshold:
+            return 'blurry'
+        return None
+
+    def faces_stage(self, state: dict):
+        """
+        Detect faces and keep going only if there is exactly one, or at least one in group mode.
+        """
+        detector = self.get_detector()
+        faces = detector.detect_faces(self.grayscale(state))
+        if not len(faces):
+            return 'noFace'
+        if len(faces) > 1 and not self.group_mode:
+            return 'mulFace'
+
+        # Largest faces first, capped so a crowd photo cannot blow up the batch
+        boxes = sorted((tuple(int(value) for value in face) for face in faces),
+                       key=lambda box: box[2] * box[3], reverse=True)[:self.max_faces]
+        state['proxy_boxes'] = boxes
+        state['face_box'] = state['proxy'].to_full(boxes[0])
+        if self.group_mode:
+            state['face_boxes'] = [state['proxy'].to_full(box) for box in boxes]
+        return None
+
+    def predict_stage(self, state: dict):
+        """
+        Preprocess the faces and run them through the CNN.
+        """
+        if self.admission is None:
+            return self.predict(state)
+        with self.admission.admit():
+            return self.predict(state)
+
+    def predict(self, state: dict):
+        """
+        Score the faces found by the faces stage.
+        """
+        size = FacialExpressionModel.IMG_SIZE
+        boxes = state['proxy_boxes']
+        tier = None
+        if self.tiers is not None:
+            tier = self.tiers.choose(self.admission.queue_depth if self.admission is not None else 0)
+            model = tier.get_model()
+        else:
+            model = self.get_model()
+        started = time.monotonic()
+
+        if len(boxes) == 1:
+            source, box = state['proxy'].face_source(boxes[0], size)
+            roi_img = FacialExpressionModel.prepare_roi(source, box)
+            scores = np.asarray(inference.predict_probabilities(model, roi_img))
+        else:
+            # Crop every face straight into one batch and score them in a single model call
+            batch = np.empty((len(boxes), size, size, 3), dtype=np.float32)
+            for index, proxy_box in enumerate(boxes):
+                source, box = state['proxy'].face_source(proxy_box, size)
+                FacialExpressionModel.prepare_roi(source, box, out=batch[index])
+            metrics.observe('emotion.group_size', len(boxes))
+            scores = np.asarray(inference.predict_batch_probabilities(model, batch)).mean(axis=0)
+
+        if tier is not None:
+            tier.record(time.monotonic() - started)
+            state['model_name'] = tier.name
+        state['scores'] = scores
+        state['emotion'] = FacialExpressionModel.get_emotion_label(scores)
+        return None
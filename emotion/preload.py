@@ -0,0 +1,141 @@
+import gc
+import logging
+import os
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_state = {
+    'preloaded': False,
+    'master_pid': None,
+    'threads_before': None,
+    'threads_at_fork': None,
+    'forked': False,
+    'reloaded': False,
+}
+
+
+def native_thread_count() -> int:
+    """
+    Count the OS threads of this process, including those started by TensorFlow or OpenCV.
+
+    Returns:
+        int: The thread count from /proc/self/status, or the Python thread count where /proc is missing.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return threading.active_count()
+
+
+def is_enabled() -> bool:
+    """
+    Check whether the EMOTION_PRELOAD setting asks for the model to be loaded before workers fork.
+
+    Returns:
+        bool: True if preload mode is enabled.
+    """
+    return getattr(settings, 'EMOTION_PRELOAD', False)
+
+
+def preload() -> None:
+    """
+    Load the face cascade and the emotion models in the master process, before it forks its workers.
+
+    Workers then share the weight pages copy-on-write instead of each loading a copy.
+    No prediction is run here: the first one starts TensorFlow's thread pools, and
+    threads do not survive a fork, so each worker warms up after the fork instead.
+    Objects loaded so far are moved out of the garbage collector's reach with
+    gc.freeze(), so collections in the workers do not write to the shared pages.
+
+    Meant for servers that import the WSGI application before forking, e.g. gunicorn --preload.
+    """
+    # Imported here because emotion.views imports the models of other apps
+    from . import inference, tiers
+    from .registry import registry
+    from .views import get_emotion_model
+
+    if _state['preloaded']:
+        return
+    _state['threads_before'] = native_thread_count()
+
+    registry.get_detector()
+    if not inference.use_inference_pool():
+        get_emotion_model()
+        policy = tiers.get_policy()
+        if policy is not None:
+            for tier in policy.tiers:
+                tier.get_model()
+
+    _state['preloaded'] = True
+    _state['master_pid'] = os.getpid()
+    os.register_at_fork(before=_before_fork, after_in_child=_after_fork_in_child)
+
+    threads = native_thread_count()
+    if threads > _state['threads_before']:
+        logger.warning("Loading the emotion model started %d threads in the master process; "
+                       "workers will reload the model after forking", threads - _state['threads_before'])
+    logger.info("Preloaded the emotion model in process %d", os.getpid())
+    gc.freeze()
+
+
+def _before_fork() -> None:
+    _state['threads_at_fork'] = native_thread_count()
+
+
+def _after_fork_in_child() -> None:
+    from . import warmup
+
+    _state['forked'] = True
+    if not is_fork_safe():
+        # Threads of the master (e.g. TensorFlow's pools) do not exist here, and the
+        # models holding them could deadlock, so this worker loads its own copy
+        from .registry import registry
+
+        registry.clear()
+        _state['reloaded'] = True
+        logger.warning("Emotion model was not fork safe in the master, process %d reloads it", os.getpid())
+
+    if getattr(settings, 'EMOTION_WARMUP', False):
+        warmup.start_warm_up()
+
+
+def is_fork_safe() -> bool:
+    """
+    Check whether the preloaded models were safe to fork.
+
+    They are if the master had no more threads at fork time than before loading, i.e.
+    loading did not start TensorFlow's (or OpenCV's) thread pools.
+
+    Returns:
+        bool: True if forking was safe, or nothing was preloaded or forked.
+    """
+    threads_at_fork = _state['threads_at_fork']
+    return threads_at_fork is None or threads_at_fork <= max(1, _state['threads_before'])
+
+
+def ensure_warm_up() -> None:
+    """
+    Start the warm-up in a process that preloaded the model but never forked, e.g. runserver.
+    """
+    from . import warmup
+
+    if _state['preloaded'] and not _state['forked'] and getattr(settings, 'EMOTION_WARMUP', False):
+        warmup.start_warm_up()
+
+
+def get_status() -> dict:
+    """
+    Describe the preload state of this process.
+
+    Returns:
+        dict: Whether the model was preloaded, the master PID, whether this process is a forked
+            worker, the thread counts before loading and at fork, and whether forking was safe.
+    """
+    return dict(_state, pid=os.getpid(), fork_safe=is_fork_safe())
@@ -0,0 +1,123 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry(object):
+    """
+    Process-wide cache of loaded emotion models and face cascades.
+
+    Loading the Keras model and the Haar cascade is expensive, so each worker
+    process loads them once and every request shares the same handles. The
+    emotion_model module (and with it OpenCV and TensorFlow) is only imported
+    when something is first loaded.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty registry.
+        """
+        self._lock = threading.Lock()
+        self._models = {}
+        self._cascades = {}
+
+    def get_face_cascade(self, cascade_file: str = None):
+        """
+        Get the shared face cascade for the given file, loading it on first use.
+
+        Args:
+            cascade_file (str, optional): Path to the Haar cascade XML file. Defaults to the bundled one.
+
+        Returns:
+            cv2.CascadeClassifier: The loaded face cascade classifier.
+        """
+        from . import emotion_model
+
+        if cascade_file is None:
+            cascade_file = emotion_model.FACE_CASCADE_PATH
+        cascade = self._cascades.get(cascade_file)
+        if cascade is not None:
+            return cascade
+
+        with self._lock:
+            # Another thread may have loaded it while we were waiting for the lock
+            cascade = self._cascades.get(cascade_file)
+            if cascade is None:
+                logger.info("Loading face cascade from %s", cascade_file)
+                cascade = emotion_model.FacialExpressionModel.load_face_cascade(cascade_file)
+                self._cascades[cascade_file] = cascade
+            return cascade
+
+    def get_model(self, model_json_file: str, model_weights_file: str, backend_name: str = 'keras',
+                  **backend_options):
+        """
+        Get the shared model for the given files and backend, loading it on first use.
+
+        Args:
+            model_json_file (str): Path to the JSON file containing the model architecture.
+            model_weights_file (str): Path to the file containing the model weights.
+            backend_name (str): The inference backend to run the model with, see emotion.backends.
+            **backend_options: Extra arguments for the backend, e.g. tflite_file and num_threads.
+
+        Returns:
+            FacialExpressionModel: The loaded model.
+        """
+        key = (model_json_file, model_weights_file, backend_name, tuple(sorted(backend_options.items())))
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        from . import backends, emotion_model
+
+        face_cascade = self.get_face_cascade()
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                backend = None
+                if model_json_file is not None:
+                    logger.info("Loading emotion model from %s with the %s backend", model_json_file, backend_name)
+                    backend = backends.create_backend(backend_name, model_json_file, model_weights_file,
+                                                      **backend_options)
+                model = emotion_model.FacialExpressionModel(face_cascade=face_cascade, backend=backend)
+                self._models[key] = model
+            return model
+
+    def get_detector(self):
+        """
+        Get a shared FacialExpressionModel that only does face detection and preprocessing.
+
+        It does not load the Keras model, so it is cheap enough for web workers that
+        hand inference off to another process.
+
+        Returns:
+            FacialExpressionModel: The detection-only model.
+        """
+        return self.get_model(None, None)
+
+    def remove_models(self, model_json_file: str) -> list:
+        """
+        Forget every model loaded from the given architecture file, whatever its backend.
+
+        Requests still holding one of the models keep working with it.
+
+        Args:
+            model_json_file (str): Path to the JSON file the models were loaded from.
+
+        Returns:
+            list: The removed models.
+        """
+        with self._lock:
+            keys = [key for key in self._models if key[0] == model_json_file]
+            return [self._models.pop(key) for key in keys]
+
+    def clear(self) -> None:
+        """
+        Drop every cached model and cascade.
+        """
+        with self._lock:
+            self._models.clear()
+            self._cascades.clear()
+
+
+registry = ModelRegistry()
@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import metrics
+
+
+class MemoryResultCache(object):
+    """
+    A bounded in-process LRU cache whose entries expire after a TTL.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600):
+        """
+        Initialize an empty cache.
+
+        Args:
+            max_entries (int): Entries kept before the least recently used one is evicted.
+            ttl (float): Seconds an entry stays valid.
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key: str):
+        """
+        Look up a cached value.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            The cached value, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                metrics.increment('emotion.result_cache.expired')
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value) -> None:
+        """
+        Store a value, evicting the least recently used entries beyond max_entries.
+
+        Args:
+            key (str): The cache key.
+            value: The value to cache.
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.increment('emotion.result_cache.evictions')
+
+    def clear(self) -> None:
+        """
+        Drop every entry.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+class DjangoResultCache(object):
+    """
+    Stores results in one of the project's Django cache backends, shared between workers.
+
+    Eviction is up to the backend, so only hits and misses are counted. Keys carry a
+    generation number kept in the same cache, so clear() drops only the results,
+    not whatever else shares the cache.
+    """
+
+    KEY_PREFIX = 'emotion-result:'
+    GENERATION_KEY = 'emotion-result-generation'
+
+    def __init__(self, alias: str, ttl: float = 3600):
+        """
+        Initialize the cache.
+
+        Args:
+            alias (str): The name of the cache in the CACHES setting.
+            ttl (float): Seconds an entry stays valid.
+        """
+        from django.core.cache import caches
+
+        self.cache = caches[alias]
+        self.ttl = ttl
+
+    def _key(self, key: str) -> str:
+        generation = self.cache.get(self.GENERATION_KEY)
+        if generation is None:
+            # add() keeps a generation another process set in the meantime
+            self.cache.add(self.GENERATION_KEY, 0, None)
+            generation = self.cache.get(self.GENERATION_KEY, 0)
+        return f"{self.KEY_PREFIX}{generation}:{key}"
+
+    def get(self, key: str):
+        return self.cache.get(self._key(key))
+
+    def set(self, key: str, value) -> None:
+        self.cache.set(self._key(key), value, self.ttl)
+
+    def clear(self) -> None:
+        """
+        Drop every result by moving to the next generation; old entries expire with their TTL.
+        """
+        try:
+            self.cache.incr(self.GENERATION_KEY)
+        except ValueError:
+            self.cache.add(self.GENERATION_KEY, 1, None)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """
+    Get the result cache configured by the EMOTION_RESULT_CACHE* settings.
+
+    EMOTION_RESULT_CACHE is 'memory' for the in-process LRU cache, the alias of a
+    Django cache, or None to disable caching.
+
+    Returns:
+        MemoryResultCache or DjangoResultCache: The cache, or None if caching is disabled.
+    """
+    global _cache
+    backend = getattr(settings, 'EMOTION_RESULT_CACHE', None)
+    if not backend:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            ttl = getattr(settings, 'EMOTION_RESULT_CACHE_TTL', 3600)
+            if backend == 'memory':
+                _cache = MemoryResultCache(getattr(settings, 'EMOTION_RESULT_CACHE_SIZE', 256), ttl)
+            else:
+                _cache = DjangoResultCache(backend, ttl)
+        return _cache
+
+
+def lookup(key: str):
+    """
+    Look up a cached result and count the hit or miss.
+
+    Args:
+        key (str): The cache key.
+
+    Returns:
+        dict: The cached result, or None.
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return None
+    value = cache.get(key)
+    metrics.increment('emotion.result_cache.hits' if value is not None else 'emotion.result_cache.misses')
+    return value
+
+
+def store(key: str, value) -> None:
+    """
+    Cache a result if caching is enabled.
+
+    Args:
+        key (str): The cache key.
+        value: The result to cache.
+    """
+    cache = get_result_cache()
+    if cache is not None:
+        cache.set(key, value)
@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import Future
+
+from . import metrics
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs the function; callers that arrive while it is
+    still running wait for it and get the same result, or the same exception.
+    Coalescing is per process, duplicates that land on other workers still run.
+    """
+
+    def __init__(self, name: str):
+        """
+        Initialize the group.
+
+        Args:
+            name (str): Used to name the counter of coalesced calls in emotion.metrics.
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) unless a call with the same key is already in flight.
+
+        Args:
+            key: Identifies duplicate calls.
+            fn (Callable): The function to run.
+
+        Returns:
+            The result of the call that ran.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._calls[key] = call
+
+        if not leader:
+            metrics.increment(f'emotion.singleflight.{self.name}.coalesced')
+            return call.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
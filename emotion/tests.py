@@ -1,3 +1,898 @@
-from django.test import TestCase
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+
+from emotion import metrics, warmup
+from emotion.backends import InferenceBackend
+from emotion.batching import BatchScheduler
+
+# The inference process stand-ins below run in spawned processes, which import
+# this module, so it must not import Django models or views at the top
+
+
+def _exiting_worker(*args):
+    # Like an inference process that fails to load its model
+    raise SystemExit(3)
+
+
+def _silent_worker(model_json_file, model_weights_file, backend_options, slot_names, intra_op_threads,
+                   inter_op_threads, tasks, results):
+    # Like a stuck inference process: takes tasks but never answers
+    while tasks.get() is not None:
+        pass
+
+
+def _echo_worker(model_json_file, model_weights_file, backend_options, slot_names, intra_op_threads,
+                 inter_op_threads, tasks, results):
+    # Answers every ROI with its first pixel as the scores, without a model
+    from multiprocessing import shared_memory
+    from emotion.inference_pool import _slot_arrays
+
+    blocks = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    slots = [_slot_arrays(block) for block in blocks]
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            request_id, slot = task
+            roi, scores = slots[slot]
+            scores[:] = roi[0, 0]
+            results.put((request_id, None))
+    finally:
+        del slots
+        for block in blocks:
+            block.close()
+
+
+def run_concurrently(fn, args_list: list) -> list:
+    """
+    Call fn once per argument tuple, each in its own thread, and collect what each call returned or raised.
+    """
+    outcomes = [None] * len(args_list)
+
+    def call(index, args):
+        try:
+            outcomes[index] = fn(*args)
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=call, args=(index, args)) for index, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return outcomes
+
+
+def encode(image: np.ndarray, extension: str = '.png') -> bytes:
+    import cv2
+
+    return cv2.imencode(extension, image)[1].tobytes()
+
+
+def sharp_image(width: int = 200, height: int = 200) -> np.ndarray:
+    # Noise has a high variance of the Laplacian, so it passes any blur threshold used here
+    return np.random.RandomState(0).randint(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+class FakeBackend(InferenceBackend):
+    """
+    Answers the n-th ROI of every batch with the n-th row of fixed scores, and records the batch sizes.
+    """
+
+    def __init__(self, rows: list):
+        self.rows = np.asarray(rows, dtype=np.float32)
+        self.batch_sizes = []
+
+    def predict(self, roi_imgs: np.ndarray) -> np.ndarray:
+        self.batch_sizes.append(len(roi_imgs))
+        return self.rows[np.arange(len(roi_imgs)) % len(self.rows)]
+
+
+class FakeDetector(object):
+    """
+    Finds the same face boxes in every image, and counts how often it was asked.
+    """
+
+    def __init__(self, faces: list):
+        self.faces = faces
+        self.calls = 0
+
+    def detect_faces(self, image):
+        self.calls += 1
+        return list(self.faces)
+
+
+def fake_model(rows: list):
+    from emotion.emotion_model import FacialExpressionModel
+
+    # Any face cascade keeps the real one from being loaded; the pipeline detects faces with FakeDetector
+    return FacialExpressionModel(backend=FakeBackend(rows), face_cascade=object())
+
+
+@override_settings(EMOTION_BATCHING=False, EMOTION_INFERENCE_POOL=False)
+class PipelineTestCase(SimpleTestCase):
+    """
+    Runs images through an EmotionPipeline with a fake detector and a fake model.
+    """
+
+    def setUp(self):
+        metrics.reset()
+
+    def run_pipeline(self, image_data: bytes, faces: list = (), rows: list = ((1, 0, 0),), **kwargs):
+        from emotion.pipeline import EmotionPipeline
+
+        self.detector = FakeDetector(list(faces))
+        self.model = fake_model(rows)
+        self.get_model = mock.Mock(return_value=self.model)
+        pipeline = EmotionPipeline(get_detector=lambda: self.detector, get_model=self.get_model, **kwargs)
+        return pipeline.run(image_data)
+
+    def assertCounters(self, **expected):
+        counters = metrics.snapshot()['counters']
+        self.assertEqual({name: counters.get(f'emotion.stage.{name.replace("_", ".")}', 0) for name in expected},
+                         expected)
+
+
+class PipelineStageTests(PipelineTestCase):
+
+    def test_undecodable_image_is_rejected_first(self):
+        result = self.run_pipeline(b'not an image')
+
+        self.assertEqual((result.status, result.stage), ('badImage', 'decode'))
+        self.assertCounters(decode_runs=1, decode_rejected=1, size_runs=0)
+
+    def test_small_image_is_rejected_before_face_detection(self):
+        result = self.run_pipeline(encode(sharp_image(32, 32)), faces=[(0, 0, 10, 10)], min_size=64)
+
+        self.assertEqual((result.status, result.stage), ('tooSmall', 'size'))
+        self.assertEqual(self.detector.calls, 0)
+        self.assertCounters(size_runs=1, size_rejected=1, blur_runs=0)
+
+    def test_blurry_image_is_rejected_before_face_detection(self):
+        flat = np.full((200, 200, 3), 128, dtype=np.uint8)
+        result = self.run_pipeline(encode(flat), faces=[(0, 0, 100, 100)], blur_threshold=10)
+
+        self.assertEqual((result.status, result.stage), ('blurry', 'blur'))
+        self.assertEqual(self.detector.calls, 0)
+        self.assertCounters(blur_runs=1, blur_rejected=1, faces_runs=0)
+
+    def test_blur_check_is_off_at_threshold_zero(self):
+        flat = np.full((200, 200, 3), 128, dtype=np.uint8)
+        result = self.run_pipeline(encode(flat), faces=[(0, 0, 100, 100)], blur_threshold=0)
+
+        self.assertEqual(result.status, 'ok')
+        self.assertCounters(blur_runs=1, blur_rejected=0)
+
+    def test_image_without_a_face_never_loads_the_model(self):
+        result = self.run_pipeline(encode(sharp_image()), faces=[])
+
+        self.assertEqual((result.status, result.stage), ('noFace', 'faces'))
+        self.get_model.assert_not_called()
+        self.assertCounters(faces_runs=1, faces_rejected=1, predict_runs=0)
+
+    def test_several_faces_are_rejected_outside_group_mode(self):
+        result = self.run_pipeline(encode(sharp_image()), faces=[(0, 0, 50, 50), (100, 100, 50, 50)])
+
+        self.assertEqual((result.status, result.stage), ('mulFace', 'faces'))
+        self.get_model.assert_not_called()
+
+    def test_one_face_is_predicted(self):
+        result = self.run_pipeline(encode(sharp_image()), faces=[(10, 20, 100, 100)], rows=[(0, 0, 1)])
+
+        self.assertEqual((result.status, result.emotion), ('ok', 'sad'))
+        self.assertEqual(result.face_box, (10, 20, 100, 100))
+        self.assertEqual(self.model.backend.batch_sizes, [1])
+        self.assertCounters(predict_runs=1, predict_rejected=0)
+
+
+class WarmUpTests(SimpleTestCase):
+
+    @override_settings(EMOTION_WARMUP_RETRY_DELAY=0)
+    def test_failed_warm_up_is_retried_until_it_succeeds(self):
+        with mock.patch.object(warmup, 'warm_up', side_effect=[False, False, True]) as warm_up:
+            warmup._warm_up_until_ready()
+        self.assertEqual(warm_up.call_count, 3)
+
+
+class BatchSchedulerTests(SimpleTestCase):
+
+    def scheduler(self, predict_batch, **kwargs) -> BatchScheduler:
+        scheduler = BatchScheduler(predict_batch, **kwargs)
+        self.addCleanup(scheduler.stop)
+        return scheduler
+
+    @staticmethod
+    def roi(value: float) -> np.ndarray:
+        return np.full((2, 2, 3), value, dtype=np.float32)
+
+    def test_full_batch_runs_without_waiting_for_the_window(self):
+        sizes = []
+
+        def predict_batch(batch):
+            sizes.append(len(batch))
+            return batch[:, 0, 0, :]
+
+        scheduler = self.scheduler(predict_batch, max_batch_size=2, max_wait_ms=10000)
+        started = time.monotonic()
+        run_concurrently(scheduler.submit, [(self.roi(1),), (self.roi(2),)])
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(sizes, [2])
+
+    def test_partial_batch_runs_when_the_window_passes(self):
+        sizes = []
+
+        def predict_batch(batch):
+            sizes.append(len(batch))
+            return batch[:, 0, 0, :]
+
+        scheduler = self.scheduler(predict_batch, max_batch_size=8, max_wait_ms=50)
+        started = time.monotonic()
+        scheduler.submit(self.roi(1), timeout=5)
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+        self.assertEqual(sizes, [1])
+
+    def test_each_caller_gets_its_own_row(self):
+        scheduler = self.scheduler(lambda batch: batch[:, 0, 0, :], max_batch_size=4, max_wait_ms=200)
+        values = [1.0, 2.0, 3.0, 4.0]
+        outcomes = run_concurrently(scheduler.submit, [(self.roi(value), 5) for value in values])
+
+        self.assertEqual([outcome.tolist() for outcome in outcomes], [[value] * 3 for value in values])
+
+    def test_failed_batch_fails_every_caller(self):
+        def predict_batch(batch):
+            raise ValueError("model failed")
+
+        scheduler = self.scheduler(predict_batch, max_batch_size=3, max_wait_ms=200)
+        outcomes = run_concurrently(scheduler.submit, [(self.roi(value), 5) for value in range(3)])
+
+        self.assertEqual([str(outcome) for outcome in outcomes], ["model failed"] * 3)
+        self.assertTrue(all(isinstance(outcome, ValueError) for outcome in outcomes))
+
+
+class InferencePoolTests(SimpleTestCase):
+
+    def start_pool(self, worker, **kwargs):
+        from emotion import inference_pool
+
+        pool = inference_pool.InferencePool('model_config.json', 'model_wts.h5', size=1, **kwargs)
+        with mock.patch.object(inference_pool, '_worker_main', worker):
+            pool.start()
+        self.addCleanup(pool.close)
+        return pool
+
+    def roi(self, value: float):
+        import numpy as np
+        from emotion.inference_pool import INPUT_SHAPE
+
+        return np.full(INPUT_SHAPE, value, dtype=np.float32)
+
+    def test_predict_returns_scores_of_its_own_slot(self):
+        pool = self.start_pool(_echo_worker)
+        self.assertEqual(pool.predict(self.roi(0.25), timeout=30).tolist(), [0.25, 0.25, 0.25])
+        self.assertEqual(pool.predict(self.roi(0.5), timeout=30).tolist(), [0.5, 0.5, 0.5])
+        self.assertEqual(pool._free_slots.qsize(), 2)
+
+    def test_dead_process_fails_waiting_request(self):
+        pool = self.start_pool(_exiting_worker, timeout=60)
+        started = time.monotonic()
+        with self.assertRaises(ValueError):
+            # predict() restarts the broken pool, whose new process exits again
+            with mock.patch('emotion.inference_pool._worker_main', _exiting_worker):
+                pool.predict(self.roi(0.0))
+        self.assertLess(time.monotonic() - started, 30)
+        self.assertEqual(pool._pending, {})
+
+    def test_pool_restarts_after_a_process_exited(self):
+        pool = self.start_pool(_exiting_worker)
+        with self.assertRaises(ValueError):
+            with mock.patch('emotion.inference_pool._worker_main', _exiting_worker):
+                pool.predict(self.roi(0.0))
+
+        with mock.patch('emotion.inference_pool._worker_main', _echo_worker):
+            self.assertEqual(pool.predict(self.roi(0.75), timeout=30).tolist(), [0.75, 0.75, 0.75])
+        self.assertEqual(pool._free_slots.qsize(), 2)
+
+    def test_timed_out_slot_is_not_reused_until_answered(self):
+        pool = self.start_pool(_silent_worker)
+        with self.assertRaisesMessage(ValueError, "did not answer in time"):
+            pool.predict(self.roi(0.0), timeout=0.2)
+
+        self.assertEqual(pool._pending, {})
+        self.assertEqual(len(pool._abandoned), 1)
+        self.assertEqual(pool._free_slots.qsize(), 1)
+
+        # A late answer frees the slot again
+        request_id = next(iter(pool._abandoned))
+        pool._results.put((request_id, None))
+        deadline = time.monotonic() + 5
+        while pool._free_slots.qsize() < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(pool._free_slots.qsize(), 2)
+        self.assertEqual(pool._abandoned, {})
+
+
+@override_settings(EMOTION_INFERENCE_POOL=True)
+class PoolWarmUpTests(SimpleTestCase):
+
+    def test_warm_up_runs_through_the_pool_without_loading_the_model(self):
+        pool = mock.Mock()
+        with mock.patch('emotion.inference.get_inference_pool', return_value=pool), \
+                mock.patch('emotion.registry.registry.get_detector') as get_detector, \
+                mock.patch('emotion.views.get_emotion_model') as get_emotion_model:
+            self.assertTrue(warmup.warm_up())
+
+        pool.predict.assert_called_once()
+        get_detector.assert_called_once_with()
+        get_emotion_model.assert_not_called()
+
+
+class ProxyImageTests(SimpleTestCase):
+
+    def proxy(self, target_size: int):
+        from emotion.decoding import ProxyImage
+
+        return ProxyImage(encode(sharp_image(1600, 1200), '.jpg'), target_size)
+
+    def test_decoder_reduction_maps_boxes_back_to_full_resolution(self):
+        proxy = self.proxy(400)
+
+        self.assertEqual(proxy.image.shape[:2], (300, 400))
+        self.assertEqual(proxy.full_size, (1600, 1200))
+        self.assertEqual(proxy.scale, 4.0)
+        self.assertEqual(proxy.to_full((10, 20, 30, 40)), (40, 80, 120, 160))
+
+    def test_resize_after_reduction_is_part_of_the_scale(self):
+        # 1/8 decodes to 200 pixels, more than 1.5 times the target, so it is resized to 100
+        proxy = self.proxy(100)
+
+        self.assertEqual(proxy.image.shape[:2], (75, 100))
+        self.assertEqual(proxy.scale, 16.0)
+        self.assertEqual(proxy.to_full((1, 2, 3, 4)), (16, 32, 48, 64))
+
+    def test_full_resolution_decode_is_not_mapped(self):
+        proxy = self.proxy(0)
+
+        self.assertEqual(proxy.scale, 1.0)
+        self.assertEqual(proxy.to_full((10, 20, 30, 40)), (10, 20, 30, 40))
+
+    def test_face_big_enough_on_the_proxy_is_cropped_from_it(self):
+        proxy = self.proxy(200)
+        image, box = proxy.face_source((10, 10, 40, 40), 32)
+
+        self.assertIs(image, proxy.image)
+        self.assertEqual(box, (10, 10, 40, 40))
+
+    def test_small_face_is_cropped_from_the_smallest_sharp_enough_decode(self):
+        proxy = self.proxy(200)
+        self.assertEqual(proxy.scale, 8.0)
+
+        # 800 pixels across at full resolution, so a 1/2 decode still has 400 for a 256 pixel input
+        image, box = proxy.face_source((10, 10, 100, 100), 256)
+        self.assertEqual(image.shape[:2], (600, 800))
+        self.assertEqual(box, (40, 40, 400, 400))
+
+        # 320 pixels across, so only the full resolution decode has enough
+        image, box = proxy.face_source((10, 10, 40, 40), 256)
+        self.assertEqual(image.shape[:2], (1200, 1600))
+        self.assertEqual(box, (80, 80, 320, 320))
+
+
+class MemoryResultCacheTests(SimpleTestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        from emotion.result_cache import MemoryResultCache
+
+        cache = MemoryResultCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+
+    def test_expired_entry_is_not_returned(self):
+        from emotion.result_cache import MemoryResultCache
+
+        metrics.reset()
+        cache = MemoryResultCache(ttl=0)
+        cache.set('a', 1)
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(metrics.snapshot()['counters']['emotion.result_cache.expired'], 1)
+
+
+@override_settings(EMOTION_RESULT_CACHE='memory', EMOTION_GROUP_MODE=False, EMOTION_MODEL_TIERS=None)
+class ResultCacheKeyTests(SimpleTestCase):
+
+    def setUp(self):
+        from emotion import result_cache
+        from emotion.pipeline import PipelineResult
+
+        # A fresh cache for every test
+        patcher = mock.patch.object(result_cache, '_cache', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.pipeline = mock.Mock()
+        self.pipeline.run.return_value = PipelineResult('ok', 'predict', emotion='happy', scores=np.ones(3))
+        self.model_version = 'v1'
+        for target, kwargs in (('emotion.views.get_pipeline', {'return_value': self.pipeline}),
+                               ('emotion.views.get_model_version', {'side_effect': lambda: self.model_version})):
+            patcher = mock.patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def detect(self, image_data: bytes = b'image'):
+        from emotion import views
+
+        return views.run_pipeline(image_data)
+
+    def test_same_image_is_answered_from_the_cache(self):
+        self.detect()
+        result = self.detect()
+
+        self.assertEqual(self.pipeline.run.call_count, 1)
+        self.assertEqual(result.emotion, 'happy')
+
+    def test_other_image_is_not(self):
+        self.detect(b'image')
+        self.detect(b'other image')
+        self.assertEqual(self.pipeline.run.call_count, 2)
+
+    def test_other_model_version_is_not(self):
+        self.detect()
+        self.model_version = 'v2'
+        self.detect()
+        self.assertEqual(self.pipeline.run.call_count, 2)
+
+    def test_group_mode_result_is_kept_apart(self):
+        self.detect()
+        with self.settings(EMOTION_GROUP_MODE=True):
+            self.detect()
+            self.detect()
+        self.assertEqual(self.pipeline.run.call_count, 2)
+
+    def test_rejections_are_not_cached(self):
+        from emotion.pipeline import PipelineResult
+
+        self.pipeline.run.return_value = PipelineResult('noFace', 'faces')
+        self.detect()
+        self.detect()
+        self.assertEqual(self.pipeline.run.call_count, 2)
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_same_key_runs_once(self):
+        from emotion.singleflight import SingleFlight
+
+        flight = SingleFlight('test')
+        entered, release = threading.Event(), threading.Event()
+        calls = []
+
+        def slow(value):
+            calls.append(value)
+            entered.set()
+            release.wait(5)
+            return value
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', slow, 1)))
+        leader.start()
+        entered.wait(5)
+        follower = threading.Thread(target=lambda: results.append(flight.do('key', slow, 2)))
+        follower.start()
+        # Give the follower time to join the call in flight
+        time.sleep(0.1)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [1, 1])
+
+
+@override_settings(EMOTION_RESULT_CACHE=None, EMOTION_MODEL_TIERS=None)
+class DuplicateUploadTests(TransactionTestCase):
+    """
+    Concurrent uploads of one user, as from a double click on the upload page.
+    """
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from songs.models import Song
+
+        self.user = User.objects.create_user('alice')
+        Song.objects.create(user=self.user, song_name='alice happy', song_url='/media/alice.mp3', emotion='happy')
+
+        self.detections = []
+        self.pipeline = mock.Mock()
+        self.pipeline.run.side_effect = self.detect
+        for target, kwargs in (('emotion.views.get_pipeline', {'return_value': self.pipeline}),
+                               ('emotion.views.get_model_version', {'return_value': 'v1'})):
+            patcher = mock.patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def detect(self, image_data, on_stage=None):
+        from emotion.pipeline import PipelineResult
+
+        self.detections.append(image_data)
+        self.wait_in_detection()
+        return PipelineResult('ok', 'predict', emotion='happy', scores=np.array([1, 0, 0], dtype=np.float32))
+
+    def wait_in_detection(self):
+        pass
+
+    def upload(self, image_data: bytes, responses: list) -> None:
+        from django.db import connection
+        from emotion import views
+
+        request = RequestFactory().post('/emotion/detect/', data=image_data, content_type='image/jpeg')
+        request.user = self.user
+        try:
+            responses.append(views.handle_image_upload(request))
+        finally:
+            connection.close()
+
+    def test_duplicate_upload_shares_the_detection_and_gets_its_own_playlist(self):
+        entered, release = threading.Event(), threading.Event()
+
+        def wait_in_detection():
+            entered.set()
+            release.wait(5)
+
+        self.wait_in_detection = wait_in_detection
+        responses = []
+        leader = threading.Thread(target=self.upload, args=(b'same', responses))
+        leader.start()
+        entered.wait(5)
+        follower = threading.Thread(target=self.upload, args=(b'same', responses))
+        follower.start()
+        # Give the follower time to join the detection in flight
+        time.sleep(0.1)
+        release.set()
+        leader.join(10)
+        follower.join(10)
+
+        self.assertEqual(self.detections, [b'same'])
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+        for response in responses:
+            self.assertContains(response, 'alice happy')
+
+    def test_different_images_are_detected_separately(self):
+        both_running = threading.Barrier(2, timeout=5)
+        # Both detections have to be running at the same time
+        self.wait_in_detection = both_running.wait
+
+        responses = []
+        threads = [threading.Thread(target=self.upload, args=(image_data, responses))
+                   for image_data in (b'first', b'second')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        self.assertEqual(sorted(self.detections), [b'first', b'second'])
+        self.assertEqual([response.status_code for response in responses], [200, 200])
+
+
+class GroupModeTests(PipelineTestCase):
+
+    def test_faces_are_scored_in_one_batch_and_averaged(self):
+        faces = [(10, 10, 40, 40), (60, 60, 80, 80), (120, 10, 60, 60)]
+        # Rows go to the faces largest first: one happy and two sad faces
+        result = self.run_pipeline(encode(sharp_image()), faces=faces, rows=[(1, 0, 0), (0, 0, 1), (0, 0, 1)],
+                                   group_mode=True)
+
+        self.assertEqual((result.status, result.emotion), ('ok', 'sad'))
+        np.testing.assert_allclose(result.scores, [1 / 3, 0, 2 / 3], rtol=1e-6)
+        self.assertEqual(self.model.backend.batch_sizes, [3])
+        self.assertEqual(result.face_boxes, [(60, 60, 80, 80), (120, 10, 60, 60), (10, 10, 40, 40)])
+        self.assertEqual(result.face_box, (60, 60, 80, 80))
+
+    def test_only_the_largest_faces_are_scored(self):
+        faces = [(0, 0, 20, 20), (30, 30, 50, 50), (100, 0, 30, 30), (100, 100, 90, 90)]
+        result = self.run_pipeline(encode(sharp_image()), faces=faces, group_mode=True, max_faces=2)
+
+        self.assertEqual(result.status, 'ok')
+        self.assertEqual(self.model.backend.batch_sizes, [2])
+        self.assertEqual(result.face_boxes, [(100, 100, 90, 90), (30, 30, 50, 50)])
+        self.assertEqual(metrics.snapshot()['histograms']['emotion.group_size'], {2: 1})
+
+
+class JobManagerTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def wait_until_finished(self, job):
+        deadline = time.monotonic() + 5
+        while not job.finished and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_job_moves_through_the_stage_states_to_done(self):
+        from emotion import jobs
+
+        seen = []
+
+        def work(job, value):
+            for stage in ('decode', 'faces', 'predict', 'playlist'):
+                job.set_stage(stage)
+                seen.append(job.state)
+            return {'value': value}
+
+        job = jobs.JobManager().submit(1, work, 42)
+        self.wait_until_finished(job)
+
+        self.assertEqual(seen, [jobs.DETECTING, jobs.DETECTING, jobs.PREDICTING, jobs.BUILDING_PLAYLIST])
+        self.assertEqual(job.to_dict(), {'id': job.id, 'state': jobs.DONE, 'result': {'value': 42}, 'error': None})
+        # One change per state, repeated stages of one state do not count
+        self.assertEqual(job.version, 4)
+
+    def test_failed_job_hides_the_exception(self):
+        from emotion import jobs
+
+        def work(job):
+            raise ValueError("secret details")
+
+        with self.assertLogs('emotion.jobs', 'ERROR'):
+            job = jobs.JobManager().submit(1, work)
+            self.wait_until_finished(job)
+
+        self.assertEqual(job.state, jobs.FAILED)
+        self.assertNotIn("secret", job.error)
+        self.assertEqual(metrics.snapshot()['counters']['emotion.jobs.failed'], 1)
+
+    def test_submission_beyond_the_queue_is_refused(self):
+        from emotion import jobs
+
+        release = threading.Event()
+        manager = jobs.JobManager(max_workers=1, max_pending=1)
+        running = [manager.submit(1, lambda job: release.wait(5)) for _ in range(2)]
+        try:
+            with self.assertRaises(jobs.JobQueueFull):
+                manager.submit(1, lambda job: None)
+        finally:
+            release.set()
+        for job in running:
+            self.wait_until_finished(job)
+
+        self.assertEqual(metrics.snapshot()['counters']['emotion.jobs.rejected'], 1)
+
+    def test_job_of_another_user_is_not_found(self):
+        from django.contrib.auth.models import AnonymousUser
+        from emotion import jobs, views
+
+        manager = jobs.JobManager()
+        job = manager.submit(1, lambda job: None)
+        self.wait_until_finished(job)
+
+        def get_job(user_id):
+            request = RequestFactory().get(f'/emotion/jobs/{job.id}/')
+            request.user = mock.Mock(pk=user_id) if user_id is not None else AnonymousUser()
+            with mock.patch.object(jobs, 'get_job_manager', return_value=manager):
+                return views.get_job(request, job.id)
+
+        self.assertEqual(get_job(1).status_code, 200)
+        self.assertEqual(get_job(2).status_code, 404)
+        self.assertEqual(get_job(None).status_code, 404)
+        self.assertIsNone(manager.get('unknown', 1))
+
+
+class AdmissionTests(SimpleTestCase):
+
+    def setUp(self):
+        metrics.reset()
+
+    def hold_slot(self, controller):
+        # Takes the only slot until the returned event is set
+        entered, release = threading.Event(), threading.Event()
+
+        def hold():
+            with controller.admit():
+                entered.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        entered.wait(5)
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(release.set)
+        return release
+
+    def test_request_is_shed_when_the_queue_is_full(self):
+        from emotion.admission import AdmissionController, Overloaded
+
+        controller = AdmissionController(max_concurrent=1, max_queue=0, retry_after=7)
+        self.hold_slot(controller)
+
+        with self.assertRaises(Overloaded) as raised:
+            controller.check()
+        self.assertEqual(raised.exception.retry_after, 7)
+        with self.assertRaises(Overloaded):
+            with controller.admit():
+                pass
+        self.assertEqual(metrics.snapshot()['counters']['emotion.admission.shed.full'], 2)
+
+    def test_request_is_shed_after_waiting_too_long(self):
+        from emotion.admission import AdmissionController, Overloaded
+
+        controller = AdmissionController(max_concurrent=1, max_queue=1, timeout=0.05)
+        self.hold_slot(controller)
+
+        with self.assertRaises(Overloaded):
+            with controller.admit():
+                pass
+        self.assertEqual(metrics.snapshot()['counters']['emotion.admission.shed.timeout'], 1)
+        self.assertEqual(controller.queue_depth, 0)
+
+    def test_waiting_request_gets_the_freed_slot(self):
+        from emotion.admission import AdmissionController
+
+        controller = AdmissionController(max_concurrent=1, max_queue=1)
+        release = self.hold_slot(controller)
+        threading.Timer(0.05, release.set).start()
+
+        with controller.admit():
+            pass
+        self.assertEqual(metrics.snapshot()['counters']['emotion.admission.admitted'], 2)
+
+    def test_shed_upload_is_answered_with_503_and_retry_after(self):
+        from emotion import views
+        from emotion.admission import Overloaded
+
+        request = RequestFactory().post('/emotion/detect/', data=b'image', content_type='image/jpeg',
+                                        HTTP_ACCEPT='application/json')
+        with mock.patch('emotion.views.run_pipeline', side_effect=Overloaded("The server is busy.", 7)):
+            response = views.handle_image_upload(request)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '7')
+        self.assertJSONEqual(response.content, {'status': 'busy', 'error': "The server is busy."})
+
+
+class TierPolicyTests(PipelineTestCase):
+
+    def make_policy(self, **limits):
+        from emotion.tiers import ModelTier, TierPolicy
+
+        self.full = ModelTier('full', mock.Mock(), **limits)
+        self.light = ModelTier('light', mock.Mock())
+        return TierPolicy([self.full, self.light])
+
+    def test_deep_queue_falls_back_to_the_next_tier(self):
+        policy = self.make_policy(max_queue_depth=4)
+
+        self.assertIs(policy.choose(3), self.full)
+        self.assertIs(policy.choose(4), self.light)
+        self.assertEqual(metrics.snapshot()['counters']['emotion.tier.light.used'], 1)
+
+    def test_slow_tier_is_skipped_while_its_p95_is_above_the_slo(self):
+        policy = self.make_policy(latency_slo_ms=100)
+        for _ in range(19):
+            self.full.record(0.05)
+        self.assertIs(policy.choose(), self.full)
+
+        # The slowest of twenty predictions is their p95
+        self.full.record(0.5)
+        self.assertEqual(self.full.p95_ms(), 500)
+        self.assertIs(policy.choose(), self.light)
+
+    def test_slow_tier_is_tried_again_once_its_samples_age_out(self):
+        policy = self.make_policy(latency_slo_ms=100)
+        self.full.window_seconds = 60
+        with mock.patch('emotion.tiers.time.monotonic', return_value=1000.0):
+            self.full.record(0.5)
+            self.assertIs(policy.choose(), self.light)
+        with mock.patch('emotion.tiers.time.monotonic', return_value=1061.0):
+            self.assertIsNone(self.full.p95_ms())
+            self.assertIs(policy.choose(), self.full)
+
+    def test_last_tier_answers_when_every_tier_is_over_its_limits(self):
+        from emotion.tiers import ModelTier, TierPolicy
+
+        tiers = [ModelTier(name, mock.Mock(), max_queue_depth=1) for name in ('full', 'light')]
+        self.assertIs(TierPolicy(tiers).choose(5), tiers[-1])
+
+    def test_pipeline_records_the_tier_that_answered(self):
+        policy = self.make_policy(max_queue_depth=1)
+        self.light.get_model.return_value = fake_model([(0, 1, 0)])
+        admission = mock.MagicMock(queue_depth=2)
+
+        result = self.run_pipeline(encode(sharp_image()), faces=[(50, 50, 80, 80)], tiers=policy,
+                                   admission=admission)
+
+        self.assertEqual((result.status, result.model), ('ok', 'light'))
+        self.full.get_model.assert_not_called()
+        self.assertIsNotNone(self.light.p95_ms())
+
+
+@override_settings(EMOTION_INFERENCE_POOL=False, EMOTION_MODEL_TIERS=None)
+class VersionManagerTests(SimpleTestCase):
+
+    def setUp(self):
+        import tempfile
+        from pathlib import Path
+        from emotion import versions
+
+        metrics.reset()
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name)
+        for version in ('v1', 'v2'):
+            (self.root / version).mkdir()
+            for name in (versions.MODEL_JSON_FILE, versions.MODEL_WEIGHTS_FILE):
+                (self.root / version / name).write_text(version)
+        settings_override = self.settings(EMOTION_MODEL_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        versions.write_pointer('v1')
+        self.manager = versions.VersionManager(poll_interval=0, grace_period=60)
+        self.assertEqual(self.manager.check(), 'v1')
+
+    def swap_to(self, version: str):
+        from emotion import versions
+
+        versions.write_pointer(version)
+        # The old version keeps answering while the new one loads
+        self.assertEqual(self.manager.check(), 'v1')
+        deadline = time.monotonic() + 5
+        while self.manager.loading_version is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_moved_pointer_swaps_to_the_new_version(self):
+        with mock.patch('emotion.views.load_emotion_model') as load_emotion_model, \
+                mock.patch('emotion.versions.threading.Timer') as timer:
+            self.swap_to('v2')
+
+        load_emotion_model.assert_called_once_with('v2')
+        self.assertEqual(self.manager.get_status(), {'active': 'v2', 'loading': None, 'pointer': 'v2', 'error': None})
+        # The old version is released after the grace period
+        timer.assert_called_once_with(60, self.manager._release, args=('v1',))
+        self.assertEqual(metrics.snapshot()['counters']['emotion.model_swap.done'], 1)
+
+    def test_failed_swap_keeps_the_old_version(self):
+        with mock.patch('emotion.views.load_emotion_model', side_effect=RuntimeError("bad weights")), \
+                self.assertLogs('emotion.versions', 'ERROR'):
+            self.swap_to('v2')
+
+        self.assertEqual(self.manager.active_version, 'v1')
+        self.assertEqual(self.manager.error, "v2: bad weights")
+        self.assertEqual(metrics.snapshot()['counters']['emotion.model_swap.failed'], 1)
+
+    def test_released_version_drops_its_models(self):
+        from emotion import versions
+        from emotion.registry import registry
+
+        self.manager.active_version = 'v2'
+        model = mock.Mock()
+        with mock.patch.object(registry, 'remove_models', return_value=[model]) as remove_models, \
+                mock.patch('emotion.inference.stop_scheduler') as stop_scheduler:
+            self.manager._release('v1')
+
+        remove_models.assert_called_once_with(str(self.root / 'v1' / versions.MODEL_JSON_FILE))
+        stop_scheduler.assert_called_once_with(model)
+
+    def test_version_swapped_back_to_is_kept(self):
+        from emotion.registry import registry
+
+        with mock.patch.object(registry, 'remove_models') as remove_models:
+            self.manager._release('v1')
+        remove_models.assert_not_called()
+
+    def test_pointer_to_a_version_without_model_files_is_refused(self):
+        from emotion import versions
+
+        (self.root / 'v3').mkdir()
+        with self.assertRaises(ValueError):
+            versions.write_pointer('v3')
+        self.assertEqual(versions.read_pointer(), 'v1')
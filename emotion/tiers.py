@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from django.conf import settings
+
+from . import metrics
+
+
+class ModelTier(object):
+    """
+    One model in a ranked list of emotion models, with the limits it is used under.
+
+    A tier keeps the latencies of its recent predictions; samples older than
+    window_seconds are dropped, so a tier that was skipped for being slow is tried
+    again once its old samples have aged out.
+
+    Attributes:
+        name (str): The name recorded on results this tier answered.
+        max_queue_depth (int): Skip this tier once this many predictions are waiting; None for no limit.
+        latency_slo_ms (float): Skip this tier while its recent p95 latency is above this; None for no limit.
+    """
+
+    def __init__(self, name: str, get_model, max_queue_depth: int = None, latency_slo_ms: float = None,
+                 window_seconds: float = 60, max_samples: int = 200):
+        """
+        Initialize the tier.
+
+        Args:
+            name (str): The name of the tier.
+            get_model (Callable): Returns the FacialExpressionModel of this tier.
+            max_queue_depth (int): Queue depth at which the next tier takes over.
+            latency_slo_ms (float): Recent p95 latency at which the next tier takes over.
+            window_seconds (float): Age of the latency samples the p95 is computed from.
+            max_samples (int): Latency samples kept at most.
+        """
+        self.name = name
+        self.get_model = get_model
+        self.max_queue_depth = max_queue_depth
+        self.latency_slo_ms = latency_slo_ms
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=max_samples)
+
+    def record(self, seconds: float) -> None:
+        """
+        Record the latency of a prediction made by this tier.
+
+        Args:
+            seconds (float): How long the prediction took.
+        """
+        with self._lock:
+            self._samples.append((time.monotonic(), seconds))
+        metrics.set_gauge(f'emotion.tier.{self.name}.p95_ms', self.p95_ms())
+
+    def p95_ms(self) -> float:
+        """
+        Get the 95th percentile latency of the recent predictions.
+
+        Returns:
+            float: The latency in milliseconds, or None without recent samples.
+        """
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            latencies = sorted(seconds for _, seconds in self._samples)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000
+
+    def accepts(self, queue_depth: int) -> bool:
+        """
+        Check whether this tier should answer at the current load.
+
+        Args:
+            queue_depth (int): Predictions waiting for a slot.
+
+        Returns:
+            bool: False if the queue or the recent latency is above this tier's limits.
+        """
+        if self.max_queue_depth is not None and queue_depth >= self.max_queue_depth:
+            return False
+        if self.latency_slo_ms is not None:
+            p95 = self.p95_ms()
+            if p95 is not None and p95 > self.latency_slo_ms:
+                return False
+        return True
+
+
+class TierPolicy(object):
+    """
+    Picks the most accurate model tier whose limits the current load allows.
+
+    Tiers are ranked from most to least accurate; the last tier answers when
+    every other one is over its limits.
+    """
+
+    def __init__(self, tiers: list):
+        """
+        Initialize the policy.
+
+        Args:
+            tiers (list): The ModelTier objects, most accurate first.
+        """
+        if not tiers:
+            raise ValueError("At least one model tier is required.")
+        self.tiers = list(tiers)
+
+    @property
+    def primary(self) -> ModelTier:
+        return self.tiers[0]
+
+    def choose(self, queue_depth: int = 0) -> ModelTier:
+        """
+        Pick the tier for one prediction.
+
+        Args:
+            queue_depth (int): Predictions waiting for a slot.
+
+        Returns:
+            ModelTier: The first tier that accepts the load, or the last tier.
+        """
+        for tier in self.tiers[:-1]:
+            if tier.accepts(queue_depth):
+                break
+        else:
+            tier = self.tiers[-1]
+        metrics.increment(f'emotion.tier.{tier.name}.used')
+        return tier
+
+
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def build_policy(version: str = None) -> TierPolicy:
+    """
+    Build the tier policy configured by the EMOTION_MODEL_TIERS setting for a model version.
+
+    EMOTION_MODEL_TIERS is a list of dicts, most accurate model first. Each has a
+    'name', optionally 'max_queue_depth' and 'latency_slo_ms', optionally
+    'model_json_file' and 'model_weights_file' (the model files of the version by
+    default), and backend options for ModelRegistry.get_model such as 'backend_name'
+    and 'tflite_file' (the EMOTION_BACKEND* settings by default).
+
+    Args:
+        version (str, optional): The model version; None for the active one.
+
+    Returns:
+        TierPolicy: A new policy, or None if no tiers are configured.
+    """
+    configured = getattr(settings, 'EMOTION_MODEL_TIERS', None)
+    if not configured:
+        return None
+
+    # Imported here because emotion.views imports this module
+    from .registry import registry
+    from .views import get_active_version, get_backend_settings, get_version_paths
+
+    version = version or get_active_version()
+    model_json_path, model_weights_path = get_version_paths(version)
+    tiers = []
+    for options in configured:
+        options = dict(options)
+        name = options.pop('name')
+        max_queue_depth = options.pop('max_queue_depth', None)
+        latency_slo_ms = options.pop('latency_slo_ms', None)
+        model_json_file = str(options.pop('model_json_file', model_json_path))
+        model_weights_file = str(options.pop('model_weights_file', model_weights_path))
+        if 'backend_name' not in options:
+            options.update(get_backend_settings(version))
+        if options.get('tflite_file'):
+            options['tflite_file'] = str(options['tflite_file'])
+        tiers.append(ModelTier(name, partial(registry.get_model, model_json_file, model_weights_file, **options),
+                               max_queue_depth=max_queue_depth, latency_slo_ms=latency_slo_ms))
+    return TierPolicy(tiers)
+
+
+def get_policy() -> TierPolicy:
+    """
+    Get the tier policy of this process, built for the active model version on first use.
+
+    Returns:
+        TierPolicy: The policy of this process, or None if no tiers are configured.
+    """
+    global _policy
+    if not getattr(settings, 'EMOTION_MODEL_TIERS', None):
+        return None
+
+    with _policy_lock:
+        if _policy is None:
+            _policy = build_policy()
+        return _policy
+
+
+def set_policy(policy: TierPolicy) -> None:
+    """
+    Replace the tier policy of this process, e.g. with one built for a swapped-in model version.
+
+    Args:
+        policy (TierPolicy): The new policy.
+    """
+    global _policy
+    with _policy_lock:
+        _policy = policy
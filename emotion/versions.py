@@ -0,0 +1,264 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Name of the file in EMOTION_MODEL_ROOT that holds the active version
+POINTER_FILE = 'ACTIVE'
+MODEL_JSON_FILE = 'model_config.json'
+MODEL_WEIGHTS_FILE = 'model_wts.h5'
+TFLITE_FILE = 'model.tflite'
+
+
+def get_model_root() -> Path:
+    """
+    Get the directory holding one sub-directory per model version.
+
+    Returns:
+        Path: The EMOTION_MODEL_ROOT setting, or None if versioned models are not configured.
+    """
+    root = getattr(settings, 'EMOTION_MODEL_ROOT', None)
+    return Path(root) if root else None
+
+
+def get_version_dir(version: str) -> Path:
+    """
+    Get the directory of a model version, checking that it holds a model.
+
+    Args:
+        version (str): The version, i.e. the name of its directory.
+
+    Returns:
+        Path: The version directory.
+
+    Raises:
+        ValueError: If model versions are not configured or the version has no model files.
+    """
+    root = get_model_root()
+    if root is None:
+        raise ValueError("EMOTION_MODEL_ROOT is not set.")
+    if not version or os.sep in version or version.startswith('.'):
+        raise ValueError(f"Invalid model version: {version!r}")
+
+    version_dir = root / version
+    for name in (MODEL_JSON_FILE, MODEL_WEIGHTS_FILE):
+        if not (version_dir / name).is_file():
+            raise ValueError(f"Model version {version} has no {name}.")
+    return version_dir
+
+
+def list_versions() -> list:
+    """
+    List the model versions found in EMOTION_MODEL_ROOT.
+
+    Returns:
+        list: The names of the version directories holding model files, sorted.
+    """
+    root = get_model_root()
+    if root is None or not root.is_dir():
+        return []
+    return sorted(entry.name for entry in root.iterdir()
+                  if entry.is_dir() and (entry / MODEL_JSON_FILE).is_file() and (entry / MODEL_WEIGHTS_FILE).is_file())
+
+
+def read_pointer() -> str:
+    """
+    Read the version the ACTIVE pointer file points to.
+
+    Returns:
+        str: The active version, or None if there is no pointer.
+    """
+    root = get_model_root()
+    if root is None:
+        return None
+    try:
+        version = (root / POINTER_FILE).read_text().strip()
+    except OSError:
+        return None
+    return version or None
+
+
+def write_pointer(version: str) -> None:
+    """
+    Point the ACTIVE file at a version, atomically.
+
+    The pointer is written to a temporary file that replaces ACTIVE in one rename,
+    so workers never read a half-written version.
+
+    Args:
+        version (str): The version to activate.
+
+    Raises:
+        ValueError: If the version has no model files.
+    """
+    version_dir = get_version_dir(version)
+    root = version_dir.parent
+    fd, temp_path = tempfile.mkstemp(dir=root, prefix=f'.{POINTER_FILE}.')
+    try:
+        with os.fdopen(fd, 'w') as temp_file:
+            temp_file.write(version + '\n')
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, root / POINTER_FILE)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class VersionManager(object):
+    """
+    Follows the ACTIVE pointer and swaps the model of this process without a restart.
+
+    The pointer is read at most once per poll interval. When it changes, the new
+    version is loaded and warmed up in a background thread while requests keep
+    using the current one; the switch itself is a single assignment. Requests that
+    already hold the old model finish on it, and the old model is dropped after a
+    grace period. The inference pool and the model tiers are rebuilt for the new
+    version the same way.
+    """
+
+    def __init__(self, poll_interval: float = 5.0, grace_period: float = 30.0):
+        """
+        Initialize the manager. The first check loads the pointed-to version in the caller's thread.
+
+        Args:
+            poll_interval (float): Seconds between reads of the pointer file.
+            grace_period (float): Seconds the old model is kept after a swap.
+        """
+        self.poll_interval = poll_interval
+        self.grace_period = grace_period
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self.active_version = None
+        self.loading_version = None
+        self.error = None
+
+    def check(self) -> str:
+        """
+        Start a swap if the pointer has moved since the last check.
+
+        Returns:
+            str: The version requests should use now, None for the legacy model files.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.poll_interval:
+                return self.active_version
+            first_check = self._checked_at is None
+            self._checked_at = now
+
+            # A missing pointer keeps the current version
+            version = read_pointer()
+            if version is None or version == self.active_version or version == self.loading_version:
+                return self.active_version
+            if first_check:
+                # Nothing is loaded yet, so the first request or the warm-up loads this version
+                self.active_version = version
+                return version
+            self.loading_version = version
+
+        logger.info("Model version changed to %s, loading it in the background", version)
+        threading.Thread(target=self._swap, args=(version,), name='emotion-model-swap', daemon=True).start()
+        return self.active_version
+
+    def _swap(self, version: str) -> None:
+        # Imported here because emotion.views imports this module
+        import numpy as np
+        from . import inference, tiers
+        from .emotion_model import FacialExpressionModel
+        from .views import load_emotion_model
+
+        try:
+            started = time.monotonic()
+            size = FacialExpressionModel.IMG_SIZE
+            roi = np.zeros((size, size, 3), dtype=np.float32)
+            policy = None
+            if inference.use_inference_pool():
+                # The new version gets its own inference processes, started and warmed here
+                inference.get_inference_pool(version).predict(roi)
+            else:
+                load_emotion_model(version).get_prediction(roi)
+                # Tiers using the version's model files follow it too
+                policy = tiers.build_policy(version)
+                for tier in policy.tiers if policy is not None else ():
+                    tier.get_model().get_prediction(roi)
+        except Exception as e:
+            logger.exception("Loading model version %s failed, keeping %s", version, self.active_version)
+            with self._lock:
+                self.loading_version = None
+                self.error = f"{version}: {e}"
+            metrics.increment('emotion.model_swap.failed')
+            return
+
+        if policy is not None:
+            tiers.set_policy(policy)
+        with self._lock:
+            previous, self.active_version = self.active_version, version
+            self.loading_version = None
+            self.error = None
+        metrics.increment('emotion.model_swap.done')
+        logger.info("Switched from model version %s to %s in %.1f s", previous or 'legacy', version,
+                    time.monotonic() - started)
+
+        timer = threading.Timer(self.grace_period, self._release, args=(previous,))
+        timer.daemon = True
+        timer.start()
+
+    def _release(self, version: str) -> None:
+        """
+        Drop the models of a version that is no longer active, and stop their batch schedulers and inference pools.
+        """
+        from . import inference
+        from .registry import registry
+        from .views import get_version_paths
+
+        with self._lock:
+            if version in (self.active_version, self.loading_version):
+                # Swapped back to it during the grace period
+                return
+        model_json_path, _ = get_version_paths(version)
+        for model in registry.remove_models(model_json_path):
+            inference.stop_scheduler(model)
+        if inference.use_inference_pool():
+            from . import inference_pool
+
+            inference_pool.release_pools(model_json_path)
+        logger.info("Released model version %s", version or 'legacy')
+
+    def get_status(self) -> dict:
+        """
+        Report the version of this process and any swap in progress.
+
+        Returns:
+            dict: The active, loading and pointed-to versions and the last swap error.
+        """
+        return {'active': self.active_version, 'loading': self.loading_version, 'pointer': read_pointer(),
+                'error': self.error}
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager() -> VersionManager:
+    """
+    Get the version manager configured by the EMOTION_MODEL_POLL_INTERVAL and EMOTION_MODEL_SWAP_GRACE settings.
+
+    Returns:
+        VersionManager: The manager of this process.
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = VersionManager(poll_interval=getattr(settings, 'EMOTION_MODEL_POLL_INTERVAL', 5.0),
+                                      grace_period=getattr(settings, 'EMOTION_MODEL_SWAP_GRACE', 30.0))
+        return _manager
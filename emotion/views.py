@@ -1,26 +1,61 @@
 from django.shortcuts import redirect
-from . import emotion_model
+from django.urls import reverse
+from .registry import registry
 from Image.models import Image
-from playlists.models import Playlist, Playlist_songs
-from songs.models import Song
+from Image.upload_handlers import in_memory_image_uploads
+from playlists import generated, mood_playlists, views as playlist_views
+from users import views as user_views
 from django.contrib.auth.models import User
 from pathlib import Path
-import random
-from django.db.models import QuerySet
+import asyncio
+import hashlib
+import json
+import logging
+import os
 from typing import Union
-from django.http import HttpRequest
+from django.http import HttpRequest, HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.conf import settings
+from django.core.files.base import ContentFile
+from .singleflight import SingleFlight
+from . import admission, inference, jobs, metrics, preload, result_cache, tiers, versions, warmup
 
 BASE_DIR = Path(__file__).resolve(strict=True).parent.parent
+
+logger = logging.getLogger(__name__)
+
+# Double clicks and browser retries with the same image, and identical images of
+# different users, share one detection instead of running it again. Only the
+# detection is shared: every request stores its own playlist for its own user
+image_requests = SingleFlight('image')
 # Create your views here.
 
 
-def get_model_paths() -> tuple:
+def get_active_version() -> str:
     """
-    Get the paths for the emotion recognition model JSON and weights files.
+    Get the model version this process should use, following the ACTIVE pointer of EMOTION_MODEL_ROOT.
+
+    Returns:
+        str: The version, or None for the legacy model files in the emotion app.
+    """
+    if versions.get_model_root() is None:
+        return None
+    return versions.get_manager().check()
+
+
+def get_version_paths(version: str = None) -> tuple:
+    """
+    Get the paths for the model JSON and weights files of a model version.
+
+    Args:
+        version (str, optional): The version directory in EMOTION_MODEL_ROOT; None for the legacy files.
 
     Returns:
         tuple: Paths for model JSON file and model weights file.
     """
+    if version is not None:
+        version_dir = versions.get_version_dir(version)
+        return str(version_dir / versions.MODEL_JSON_FILE), str(version_dir / versions.MODEL_WEIGHTS_FILE)
+
     try:
         # Assume BASE_DIR is defined elsewhere in the global scope or environment
         model_json_path = str(BASE_DIR) + "/emotion/model_config.json"
@@ -41,117 +76,136 @@ def get_model_paths() -> tuple:
         raise ValueError(f"An unexpected error occurred when getting model paths: {e}")
 
 
-def get_image_path(request) -> str:
+def get_model_paths() -> tuple:
     """
-    Get the path to the user's image file.
-
-    Args:
-        request: The HTTP request object.
+    Get the paths for the emotion recognition model JSON and weights files of the active version.
 
     Returns:
-        str: Path to the user's image file.
+        tuple: Paths for model JSON file and model weights file.
     """
-    try:
-        # Attempt to retrieve the user's image from the database
-        image = Image.objects.get(user=request.user)
-        image_url = image.Image_url
-
-        # Construct the full file path
-        full_path = str(BASE_DIR) + "/media/" + str(image_url)
+    return get_version_paths(get_active_version())
 
-        # Check if the path string is correctly constructed
-        if not full_path:
-            raise ValueError("Failed to construct the image file path.")
-        return full_path
 
-    except AttributeError as e:
-        raise ValueError(f"Attribute error: Missing necessary properties in the"
-                         f"request or image object. {e}")
+def get_backend_settings(version: str = None) -> dict:
+    """
+    Get the inference backend configuration from the EMOTION_BACKEND* settings.
 
-    except Exception as e:
-        # General catch-all for any other unexpected exceptions
-        raise ValueError(f"An unexpected error occurred while retrieving the image path: {e}")
+    A model version directory with its own model.tflite overrides EMOTION_TFLITE_MODEL.
 
+    Args:
+        version (str, optional): The model version; None for the active one.
 
-def get_or_create_playlist(user: User, playlist_name: str) -> Playlist:
+    Returns:
+        dict: Keyword arguments for ModelRegistry.get_model and backends.create_backend.
     """
-    Get or create a playlist with the given name for the specified user.
+    backend_name = getattr(settings, 'EMOTION_BACKEND', 'keras')
+    if backend_name == 'tflite':
+        tflite_file = getattr(settings, 'EMOTION_TFLITE_MODEL', BASE_DIR / 'emotion' / 'model.tflite')
+        version = version or get_active_version()
+        if version is not None and (versions.get_version_dir(version) / versions.TFLITE_FILE).is_file():
+            tflite_file = versions.get_version_dir(version) / versions.TFLITE_FILE
+        return {'backend_name': backend_name,
+                'tflite_file': str(tflite_file),
+                'num_threads': getattr(settings, 'EMOTION_TFLITE_THREADS', None)}
+    return {'backend_name': backend_name}
+
+
+def load_emotion_model(version: str = None):
+    """
+    Get the shared emotion model of a model version, loading it on first use.
 
     Args:
-        user (User): The user for whom the playlist is being created.
-        playlist_name (str): The name of the playlist.
+        version (str, optional): The version directory in EMOTION_MODEL_ROOT; None for the legacy files.
 
     Returns:
-        Playlist: The playlist object.
+        FacialExpressionModel: The loaded model.
     """
-    try:
-        # Check for any empty or invalid input arguments
-        if not user or not playlist_name:
-            raise ValueError("Invalid user or playlist name provided.")
-
-        admin = User.objects.get(username='admin')
-        playlist = Playlist.objects.filter(user=admin, playlist_name=playlist_name).first()
-        if playlist:
-            playlist.delete()
-        playlist = Playlist(user=admin, playlist_name=playlist_name, number_of_songs=-1)
-        playlist.save()
-        return playlist
+    model_json_path, model_weights_path = get_version_paths(version)
+    return registry.get_model(model_json_path, model_weights_path, **get_backend_settings(version))
 
-    except Exception as e:
-        # General catch-all for any other unexpected exceptions
-        raise ValueError(f"An unexpected error occurred: {e}")
 
+def get_emotion_model():
+    """
+    Get the shared emotion model of the active version.
 
-def add_songs_to_playlist(playlist: Playlist, songs: QuerySet) -> None:
+    Returns:
+        FacialExpressionModel: The loaded model.
     """
-    Add songs to the specified playlist.
+    return load_emotion_model(get_active_version())
 
-    Args:
-        playlist (Playlist): The playlist to which songs are being added.
-        songs (QuerySet): The queryset of songs to add to the playlist.
+
+def get_model_version() -> str:
     """
-    try:
+    Get an identifier of the model that is currently configured.
 
-        for song in songs:
-            relation = Playlist_songs(playlist=playlist, song=song)
-            relation.save()
+    Uses EMOTION_MODEL_VERSION when set, otherwise a digest of the backend name and
+    the size and modification time of the model files, so that replacing the files
+    changes the version.
 
-    except AttributeError as e:
-        # Handle attribute errors in case of incorrect model definitions or method calls
-        raise ValueError(f"An attribute error occurred: {e}")
+    Returns:
+        str: The model version.
+    """
+    configured = getattr(settings, 'EMOTION_MODEL_VERSION', None)
+    if configured:
+        return str(configured)
+
+    backend_settings = get_backend_settings()
+    paths = list(get_model_paths())
+    if backend_settings.get('tflite_file'):
+        paths.append(backend_settings['tflite_file'])
+
+    parts = [backend_settings['backend_name']]
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+        except OSError:
+            parts.append(f"{path}:missing")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+
+def get_candidate_song_ids(user: User, emotion: str) -> list:
+    """
+    Look up the IDs of the user's and the admin's songs for an emotion in the user's mood playlist.
 
-    except Exception as e:
-        # General catch-all for any other unexpected exceptions
-        raise ValueError(f"An unexpected error occurred while adding songs to the playlist: {e}")
+    Args:
+        user (User): The user the playlist is for.
+        emotion (str): The predicted emotion.
+
+    Returns:
+        list: Song IDs, the user's songs first, each in upload order.
+    """
+    return mood_playlists.get_song_ids(user, emotion)
 
 
-def create_playlist(request, emotion: str) -> int:
+def create_playlist(request, emotion: str) -> str:
     """
     Create a playlist based on the predicted emotion.
 
+    The playlist holds GENERATED_PLAYLIST_SIZE songs picked at random from the
+    user's mood playlist, or all of them when the setting is None. It is only kept
+    in the shared cache, see playlists.generated, so a detection writes no
+    Playlist rows. It becomes a Playlist row when the user saves it.
+
     Args:
         request: The HTTP request object.
         emotion (str): The predicted emotion.
 
     Returns:
-        int: The ID of the created playlist.
+        str: The token of the generated playlist.
     """
     try:
        
         # Generate a unique playlist name based on the user's username and the emotion
         playlist_name = f"{request.user.username}_{emotion}"
 
-        # Get or create a new playlist
-        playlist = get_or_create_playlist(request.user, playlist_name)
-
-        # Fetch songs based on the user and emotion
-        user_songs = Song.objects.filter(user=request.user, emotion=emotion)
-        admin_songs = Song.objects.filter(user__username='admin', emotion=emotion)
-
-        # Add songs to the playlist
-        add_songs_to_playlist(playlist, user_songs)
-        add_songs_to_playlist(playlist, admin_songs)  # Assuming add_random_songs_to_playlist does a similar job
-        return playlist.id
+        # Take the user's and the admin's songs for the emotion from the user's mood playlist
+        playlist_size = getattr(settings, 'GENERATED_PLAYLIST_SIZE', None)
+        if playlist_size:
+            song_ids = mood_playlists.sample_song_ids(request.user, emotion, playlist_size)
+        else:
+            song_ids = get_candidate_song_ids(request.user, emotion)
+        return generated.store(request.user.pk, playlist_name, song_ids)
     except AttributeError as e:
         # Catch errors related to attribute accesses (e.g., request.user)
         raise ValueError(f"An error occurred due to missing or invalid attribute: {e}")
@@ -160,154 +214,479 @@ def create_playlist(request, emotion: str) -> int:
         raise ValueError(f"An unexpected error occurred while creating the playlist: {e}")
 
 
-def add_random_songs_to_playlist(playlist: Playlist, admin_songs: QuerySet) -> None:
+def get_pipeline():
     """
-    Add random songs from admin's songs to the specified playlist.
+    Build the emotion pipeline configured by the EMOTION_MIN_IMAGE_SIZE, EMOTION_BLUR_THRESHOLD,
+    EMOTION_PROXY_SIZE, EMOTION_GROUP_MODE, EMOTION_MAX_FACES, EMOTION_ADMISSION_* and
+    EMOTION_MODEL_TIERS settings. Model tiers are not used with the inference pool.
+
+    Returns:
+        EmotionPipeline: The pipeline.
+    """
+    # Imported here so that TensorFlow and OpenCV are only loaded by emotion requests
+    from . import pipeline
+
+    if inference.use_inference_pool():
+        # The inference processes hold the model, this worker only detects faces
+        get_model = registry.get_detector
+        tier_policy = None
+    else:
+        get_model = get_emotion_model
+        tier_policy = tiers.get_policy()
+
+    return pipeline.EmotionPipeline(get_detector=registry.get_detector, get_model=get_model,
+                                    min_size=getattr(settings, 'EMOTION_MIN_IMAGE_SIZE', 64),
+                                    blur_threshold=getattr(settings, 'EMOTION_BLUR_THRESHOLD', 0.0),
+                                    proxy_size=getattr(settings, 'EMOTION_PROXY_SIZE', 0),
+                                    group_mode=getattr(settings, 'EMOTION_GROUP_MODE', False),
+                                    max_faces=getattr(settings, 'EMOTION_MAX_FACES', 8),
+                                    admission=admission.get_controller(),
+                                    tiers=tier_policy)
+
+
+def is_fallback(result) -> bool:
+    """
+    Check whether a result was answered by a lighter model tier than the primary one.
 
     Args:
-        playlist (Playlist): The playlist to which random songs are being added.
-        admin_songs (QuerySet): The queryset of admin's songs to select random songs from.
+        result (PipelineResult): The detection result.
+
+    Returns:
+        bool: True if a fallback tier made the prediction.
     """
-    try:
-        song_count = admin_songs.count()
-        if song_count == 0:
-            raise ValueError("No songs available to add to the playlist.")
+    policy = tiers.get_policy()
+    return policy is not None and result.model is not None and result.model != policy.primary.name
 
-        # Generate a list of indices to sample from
-        sampling = set(random.sample(list(range(song_count)), k=min(10, song_count)))
 
-        # Shuffle indices to ensure randomness
-        order = list(range(song_count))
-        random.shuffle(order)
+def run_pipeline(image_data: bytes, on_stage=None):
+    """
+    Detect the emotion in an image, reusing the cached result for identical images.
 
-        # Add selected songs to the playlist
-        for i in range(song_count):
-            if order[i] in sampling:
-                relation = Playlist_songs(playlist=playlist, song=admin_songs[order[i]])
-                relation.save()
+    Results are cached by the SHA-256 digest of the image bytes together with the
+    model version, so a model swap never serves results of the previous model.
 
-    except ValueError as e:
-        # Specific error for expected operational issues, like no songs available
-        raise ValueError(f"Error while adding songs: {e}")
+    Args:
+        image_data (bytes): The encoded image.
+        on_stage (Callable): Called with the name of each pipeline stage before it runs.
+            Not called for cached results, or when an identical image is already in flight.
+
+    Returns:
+        PipelineResult: The detection result.
+    """
+    from .pipeline import PipelineResult
+
+    model_version = get_model_version()
+    cache_key = f"{model_version}:{hashlib.sha256(image_data).hexdigest()}"
+    if getattr(settings, 'EMOTION_GROUP_MODE', False):
+        # A group result is not valid for single face mode and vice versa
+        cache_key += ':group'
+
+    cached = result_cache.lookup(cache_key)
+    if cached is not None:
+        return PipelineResult.from_dict(cached)
 
-    except IndexError as e:
-        # This can occur if the random sampling index is out of range
-        raise ValueError(f"Index error during song selection: {e}")
+    def run_uncached():
+        result = get_pipeline().run(image_data, on_stage)
+        if result.ok and not is_fallback(result) and get_model_version() == model_version:
+            # Rejections depend on the gate settings rather than the model, so only predictions are cached.
+            # Answers of a lighter tier are not, so the image gets the primary model's answer next time,
+            # and neither are answers from around a model swap, which may come from either version
+            result_cache.store(cache_key, result.to_dict())
+        return result
+
+    return image_requests.do(cache_key, run_uncached)
+
+
+def detect_emotion_from_data(request: HttpRequest, image_data: bytes, on_stage=None) -> tuple:
+    """
+    Detects emotion in an encoded image and builds the playlist for it.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        image_data (bytes): The encoded image, e.g. the bytes of an upload.
+        on_stage (Callable): Called with the name of each pipeline stage, then with 'playlist'.
+
+    Returns:
+        Tuple[PipelineResult, Optional[str]]: The detection result and the playlist token, None if no emotion was found.
+    """
+    try:
+        # Run the image through the pipeline, cheapest checks first, unless it was seen before
+        result = run_pipeline(image_data, on_stage)
+
+        # Build the playlist when an emotion was found
+        playlist_token = None
+        if result.ok:
+            logger.info("Emotion: %s (model: %s)", result.emotion, result.model or get_model_version())
+            if on_stage is not None:
+                on_stage('playlist')
+            playlist_token = create_playlist(request, result.emotion)
+        return result, playlist_token
+
+    except admission.Overloaded:
+        # Shed by admission control, the caller answers with 503 and Retry-After
+        raise
+
+    except ValueError as e:
+        # Handle expected value errors, such as undecodable images or missing data
+        raise ValueError(f"An error occurred: {e}")
 
     except Exception as e:
         # General catch-all for any other unexpected exceptions
-        raise ValueError(f"An unexpected error occurred while adding random songs to the playlist: {e}")
+        raise ValueError(f"An unexpected error occurred while detecting emotion: {e}")
+
+
+ERROR_MESSAGES = {
+    "badImage": "The image could not be read, try again with a different image.",
+    "tooSmall": "The image is too small, try again with a larger image.",
+    "blurry": "The image is too blurry, try again with a sharper image.",
+    "noFace": "No Face detected for given image, try again with a new image.",
+    "mulFace": "Multiple Faces detected for given image, try again with a new image.",
+    "exception": "An Unknown Error Occurred, Please Try Again.",
+}
+
+
+def wants_json(request: HttpRequest) -> bool:
+    """
+    Check whether the client asked for JSON, with ?format=json or an Accept header.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        bool: True for a JSON response, False for HTML.
+    """
+    if request.GET.get('format') == 'json':
+        return True
+    return 'application/json' in request.headers.get('Accept', '')
+
+
+def error_response(request: HttpRequest, message: str, status: int, code: str = 'exception') -> HttpResponse:
+    """
+    Respond with an error, as JSON or as the rendered error page.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        message (str): The message shown to the user.
+        status (int): The HTTP status code.
+        code (str): A short machine readable error, e.g. a pipeline status.
+
+    Returns:
+        HttpResponse: The error response.
+    """
+    if wants_json(request):
+        return JsonResponse({'status': code, 'error': message}, status=status)
+    response = user_views.show_error(request, message)
+    response.status_code = status
+    return response
 
 
-def detect_emotion(request: HttpRequest):
+def overloaded_response(request: HttpRequest, error) -> HttpResponse:
     """
-    Detects emotion from the user's image and processes the result.
+    Respond to a request shed by admission control with 503 and Retry-After.
 
     Args:
         request (HttpRequest): The HTTP request object.
+        error (Overloaded): The exception raised by admission control.
 
     Returns:
-        Tuple[str, Any]: A tuple containing the redirect destination and any additional arguments.
+        HttpResponse: The error response.
+    """
+    response = error_response(request, str(error), 503, 'busy')
+    response['Retry-After'] = str(error.retry_after)
+    return response
+
+
+def summarize_result(result, playlist_token) -> dict:
+    """
+    Summarize a detection for JSON clients.
+
+    Args:
+        result (PipelineResult): The outcome of the emotion pipeline.
+        playlist_token (Optional[str]): The token of the playlist generated for the detected emotion.
+
+    Returns:
+        dict: The status with the emotion and playlist, or the error message on rejection.
+    """
+    if not result.ok:
+        return {'status': result.status, 'error': ERROR_MESSAGES.get(result.status, "Some error")}
+    return {'status': result.status,
+            'emotion': result.emotion,
+            'model': result.model,
+            'playlist_token': playlist_token,
+            'playlist_url': reverse('displayGeneratedPlaylist', args=[playlist_token])}
+
+
+def playlist_response(request: HttpRequest, result, playlist_token) -> HttpResponse:
+    """
+    Respond with the playlist built for a detection, without redirecting to it.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        result (PipelineResult): The outcome of the emotion pipeline.
+        playlist_token (Optional[str]): The token of the playlist generated for the detected emotion.
+
+    Returns:
+        HttpResponse: The rendered playlist or a JSON summary, the error page or a JSON error on rejection.
+    """
+    if not result.ok:
+        return error_response(request, ERROR_MESSAGES.get(result.status, "Some error"), 422, result.status)
+
+    if wants_json(request):
+        return JsonResponse(summarize_result(result, playlist_token))
+    return playlist_views.display_playlist(request, token=playlist_token)
+
+
+def read_image_upload(request: HttpRequest) -> bytes:
+    """
+    Read the image of a request, either the `emo-image` file of a multipart form
+    or a raw image body such as a camera capture posted as image/jpeg.
+
+    The image is also saved to media/images/ when EMOTION_AUDIT_UPLOADS is set.
+
+    Args:
+        request (HttpRequest): The HTTP request object, with upload handlers already set.
+
+    Returns:
+        bytes: The encoded image, or None if there is none or it is above EMOTION_MAX_UPLOAD_SIZE.
+    """
+    if request.content_type.startswith('image/'):
+        # Read the stream directly, request.body would apply DATA_UPLOAD_MAX_MEMORY_SIZE instead
+        max_size = getattr(settings, 'EMOTION_MAX_UPLOAD_SIZE', 20 * 1024 * 1024)
+        image_data = request.read(max_size + 1)
+        if not image_data or len(image_data) > max_size:
+            return None
+        name = 'capture.' + request.content_type.split('/', 1)[1]
+    else:
+        image = request.FILES.get('emo-image')
+        if image is None:
+            return None
+        image_data = image.read()
+        name = image.name
+
+    if getattr(settings, 'EMOTION_AUDIT_UPLOADS', False):
+        Image(user=request.user, Image_url=ContentFile(image_data, name=name)).save()
+    return image_data
+
+
+def handle_image_upload(request: HttpRequest) -> HttpResponse:
+    """
+    Detect the emotion in the uploaded image and respond with its playlist.
+
+    The upload is decoded from memory. A duplicate of an image that is already
+    being detected, e.g. from a double click, waits for that detection instead of
+    running its own, and then gets its own playlist.
+
+    Args:
+        request (HttpRequest): The HTTP request object, with upload handlers already set.
+
+    Returns:
+        HttpResponse: The playlist, or an error response.
     """
     try:
-        # Retrieve the model paths and image path
-        model_json_path, model_weights_path = get_model_paths()
-        img_path = get_image_path(request)
+        image_data = read_image_upload(request)
+        if image_data is None:
+            return error_response(request, "No image was uploaded. Please try again.", 400, 'noImage')
 
-        # Initialize the facial expression model
-        face_expression = emotion_model.FacialExpressionModel(model_json_path, model_weights_path, img_path)
+        result, playlist_token = detect_emotion_from_data(request, image_data)
+        return playlist_response(request, result, playlist_token)
 
-        # Retrieve and delete the image from the database
-        image = Image.objects.get(user=request.user)
-        image.delete()
+    except admission.Overloaded as e:
+        return overloaded_response(request, e)
 
-        # Preprocess the image and detect emotion
-        return_val, processed_img = face_expression.preprocess_img()
-        print(return_val, processed_img)
+    except Exception:
+        logger.exception("Error processing emotion detection")
+        return error_response(request, "An error occurred while processing your request.", 500)
 
-        # Process the return value to decide the next steps
-        return process_return_val(request, return_val, processed_img, face_expression)
 
-    except ValueError as e:
-        # Handle expected value errors, such as invalid paths or missing data
-        raise ValueError(f"An error occurred: {e}")
+@in_memory_image_uploads
+def detect_playlist(request: HttpRequest) -> HttpResponse:
+    """
+    Accept an image, detect its emotion and respond with the playlist in one request.
 
-    except Exception as e:
-        # General catch-all for any other unexpected exceptions
-        raise ValueError(f"An unexpected error occurred while detecting emotion: {e}")
+    The image is either the `emo-image` file of a multipart form or a raw image body.
+
+    Responds with the rendered playlist, or with JSON holding the emotion and the
+    playlist URL when the client asks for JSON.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        HttpResponse: The playlist, or an error response.
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(['POST'])
+    return handle_image_upload(request)
+
+
+def run_detection_job(job, request: HttpRequest, image_data: bytes) -> dict:
+    """
+    Detect the emotion and build the playlist for a background job, reporting each step.
 
+    Args:
+        job (Job): The job, moved through its states by the pipeline stages.
+        request (HttpRequest): The request that submitted the job, with its user already loaded.
+        image_data (bytes): The encoded image.
 
-def process_return_val(request, return_val, processed_img, face_expression):
+    Returns:
+        dict: The summary of the detection, see summarize_result.
     """
-    Processes the return value from emotion detection.
+    try:
+        result, playlist_token = detect_emotion_from_data(request, image_data, job.set_stage)
+    except admission.Overloaded as e:
+        return {'status': 'busy', 'error': str(e), 'retry_after': e.retry_after}
+    return summarize_result(result, playlist_token)
+
+
+@in_memory_image_uploads
+def submit_job(request: HttpRequest) -> HttpResponse:
+    """
+    Accept an image and detect its emotion in the background.
+
+    Responds right away with 202 and the job ID, and the URLs to poll the job
+    or to follow it as server-sent events.
+
     Args:
         request (HttpRequest): The HTTP request object.
-        return_val (str): The return value indicating the result of emotion detection.
-        processed_img (Any): The processed image data.
-        face_expression (FacialExpressionModel): The facial expression model instance.
+
     Returns:
-        Tuple[str, Any]: A tuple containing the redirect destination and any additional arguments.
+        JsonResponse: The queued job, or 503 with Retry-After when too many jobs are waiting.
     """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(['POST'])
+
+    image_data = read_image_upload(request)
+    if image_data is None:
+        return JsonResponse({'status': 'noImage', 'error': "No image was uploaded. Please try again."}, status=400)
+
     try:
+        # The job thread has no request cycle of its own, so load the user now
+        job = jobs.get_job_manager().submit(request.user.pk, run_detection_job, request, image_data)
+    except jobs.JobQueueFull as e:
+        response = JsonResponse({'status': 'busy', 'error': str(e)}, status=503)
+        response['Retry-After'] = '5'
+        return response
 
-        print(return_val)
-        # Default error handling setup
-        to, args = 'error-page', "Some error"
-
-        # Process based on the type of detection result
-        if return_val == "noFace":
-            to, args = "error-page", "No Face detected for given image, try again with a new image."
-        elif return_val == "mulFace":
-            to, args = "error-page", "Multiple Faces detected for given image, try again with a new image."
-        elif return_val == "exception":
-            to, args = "error-page", "An Unknown Error Occurred, Please Try Again."
-
-        # Check if emotion detection was successful and take action
-        emotion = ""
-        if return_val:
-            success = face_expression.predict_emotion(processed_img)
-            if success:
-                emotion = face_expression.get_emotions()
-                print(f'Emotion: {emotion}')
-                playlist_id = create_playlist(request, emotion)
-                to, args = 'displayPlaylist', playlist_id
-
-        return to, args
+    response = JsonResponse(dict(job.to_dict(),
+                                 status_url=reverse('emotion-job', args=[job.id]),
+                                 events_url=reverse('emotion-job-events', args=[job.id])), status=202)
+    response['Location'] = reverse('emotion-job', args=[job.id])
+    return response
 
-    except AttributeError as e:
-        # Handles issues related to attribute accesses
-        raise ValueError(f"Attribute error occurred: {e}")
 
-    except Exception as e:
-        # General catch-all for any other unexpected exceptions
-        raise ValueError(f"An unexpected error occurred during the processing of the return value: {e}")
+def get_job(request: HttpRequest, job_id: str) -> JsonResponse:
+    """
+    Report the state of an emotion job, for clients that poll.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        job_id (str): The job ID returned by submit_job.
+
+    Returns:
+        JsonResponse: The job state and, once done, its result. 404 for unknown or expired jobs.
+    """
+    job = jobs.get_job_manager().get(job_id, request.user.pk)
+    if job is None:
+        return JsonResponse({'error': "Unknown job."}, status=404)
+    return JsonResponse(job.to_dict())
+
+
+async def stream_job_events(request: HttpRequest, job_id: str) -> HttpResponse:
+    """
+    Stream the states of an emotion job as server-sent events until it finishes.
+
+    Every state change is sent as a `state` event holding the job as JSON. Waiting
+    does not hold a thread when served through music/asgi.py; under WSGI the
+    events are only delivered once the job has finished.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        job_id (str): The job ID returned by submit_job.
+
+    Returns:
+        StreamingHttpResponse: The text/event-stream response, or 404 for unknown or expired jobs.
+    """
+    user = await request.auser()
+    job = jobs.get_job_manager().get(job_id, user.pk)
+    if job is None:
+        return JsonResponse({'error': "Unknown job."}, status=404)
+
+    async def events():
+        version = None
+        idle = 0.0
+        while True:
+            if job.version != version:
+                version = job.version
+                idle = 0.0
+                yield f"event: state\ndata: {json.dumps(job.to_dict())}\n\n"
+                if job.finished:
+                    return
+            elif idle >= 15:
+                # Comment lines keep proxies from closing a quiet stream
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(0.1)
+            idle += 0.1
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 def get_playlist_from_emotion(request) -> Union[redirect]:
     """
-    Predict emotion from the user's image and create a playlist accordingly.
+    Redirect to the image upload page.
+
+    Kept for old links and bookmarks of the redirect based flow. Uploads are no
+    longer saved as Image rows, so there is no saved image to detect from here;
+    the upload page posts to detect_playlist instead.
 
     Args:
         request: The HTTP request object.
 
     Returns:
-        Union[redirect]: Redirects to the error page if an error occurs, otherwise redirects to the display playlist page.
+        Union[redirect]: Redirects to the image upload page.
     """
-    try:
-        # Call the emotion detection function which also processes the result
-        to, args = detect_emotion(request)
+    return redirect('image')
 
-        print(to, args)
 
-        # Redirect based on the outcome of the emotion detection and processing
-        return redirect(to, args)
+def get_readiness(request: HttpRequest) -> JsonResponse:
+    """
+    Report whether this worker has a warm emotion model, and which model version it serves.
 
-    except ValueError as e:
-        # Handle specific errors potentially thrown by the detect_emotion function
-        print(f"Error processing emotion detection: {e}")
-        return redirect('error-page', message="An error occurred while processing your request.")
+    Load balancers should only route emotion traffic to workers that answer 200.
 
-    except Exception as e:
-        # General catch-all for any other unexpected exceptions
-        print(f"Unhandled error: {e}")
-        return redirect('error-page', message="An unexpected error occurred.")
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        JsonResponse: The warm-up status, with status 503 until warm-up has finished.
+    """
+    if preload.is_enabled():
+        # A server that preloaded the model but did not fork, e.g. runserver, warms up here
+        preload.ensure_warm_up()
+
+    status = warmup.get_status()
+    if not getattr(settings, 'EMOTION_WARMUP', False):
+        # Without warm-up the model is loaded by the first request, so there is nothing to wait for
+        status['ready'] = True
+    if versions.get_model_root() is not None:
+        # The model version of this worker, and any swap it is still loading
+        status['model'] = versions.get_manager().get_status()
+    if preload.is_enabled():
+        status['preload'] = preload.get_status()
+    return JsonResponse(status, status=200 if status['ready'] else 503)
+
+
+def get_metrics(request: HttpRequest) -> JsonResponse:
+    """
+    Report the emotion pipeline counters and histograms of this worker.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+
+    Returns:
+        JsonResponse: The current metrics snapshot.
+    """
+    return JsonResponse(metrics.snapshot())
@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_ready = threading.Event()
+_started = threading.Event()
+_lock = threading.Lock()
+_error = None
+_attempts = 0
+
+
+def warm_up() -> bool:
+    """
+    Load the shared emotion model, and the model of every tier if EMOTION_MODEL_TIERS
+    is set, and run one dummy inference on each.
+
+    The first predict call builds the TensorFlow graph, which is much slower than
+    later calls, so it is done here instead of on the first user's request. With
+    EMOTION_INFERENCE_POOL the inference processes hold the model, so they are
+    started and sent the dummy ROI instead, and this worker only loads the face detector.
+
+    Returns:
+        bool: True if the warm-up finished, False if it failed.
+    """
+    global _error, _attempts
+    _attempts += 1
+    try:
+        # Imported here to keep NumPy and OpenCV out of the startup path, and
+        # because emotion.views imports the models of other apps
+        import numpy as np
+        from . import inference
+        from .emotion_model import FacialExpressionModel
+        from .registry import registry
+        from .tiers import get_policy
+        from .views import get_emotion_model
+
+        size = FacialExpressionModel.IMG_SIZE
+        roi = np.zeros((size, size, 3), dtype=np.float32)
+        if inference.use_inference_pool():
+            registry.get_detector()
+            inference.get_inference_pool().predict(roi)
+        else:
+            models = [get_emotion_model()]
+            policy = get_policy()
+            if policy is not None:
+                models.extend(tier.get_model() for tier in policy.tiers)
+            for model in models:
+                model.get_prediction(roi)
+        _error = None
+        _ready.set()
+        logger.info("Emotion model warm-up finished")
+        return True
+
+    except Exception as e:
+        _error = str(e)
+        logger.exception("Emotion model warm-up failed")
+        return False
+
+
+def _warm_up_until_ready() -> None:
+    """
+    Run the warm-up until it succeeds, waiting EMOTION_WARMUP_RETRY_DELAY seconds after
+    the first failure and twice as long after each further one, up to EMOTION_WARMUP_RETRY_MAX_DELAY.
+
+    A failure such as a model file that is still being deployed then only keeps the
+    worker out of rotation until the model can be loaded, not until it is restarted.
+    """
+    delay = getattr(settings, 'EMOTION_WARMUP_RETRY_DELAY', 5.0)
+    max_delay = getattr(settings, 'EMOTION_WARMUP_RETRY_MAX_DELAY', 300.0)
+    while not warm_up():
+        logger.warning("Retrying the emotion model warm-up in %.0f s", delay)
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+def start_warm_up() -> threading.Thread:
+    """
+    Run the warm-up in a background thread, once per process, retrying it until it succeeds.
+
+    Returns:
+        threading.Thread: The warm-up thread, or None if it was already started.
+    """
+    with _lock:
+        if _started.is_set():
+            return None
+        _started.set()
+
+    thread = threading.Thread(target=_warm_up_until_ready, name="emotion-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready() -> bool:
+    """
+    Check whether the warm-up has finished successfully.
+
+    Returns:
+        bool: True if the model is loaded and warm.
+    """
+    return _ready.is_set()
+
+
+def get_status() -> dict:
+    """
+    Describe the current warm-up state.
+
+    Returns:
+        dict: The readiness flag, whether warm-up has started, how many attempts it took so far
+            and the error of the last failed one, if any.
+    """
+    return {'ready': is_ready(), 'started': _started.is_set(), 'attempts': _attempts, 'error': _error}
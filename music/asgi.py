@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
+
+Serve the project through this module (e.g. ``uvicorn music.asgi:application``)
+for the emotion job event streams, which wait without holding a thread here.
 """
 
 import os
@@ -91,6 +91,18 @@ DATABASES = {
     }
 }
 
+# 'default' is local to each process. 'shared' is seen by every worker and is used where processes have to agree,
+# e.g. GENERATED_PLAYLIST_CACHE; create its table with `manage.py createcachetable`, or point it at Redis or Memcached
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    },
+}
+
 AUTHENTICATION_BACKENDS = (
         
         # 'social_core.backends.twitter.TwitterOAuth',
@@ -153,6 +165,12 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': False,
         },
+        # Detections, rejected images and model loading; set to DEBUG to see e.g. the blur score of each upload
+        'emotion': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     }
 }
 
@@ -193,3 +211,99 @@ SOCIAL_AUTH_FACEBOOK_KEY = '349675816401216'  # App ID
 SOCIAL_AUTH_FACEBOOK_SECRET = '92bd7ef70dccabf946e6d0d0b9a757f0'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Emotion model
+
+# Load the emotion model and run a dummy inference when the app starts
+EMOTION_WARMUP = True
+# A failed warm-up is retried after EMOTION_WARMUP_RETRY_DELAY seconds, doubling up to the max delay
+EMOTION_WARMUP_RETRY_DELAY = 5.0
+EMOTION_WARMUP_RETRY_MAX_DELAY = 300.0
+
+# Batch the predictions of concurrent requests into one model call
+EMOTION_BATCHING = True
+EMOTION_BATCH_MAX_SIZE = 8
+EMOTION_BATCH_MAX_WAIT_MS = 10
+
+# Run inference in a pool of local processes instead of inside each web worker
+EMOTION_INFERENCE_POOL = False
+EMOTION_INFERENCE_POOL_SIZE = 2
+EMOTION_INFERENCE_POOL_INTRA_OP_THREADS = 1
+EMOTION_INFERENCE_POOL_INTER_OP_THREADS = 1
+# Seconds a request waits for a free slot and for its prediction before failing
+EMOTION_INFERENCE_POOL_TIMEOUT = 30.0
+
+# Inference runtime: 'keras', or 'tflite' for a model converted with `manage.py convert_tflite`
+EMOTION_BACKEND = 'keras'
+EMOTION_TFLITE_MODEL = BASE_DIR / 'emotion' / 'model.tflite'
+EMOTION_TFLITE_THREADS = None
+
+# Cheap checks that reject unusable images before face detection and the CNN
+EMOTION_MIN_IMAGE_SIZE = 64
+# Minimum variance of the Laplacian of the grayscale image; 0 disables the blur check. The score is measured on
+# the image reduced to EMOTION_PROXY_SIZE, so retune it when that changes: set the 'emotion' logger in LOGGING to
+# DEBUG to see the score of each upload, and pick a value below the scores of sharp images that should be accepted
+EMOTION_BLUR_THRESHOLD = 0
+
+# Decode uploads at reduced resolution (long side in pixels) for the checks and face detection; 0 disables
+EMOTION_PROXY_SIZE = 640
+
+# Cache detection results by image digest and model version: 'memory', a CACHES alias, or None
+EMOTION_RESULT_CACHE = 'memory'
+EMOTION_RESULT_CACHE_SIZE = 256
+EMOTION_RESULT_CACHE_TTL = 60 * 60
+
+# Score every face of a group photo in one batch instead of rejecting it, up to EMOTION_MAX_FACES faces
+EMOTION_GROUP_MODE = False
+EMOTION_MAX_FACES = 8
+
+# Uploads are decoded from memory; set to also save them to media/images/ for auditing
+EMOTION_AUDIT_UPLOADS = False
+EMOTION_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+
+# Camera snapshots are scaled down to this long side and encoded as JPEG at this quality (0 to 1) before upload
+EMOTION_CAPTURE_MAX_DIMENSION = 640
+EMOTION_CAPTURE_JPEG_QUALITY = 0.85
+
+# Background emotion jobs: threads per process, jobs waiting for a thread, and seconds finished jobs are kept
+EMOTION_JOB_WORKERS = 2
+EMOTION_JOB_QUEUE_SIZE = 32
+EMOTION_JOB_TTL = 10 * 60
+
+# Admission control: predictions that run at once per process, requests that wait for one, and seconds they wait
+# before being shed with 503 and Retry-After. Set EMOTION_ADMISSION_MAX_CONCURRENT to None to disable it.
+# Only admitted predictions reach the batch scheduler, so a batch never holds more than
+# EMOTION_ADMISSION_MAX_CONCURRENT faces; keep it at least EMOTION_BATCH_MAX_SIZE or batches stay small
+EMOTION_ADMISSION_MAX_CONCURRENT = EMOTION_BATCH_MAX_SIZE
+EMOTION_ADMISSION_QUEUE_SIZE = 8
+EMOTION_ADMISSION_TIMEOUT = 5.0
+EMOTION_ADMISSION_RETRY_AFTER = 5
+
+# Ranked emotion models, most accurate first; a tier is skipped once the admission queue reaches its
+# max_queue_depth or its recent p95 latency exceeds latency_slo_ms. None always uses the configured model, e.g.
+# EMOTION_MODEL_TIERS = [
+#     {'name': 'vgg16', 'max_queue_depth': 4, 'latency_slo_ms': 1000},
+#     {'name': 'vgg16-int8', 'backend_name': 'tflite', 'tflite_file': BASE_DIR / 'emotion' / 'model.tflite'},
+# ]
+EMOTION_MODEL_TIERS = None
+
+# Versioned models live in EMOTION_MODEL_ROOT/<version>/ and the ACTIVE file there names the one to serve, see
+# manage.py swap_model. Workers read ACTIVE every EMOTION_MODEL_POLL_INTERVAL seconds, load and warm a new version
+# in the background, and drop the old one EMOTION_MODEL_SWAP_GRACE seconds after switching. Without an ACTIVE file
+# the model files in the emotion app are used
+EMOTION_MODEL_ROOT = BASE_DIR / 'emotion' / 'models'
+EMOTION_MODEL_POLL_INTERVAL = 5.0
+EMOTION_MODEL_SWAP_GRACE = 30.0
+
+# Load the emotion model in music/wsgi.py before a pre-forking server (gunicorn --preload) forks its workers, so
+# they share the weights copy-on-write; check with manage.py memory_report <master pid>
+EMOTION_PRELOAD = False
+
+# Playlists generated by emotion detection are kept in this cache for GENERATED_PLAYLIST_TTL seconds and only
+# written to Playlist rows when saved, see playlists/generated.py. Any worker may serve the next request, so the
+# cache has to be shared between processes
+GENERATED_PLAYLIST_CACHE = 'shared'
+GENERATED_PLAYLIST_TTL = 60 * 60
+# Songs picked at random from the user's mood playlist for a generated playlist; None takes all of them, the
+# user's songs first
+GENERATED_PLAYLIST_SIZE = 50
@@ -22,6 +22,12 @@ from django.conf.urls.static import static
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('emotion/', emotion_views.get_playlist_from_emotion, name="emotion"),
+    path('emotion/detect/', emotion_views.detect_playlist, name="emotion-detect"),
+    path('emotion/jobs/', emotion_views.submit_job, name="emotion-jobs"),
+    path('emotion/jobs/<str:job_id>/', emotion_views.get_job, name="emotion-job"),
+    path('emotion/jobs/<str:job_id>/events/', emotion_views.stream_job_events, name="emotion-job-events"),
+    path('emotion/ready/', emotion_views.get_readiness, name="emotion-ready"),
+    path('emotion/metrics/', emotion_views.get_metrics, name="emotion-metrics"),
     path('', include('users.urls')),
 ]
 
@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'music.settings')
 
 application = get_wsgi_application()
+
+# With EMOTION_PRELOAD the emotion model is loaded here, before a pre-forking server
+# such as gunicorn --preload forks its workers, so they share its memory
+from emotion import preload  # noqa: E402
+
+if preload.is_enabled():
+    preload.preload()
@@ -0,0 +1,64 @@
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+
+KEY_PREFIX = 'generated-playlist:'
+
+
+def get_cache():
+    """
+    Get the cache holding generated playlists, named by the GENERATED_PLAYLIST_CACHE setting.
+
+    Any worker may serve the next request of the user, so the cache has to be
+    shared between processes, e.g. the database cache, Redis or Memcached.
+    """
+    return caches[getattr(settings, 'GENERATED_PLAYLIST_CACHE', 'shared')]
+
+
+def get_key(user_id: int, token: str) -> str:
+    # The user ID is part of the key, so a token only opens the playlist for the user it was generated for
+    return f"{KEY_PREFIX}{user_id}:{token}"
+
+
+def store(user_id: int, playlist_name: str, song_ids: list) -> str:
+    """
+    Keep a generated playlist in the cache for GENERATED_PLAYLIST_TTL seconds, without a Playlist row.
+
+    Args:
+        user_id (int): The user the playlist was generated for; only they can open it.
+        playlist_name (str): The name shown, and used if the playlist is saved.
+        song_ids (list): The song IDs in playlist order.
+
+    Returns:
+        str: The token identifying the playlist in URLs.
+    """
+    token = secrets.token_urlsafe(12)
+    get_cache().set(get_key(user_id, token), {'playlist_name': playlist_name, 'song_ids': list(song_ids)},
+                    getattr(settings, 'GENERATED_PLAYLIST_TTL', 60 * 60))
+    return token
+
+
+def load(user_id: int, token: str) -> dict:
+    """
+    Get a generated playlist.
+
+    Args:
+        user_id (int): The user asking.
+        token (str): The token returned by store.
+
+    Returns:
+        dict: The 'playlist_name' and 'song_ids' of the playlist, or None if it expired or belongs to someone else.
+    """
+    return get_cache().get(get_key(user_id, token))
+
+
+def discard(user_id: int, token: str) -> None:
+    """
+    Drop a generated playlist, e.g. once it has been saved.
+
+    Args:
+        user_id (int): The user the playlist was generated for.
+        token (str): The token returned by store.
+    """
+    get_cache().delete(get_key(user_id, token))
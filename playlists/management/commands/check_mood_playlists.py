@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from playlists import mood_playlists
+from playlists.models import Mood_playlist
+
+
+class Command(BaseCommand):
+    help = ("Compare every mood playlist with a full recompute from the songs and report the differences. "
+            "Fails if any playlist differs, unless --fix rebuilds those playlists.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only check the mood playlists of this username.")
+        parser.add_argument('--fix', action='store_true', help="Rebuild the mood playlists that differ.")
+
+    def handle(self, *args, **options):
+        playlists = Mood_playlist.objects.select_related('user').order_by('user_id', 'emotion')
+        if options['user']:
+            playlists = playlists.filter(user__username=options['user'])
+
+        checked = differing = 0
+        for mood_playlist in playlists.iterator():
+            checked += 1
+            missing, extra = mood_playlists.diff(mood_playlist)
+            if not missing and not extra:
+                continue
+            differing += 1
+            self.stdout.write(f"{mood_playlist}: {len(missing)} missing {sorted(missing)[:10]}, "
+                              f"{len(extra)} extra {sorted(extra)[:10]}")
+            if options['fix']:
+                mood_playlists.rebuild(mood_playlist)
+
+        self.stdout.write(f"Checked {checked} mood playlists, {differing} differ from a full recompute.")
+        if differing and not options['fix']:
+            raise CommandError("Mood playlists are out of date; run with --fix to rebuild them.")
+        if differing:
+            self.stdout.write(f"Rebuilt {differing} mood playlists.")
@@ -0,0 +1,81 @@
+# Generated by Django 5.0.4 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("songs", "0005_alter_song_id"),
+        ("playlists", "0004_alter_playlist_id_alter_playlist_songs_id"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Mood_playlist",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "emotion",
+                    models.CharField(
+                        choices=[("sad", "sad"), ("happy", "happy"), ("normal", "normal")],
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        default=None,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("user", "emotion")},
+            },
+        ),
+        migrations.CreateModel(
+            name="Mood_playlist_songs",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "mood_playlist",
+                    models.ForeignKey(
+                        default=None,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="playlists.mood_playlist",
+                    ),
+                ),
+                (
+                    "song",
+                    models.ForeignKey(
+                        default=None,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="songs.song",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("mood_playlist", "song")},
+            },
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from songs.models import Song
 
 
@@ -35,3 +37,58 @@ class Playlist_songs(models.Model):
 	"""
 	playlist = models.ForeignKey(Playlist, default=None, on_delete=models.CASCADE)
 	song = models.ForeignKey(Song, default=None, on_delete=models.CASCADE)
+
+
+class Mood_playlist(models.Model):
+	"""
+	Model representing the materialized playlist of a user for an emotion.
+
+	It holds the user's and the admin's songs for the emotion, see playlists/mood_playlists.py.
+	It is built on first use and then kept current as songs are added, deleted or re-tagged.
+
+	Attributes:
+		user (ForeignKey): The user the playlist is for.
+		emotion (CharField): The emotion of the songs in the playlist.
+	"""
+	user = models.ForeignKey(User, default=None, on_delete=models.CASCADE)
+	emotion = models.CharField(max_length=50, choices=Song.mood_options)
+
+	class Meta:
+		unique_together = [('user', 'emotion')]
+
+	def __str__(self):
+		return f'{self.user.username}_{self.emotion}'
+
+
+class Mood_playlist_songs(models.Model):
+	"""
+	Model representing the songs in a mood playlist.
+
+	Deleting a song removes it from every mood playlist through the cascade.
+
+	Attributes:
+		mood_playlist (ForeignKey): The mood playlist to which the song belongs.
+		song (ForeignKey): The song included in the mood playlist.
+	"""
+	mood_playlist = models.ForeignKey(Mood_playlist, default=None, on_delete=models.CASCADE)
+	song = models.ForeignKey(Song, default=None, on_delete=models.CASCADE)
+
+	class Meta:
+		unique_together = [('mood_playlist', 'song')]
+
+
+@receiver(post_save, sender=Song)
+def update_mood_playlists(sender, instance, **kwargs):
+	"""
+	Signal handler function to move a created or changed song into the mood playlists it belongs to.
+
+	Runs in the transaction of the save, so the mood playlists change together with the song.
+
+	Args:
+		sender: The model class that sent the signal.
+		instance: The song that was saved.
+		**kwargs: Additional keyword arguments.
+	"""
+	from playlists import mood_playlists
+
+	mood_playlists.song_saved(instance)
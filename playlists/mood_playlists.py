@@ -0,0 +1,183 @@
+import logging
+import random
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from playlists.models import Mood_playlist, Mood_playlist_songs
+from songs.models import Song
+
+logger = logging.getLogger(__name__)
+
+
+def get_admin_id() -> int:
+    """
+    Get the ID of the admin, whose songs every mood playlist includes.
+
+    Looked up every time rather than kept, so a recreated admin account is picked up.
+
+    Returns:
+        int: The user ID, or None if there is no admin yet.
+    """
+    return User.objects.filter(username='admin').values_list('id', flat=True).first()
+
+
+def compute_song_ids(user_id: int, emotion: str) -> list:
+    """
+    Compute the songs of a mood playlist from scratch.
+
+    Args:
+        user_id (int): The ID of the user the playlist is for.
+        emotion (str): The emotion of the songs.
+
+    Returns:
+        list: Song IDs, the user's songs first, each in upload order.
+    """
+    song_ids = []
+    for owner_id in dict.fromkeys([user_id, get_admin_id()]):
+        if owner_id is not None:
+            song_ids.extend(Song.objects.filter(user_id=owner_id, emotion=emotion).order_by('id')
+                            .values_list('id', flat=True))
+    return song_ids
+
+
+def get_mood_playlist(user: User, emotion: str) -> Mood_playlist:
+    """
+    Get the mood playlist of a user for an emotion, building it on first use.
+
+    Args:
+        user (User): The user the playlist is for.
+        emotion (str): The emotion of the songs.
+
+    Returns:
+        Mood_playlist: The mood playlist.
+    """
+    mood_playlist = Mood_playlist.objects.filter(user=user, emotion=emotion).first()
+    if mood_playlist is not None:
+        return mood_playlist
+
+    with transaction.atomic():
+        mood_playlist, created = Mood_playlist.objects.get_or_create(user=user, emotion=emotion)
+        if created:
+            # Later song changes find this row and update it, see song_saved
+            Mood_playlist_songs.objects.bulk_create([Mood_playlist_songs(mood_playlist=mood_playlist, song_id=song_id)
+                                                     for song_id in compute_song_ids(user.pk, emotion)],
+                                                    batch_size=500)
+            logger.info("Built mood playlist %s", mood_playlist)
+    return mood_playlist
+
+
+def get_song_ids(user: User, emotion: str) -> list:
+    """
+    Look up the songs of the mood playlist of a user for an emotion.
+
+    Args:
+        user (User): The user the playlist is for.
+        emotion (str): The emotion of the songs.
+
+    Returns:
+        list: Song IDs, the user's songs first, each in upload order.
+    """
+    mood_playlist = get_mood_playlist(user, emotion)
+    rows = (Mood_playlist_songs.objects.filter(mood_playlist=mood_playlist).order_by('song_id')
+            .values_list('song_id', 'song__user_id'))
+    own, others = [], []
+    for song_id, owner_id in rows:
+        (own if owner_id == user.pk else others).append(song_id)
+    return own + others
+
+
+def sample_ids(song_ids: list, k: int, seed=None) -> list:
+    """
+    Pick k random song IDs from a list.
+
+    random.sample picks positions without copying or shuffling a long list, so a
+    pick takes O(k) time and memory whatever the catalog size. The same seed over
+    the same list gives the same songs in the same order, and k at least the
+    length of the list gives a reproducible shuffle.
+
+    Args:
+        song_ids (list): The song IDs to pick from.
+        k (int): How many songs to pick.
+        seed: Seed for a reproducible pick, None for a random one.
+
+    Returns:
+        list: Up to k distinct song IDs, in random order.
+    """
+    return random.Random(seed).sample(song_ids, min(k, len(song_ids)))
+
+
+def sample_song_ids(user: User, emotion: str, k: int, seed=None) -> list:
+    """
+    Pick k random songs of the mood playlist of a user for an emotion.
+
+    Reads the song IDs of the mood playlist in one query, ordered so that a seed
+    picks the same songs while the playlist is unchanged.
+
+    Args:
+        user (User): The user the playlist is for.
+        emotion (str): The emotion of the songs.
+        k (int): How many songs to pick.
+        seed: Seed for a reproducible pick, None for a random one.
+
+    Returns:
+        list: Up to k distinct song IDs, in random order.
+    """
+    mood_playlist = get_mood_playlist(user, emotion)
+    song_ids = list(Mood_playlist_songs.objects.filter(mood_playlist=mood_playlist).order_by('song_id')
+                    .values_list('song_id', flat=True))
+    return sample_ids(song_ids, k, seed)
+
+
+def song_saved(song: Song) -> None:
+    """
+    Update the mood playlists affected by a created or changed song.
+
+    A song of the admin belongs in every mood playlist of its emotion, any other
+    song only in its owner's. It is removed from the mood playlists it no longer
+    belongs to, e.g. after its emotion changed, and added to the missing ones.
+    Mood playlists not built yet are left alone, they are computed in full on first use.
+
+    Args:
+        song (Song): The song that was saved.
+    """
+    mood_playlists = Mood_playlist.objects.filter(emotion=song.emotion)
+    if song.user_id != get_admin_id():
+        mood_playlists = mood_playlists.filter(user_id=song.user_id)
+    mood_playlist_ids = list(mood_playlists.values_list('id', flat=True))
+
+    Mood_playlist_songs.objects.filter(song=song).exclude(mood_playlist_id__in=mood_playlist_ids).delete()
+    Mood_playlist_songs.objects.bulk_create([Mood_playlist_songs(mood_playlist_id=mood_playlist_id, song=song)
+                                             for mood_playlist_id in mood_playlist_ids],
+                                            batch_size=500, ignore_conflicts=True)
+
+
+def diff(mood_playlist: Mood_playlist) -> tuple:
+    """
+    Compare a mood playlist with a full recompute.
+
+    Args:
+        mood_playlist (Mood_playlist): The mood playlist to check.
+
+    Returns:
+        tuple: The set of song IDs missing from the playlist and the set of those it should not have.
+    """
+    expected = set(compute_song_ids(mood_playlist.user_id, mood_playlist.emotion))
+    actual = set(Mood_playlist_songs.objects.filter(mood_playlist=mood_playlist).values_list('song_id', flat=True))
+    return expected - actual, actual - expected
+
+
+def rebuild(mood_playlist: Mood_playlist) -> None:
+    """
+    Replace the songs of a mood playlist with a full recompute, e.g. after songs were
+    changed without signals by bulk_create or update().
+
+    Args:
+        mood_playlist (Mood_playlist): The mood playlist to rebuild.
+    """
+    with transaction.atomic():
+        Mood_playlist_songs.objects.filter(mood_playlist=mood_playlist).delete()
+        Mood_playlist_songs.objects.bulk_create([Mood_playlist_songs(mood_playlist=mood_playlist, song_id=song_id)
+                                                 for song_id in compute_song_ids(mood_playlist.user_id,
+                                                                                 mood_playlist.emotion)],
+                                                batch_size=500)
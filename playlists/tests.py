@@ -1,3 +1,205 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from playlists import generated, mood_playlists
+from playlists.models import Mood_playlist, Playlist, Playlist_songs
+from songs.models import Song
+
+
+def add_song(user: User, name: str, emotion: str) -> Song:
+    return Song.objects.create(user=user, song_name=name, song_url=f'/media/{name}.mp3', emotion=emotion)
+
+
+class MoodPlaylistTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin')
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.admin_song = add_song(self.admin, 'admin happy', 'happy')
+        self.alice_song = add_song(self.alice, 'alice happy', 'happy')
+        add_song(self.alice, 'alice sad', 'sad')
+
+    def assertCurrent(self):
+        """
+        Check every built mood playlist against a full recompute, order included.
+        """
+        for mood_playlist in Mood_playlist.objects.select_related('user'):
+            self.assertEqual(mood_playlists.get_song_ids(mood_playlist.user, mood_playlist.emotion),
+                             mood_playlists.compute_song_ids(mood_playlist.user_id, mood_playlist.emotion),
+                             str(mood_playlist))
+            self.assertEqual(mood_playlists.diff(mood_playlist), (set(), set()))
+
+    def build(self):
+        for user in (self.admin, self.alice, self.bob):
+            for emotion in ('happy', 'sad', 'normal'):
+                mood_playlists.get_mood_playlist(user, emotion)
+
+    def test_first_lookup_builds_the_playlist(self):
+        self.assertEqual(mood_playlists.get_song_ids(self.alice, 'happy'), [self.alice_song.id, self.admin_song.id])
+        self.assertEqual(mood_playlists.get_song_ids(self.bob, 'happy'), [self.admin_song.id])
+        self.assertEqual(Mood_playlist.objects.count(), 2)
+
+    def test_added_song_only_changes_its_owners_playlist(self):
+        self.build()
+        song = add_song(self.bob, 'bob happy', 'happy')
+
+        self.assertIn(song.id, mood_playlists.get_song_ids(self.bob, 'happy'))
+        self.assertNotIn(song.id, mood_playlists.get_song_ids(self.alice, 'happy'))
+        self.assertCurrent()
+
+    def test_added_admin_song_changes_every_playlist_of_its_emotion(self):
+        self.build()
+        song = add_song(self.admin, 'admin sad', 'sad')
+
+        for user in (self.admin, self.alice, self.bob):
+            self.assertIn(song.id, mood_playlists.get_song_ids(user, 'sad'))
+            self.assertNotIn(song.id, mood_playlists.get_song_ids(user, 'happy'))
+        self.assertCurrent()
+
+    def test_retagged_song_moves_between_playlists(self):
+        self.build()
+        self.admin_song.emotion = 'normal'
+        self.admin_song.save()
+        self.alice_song.emotion = 'sad'
+        self.alice_song.save()
+
+        self.assertNotIn(self.admin_song.id, mood_playlists.get_song_ids(self.bob, 'happy'))
+        self.assertIn(self.admin_song.id, mood_playlists.get_song_ids(self.bob, 'normal'))
+        self.assertIn(self.alice_song.id, mood_playlists.get_song_ids(self.alice, 'sad'))
+        self.assertCurrent()
+
+    def test_deleted_song_leaves_every_playlist(self):
+        self.build()
+        self.admin_song.delete()
+        self.alice_song.delete()
+
+        self.assertEqual(mood_playlists.get_song_ids(self.alice, 'happy'), [])
+        self.assertCurrent()
+
+    def test_unbuilt_playlists_are_built_current(self):
+        mood_playlists.get_mood_playlist(self.alice, 'happy')
+        song = add_song(self.admin, 'admin normal', 'normal')
+
+        self.assertEqual(mood_playlists.get_song_ids(self.bob, 'normal'), [song.id])
+        self.assertCurrent()
+
+    def test_check_command_reports_and_fixes_changes_without_signals(self):
+        self.build()
+        call_command('check_mood_playlists', stdout=StringIO())
+
+        # update() sends no signals, so the mood playlists go stale
+        Song.objects.filter(id=self.alice_song.id).update(emotion='normal')
+        self.assertEqual(mood_playlists.diff(Mood_playlist.objects.get(user=self.alice, emotion='happy')),
+                         (set(), {self.alice_song.id}))
+        with self.assertRaises(CommandError):
+            call_command('check_mood_playlists', stdout=StringIO())
+
+        call_command('check_mood_playlists', fix=True, stdout=StringIO())
+        self.assertCurrent()
+
+
+class SampleIdsTests(SimpleTestCase):
+
+    def test_same_seed_picks_the_same_songs(self):
+        song_ids = list(range(1000))
+        picks = mood_playlists.sample_ids(song_ids, 10, seed=7)
+
+        self.assertEqual(len(set(picks)), 10)
+        self.assertTrue(set(picks) <= set(song_ids))
+        self.assertEqual(mood_playlists.sample_ids(song_ids, 10, seed=7), picks)
+        self.assertNotEqual(mood_playlists.sample_ids(song_ids, 10, seed=8), picks)
+
+    def test_k_beyond_the_list_shuffles_all_of_it(self):
+        song_ids = list(range(20))
+        shuffled = mood_playlists.sample_ids(song_ids, 50, seed=1)
+
+        self.assertEqual(sorted(shuffled), song_ids)
+        self.assertEqual(mood_playlists.sample_ids(song_ids, 50, seed=1), shuffled)
+        self.assertEqual(mood_playlists.sample_ids([], 10), [])
+
+
+class SampleSongIdsTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin')
+        self.alice = User.objects.create_user('alice')
+        bob = User.objects.create_user('bob')
+        self.expected = {add_song(self.admin, f'admin {index}', 'happy').id for index in range(5)}
+        self.expected.add(add_song(self.alice, 'alice happy', 'happy').id)
+        add_song(self.alice, 'alice sad', 'sad')
+        add_song(bob, 'bob happy', 'happy')
+
+    def test_songs_are_picked_from_the_users_mood_playlist(self):
+        picks = mood_playlists.sample_song_ids(self.alice, 'happy', 3, seed=3)
+
+        self.assertEqual(len(picks), 3)
+        self.assertTrue(set(picks) <= self.expected)
+        self.assertEqual(mood_playlists.sample_song_ids(self.alice, 'happy', 3, seed=3), picks)
+        self.assertEqual(set(mood_playlists.sample_song_ids(self.alice, 'happy', 100)), self.expected)
+
+
+class GeneratedPlaylistTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.songs = [add_song(self.user, f'song {index}', 'happy') for index in range(3)]
+        self.client.force_login(self.user)
+
+    def generate(self, song_ids: list) -> str:
+        return generated.store(self.user.pk, 'alice_happy', song_ids)
+
+    def test_generated_playlist_is_shown_without_playlist_rows(self):
+        token = self.generate([song.id for song in self.songs])
+
+        response = self.client.get(reverse('displayGeneratedPlaylist', args=[token]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([play['song'] for play in response.context['plays']], self.songs)
+        self.assertFalse(Playlist.objects.exists())
+
+    def test_save_creates_the_playlist_in_order(self):
+        song_ids = [self.songs[2].id, self.songs[0].id]
+        token = self.generate(song_ids)
+
+        response = self.client.post(reverse('save-generated-playlist', args=[token]))
+        playlist = Playlist.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('displayPlaylist', args=[playlist.id]), fetch_redirect_response=False)
+        self.assertEqual(playlist.playlist_name, 'alice_happy')
+        self.assertEqual(playlist.number_of_songs, 2)
+        self.assertEqual(list(Playlist_songs.objects.filter(playlist=playlist).order_by('id')
+                              .values_list('song_id', flat=True)), song_ids)
+
+        # Saving drops the generated playlist
+        self.assertEqual(self.client.get(reverse('displayGeneratedPlaylist', args=[token])).status_code, 404)
+
+    def test_save_needs_post(self):
+        token = self.generate([self.songs[0].id])
+        self.assertEqual(self.client.get(reverse('save-generated-playlist', args=[token])).status_code, 405)
+        self.assertFalse(Playlist.objects.exists())
+
+    @override_settings(GENERATED_PLAYLIST_TTL=-1)
+    def test_expired_playlist_cannot_be_opened_or_saved(self):
+        token = self.generate([self.songs[0].id])
+
+        self.assertEqual(self.client.get(reverse('displayGeneratedPlaylist', args=[token])).status_code, 404)
+        self.assertEqual(self.client.post(reverse('save-generated-playlist', args=[token])).status_code, 404)
+        self.assertFalse(Playlist.objects.exists())
+
+    def test_playlist_of_another_user_is_not_found(self):
+        token = self.generate([self.songs[0].id])
+        self.client.force_login(User.objects.create_user('bob'))
+
+        self.assertEqual(self.client.get(reverse('displayGeneratedPlaylist', args=[token])).status_code, 404)
+        self.assertEqual(self.client.post(reverse('save-generated-playlist', args=[token])).status_code, 404)
+
+    def test_playlist_survives_a_new_session(self):
+        token = self.generate([self.songs[0].id])
+        self.client.logout()
+        self.client.force_login(self.user)
+
+        self.assertEqual(self.client.get(reverse('displayGeneratedPlaylist', args=[token])).status_code, 200)
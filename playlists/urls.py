@@ -11,4 +11,8 @@ urlpatterns = [
     path('delete/<int:playlist_id>', play_view.delete_playlist, name='del-playlist'),
     path('playSong/<int:song_id>', play_view.play_song_of_playlist, name='play-song-playlist'),
     path('playPlaylist/<int:playlist_id>', play_view.play_entire_playlist, name='play-playlist'),
+    path('generated/<str:token>', play_view.display_playlist, name='displayGeneratedPlaylist'),
+    path('generated/<str:token>/play/<int:position>', play_view.play_entire_playlist,
+         name='play-generated-playlist'),
+    path('generated/<str:token>/save', play_view.save_generated_playlist, name='save-generated-playlist'),
 ]
@@ -1,6 +1,8 @@
 from django.shortcuts import render, redirect
 from playlists.models import Playlist, Song, Playlist_songs
-from django.http import HttpRequest, HttpResponse
+from playlists import generated
+from django.db import transaction
+from django.http import Http404, HttpRequest, HttpResponse, HttpResponseNotAllowed
 from typing import Optional, List
 from songs.views import get_songs_of_user, get_song_from_id, return_none_if_empty, get_playlists_of_user
 
@@ -98,23 +100,74 @@ def create_playlist(request: HttpRequest) -> HttpResponse:
         return redirect('displayPlaylist', playlist.id)
 
 
-def display_playlist(request: HttpRequest, playlist_id: int) -> HttpResponse:
+def get_generated_songs(request: HttpRequest, token: str) -> tuple:
     """
-    View function to display a playlist.
+    Retrieves a generated playlist of the user and its songs, in playlist order.
 
     Args:
         request (HttpRequest): The HTTP request object.
-        playlist_id (int): The ID of the playlist to display.
+        token (str): The token of the generated playlist.
+
+    Returns:
+        tuple: The playlist name and the list of Song objects.
+
+    Raises:
+        Http404: If the playlist expired or belongs to another user.
+    """
+    playlist = generated.load(request.user.pk, token)
+    if playlist is None:
+        raise Http404("This playlist has expired, detect your emotion again to get a new one.")
+    songs = Song.objects.in_bulk(playlist['song_ids'])
+    # Songs deleted since the playlist was generated are left out
+    return playlist['playlist_name'], [songs[song_id] for song_id in playlist['song_ids'] if song_id in songs]
+
+
+def display_playlist(request: HttpRequest, playlist_id: int = None, token: str = None) -> HttpResponse:
+    """
+    View function to display a playlist, either saved or generated.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        playlist_id (int): The ID of the saved playlist to display.
+        token (str): The token of the generated playlist to display instead.
 
     Returns:
         HttpResponse: Rendered response with the playlist.
     """
+    if token is not None:
+        playlist_name, songs = get_generated_songs(request, token)
+        plays = [{'id': position, 'song': song} for position, song in enumerate(songs)]
+        return render(request, 'playlists/displayPlaylist.html',
+                      {'plays': plays, 'playlist': {'playlist_name': playlist_name}, 'token': token})
+
     playlist = get_playlist_from_id(playlist_id)
     playlist_songs = get_songs_from_playlist(playlist)
     return render(request, 'playlists/displayPlaylist.html',
                   {'plays': playlist_songs, 'playlist': playlist})
 
 
+def save_generated_playlist(request: HttpRequest, token: str) -> HttpResponse:
+    """
+    View function to save a generated playlist as a playlist of the user.
+
+    Args:
+        request (HttpRequest): The HTTP request object.
+        token (str): The token of the generated playlist.
+
+    Returns:
+        HttpResponse: Redirects to the saved playlist.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    playlist_name, songs = get_generated_songs(request, token)
+    with transaction.atomic():
+        playlist = Playlist.objects.create(user=request.user, playlist_name=playlist_name,
+                                           number_of_songs=len(songs))
+        Playlist_songs.objects.bulk_create([Playlist_songs(playlist=playlist, song=song) for song in songs])
+    generated.discard(request.user.pk, token)
+    return redirect('displayPlaylist', playlist.id)
+
+
 def delete_playlist(request: HttpRequest, playlist_id: int) -> HttpResponse:
     """
     View function to delete a playlist.
@@ -179,17 +232,26 @@ def get_song_name(playlist_song: Playlist_songs) -> str:
     return playlist_song.song.song_name
 
 
-def play_entire_playlist(request: HttpRequest, playlist_id: int) -> HttpResponse:
+def play_entire_playlist(request: HttpRequest, playlist_id: int = None, token: str = None,
+                         position: int = 0) -> HttpResponse:
     """
-    View function to play the entire playlist.
+    View function to play the entire playlist, either saved or generated.
 
     Args:
         request (HttpRequest): The HTTP request object.
-        playlist_id (int): The ID of the playlist to play.
+        playlist_id (int): The ID of the saved playlist to play.
+        token (str): The token of the generated playlist to play instead.
+        position (int): For a generated playlist, the position of the song to start with.
 
     Returns:
         HttpResponse: Rendered response with the playlist songs.
     """
+    if token is not None:
+        _, songs = get_generated_songs(request, token)
+        if not songs:
+            raise Http404("This playlist has no songs.")
+        song = songs[min(position, len(songs) - 1)].song_name
+        return render(request, 'songs/player.html', {'songs': songs, 'curr_song': song})
 
     playlist = get_playlist_from_id(playlist_id)
     play_songs = get_songs_from_playlist(playlist)
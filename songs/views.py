@@ -1,5 +1,6 @@
 from django.core.files.storage import FileSystemStorage
 from django.shortcuts import render, redirect
+from django.db import transaction
 from django.http import HttpRequest, HttpResponse
 from typing import Union
 from typing import Optional, List
@@ -123,7 +124,9 @@ def add_song(request: HttpRequest) -> Union[HttpResponse, redirect]:
         url = store.url(name)
         emotion = request.POST["emotion"]
         song = Song(user=request.user, song_name=song_name, song_url=url, emotion=emotion)
-        song.save()
+        # The affected mood playlists are updated by a signal, in the same transaction as the song
+        with transaction.atomic():
+            song.save()
         return redirect('users-songs')
 
 
@@ -139,7 +142,9 @@ def remove_song(request: HttpRequest, song_id: int) -> HttpResponse:
         HttpResponse: Redirects to the user's songs page after removing the song.
     """
     song = get_song_from_id(song_id)
-    song.delete()
+    # Deleting the song also removes it from every mood playlist
+    with transaction.atomic():
+        song.delete()
     return redirect('users-songs')
 
 